@@ -0,0 +1,85 @@
+"""Measure per-request overhead of the web API with the Flask test client
+against a stub RPC server, comparing the previous app-wide hooks that built
+both RPC clients on every request with the lazily created, app-scoped
+clients.
+
+Usage: python benchmarks/api_overhead.py [requests]
+"""
+
+import os
+import sys
+import threading
+import time
+
+os.environ.setdefault("NIDOD_RPC_HOST", "localhost")
+os.environ.setdefault("NIDOD_RPC_PORT", "0")
+
+import rpyc  # noqa: E402
+from flask import Flask, g  # noqa: E402
+from rpyc.utils.server import ThreadedServer  # noqa: E402
+
+from nido.lib.rpc.client import ThermostatClient, SchedulerClient  # noqa: E402
+from nido.web.api import JSONResponse, RegexConverter  # noqa: E402
+from nido.web.api import thermostat, schedule  # noqa: E402
+
+
+class StubService(rpyc.Service):
+    def exposed_get_mode(self):
+        return 0
+
+
+def create_app(port, legacy=False):
+    app = Flask("nido.web")
+    app.config.update(
+        RPC_HOST="localhost",
+        RPC_PORT=port,
+        RPC_POOL_SIZE=4,
+        RPC_POOL_MAX_IDLE=60,
+        PUBLIC_API_SECRET="secret",
+    )
+    if legacy:
+
+        @app.before_request
+        def json_response():
+            # What the two before_app_request hooks used to do per request
+            for client in (ThermostatClient, SchedulerClient):
+                g.resp = JSONResponse()
+                client("localhost", port, max_size=4, max_idle=60)
+
+    app.url_map.converters["regex"] = RegexConverter
+    app.register_blueprint(thermostat.bp, url_prefix="/api")
+    app.register_blueprint(schedule.bp, url_prefix="/api/schedule")
+
+    @app.route("/ping")
+    def ping():
+        return "pong"
+
+    return app
+
+
+def run(name, app, path, requests):
+    client = app.test_client()
+    client.post(path)
+    start = time.perf_counter()
+    for _ in range(requests):
+        client.post(path)
+    elapsed = time.perf_counter() - start
+    print("{:<8} {:<16} {:>10.1f}".format(name, path, elapsed / requests * 1e6))
+
+
+def main():
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    server = ThreadedServer(StubService, hostname="localhost", port=0)
+    threading.Thread(target=server.start, daemon=True).start()
+    while not server.active:
+        time.sleep(0.01)
+
+    print("{:<8} {:<16} {:>10}".format("hooks", "path", "us/req"))
+    for path in ("/ping", "/api/get/mode"):
+        run("legacy", create_app(server.port, legacy=True), path, requests)
+        run("scoped", create_app(server.port), path, requests)
+    server.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""Compare the floating point and integer BME280 compensation formulas,
+and per-sample compensation against compensate_batch().
+
+Usage: python benchmarks/compensation.py [iterations]
+"""
+
+import sys
+import timeit
+
+from fake_smbus import FakeSMBus, RAW_TEMP, RAW_PRESSURE, RAW_HUMIDITY
+
+from nido.lib.Adafruit_GPIO import I2C
+from nido.lib.Adafruit_BME280 import (
+    compensate_batch,
+    BME280,
+    BME280_COMPENSATION_FLOAT,
+    BME280_COMPENSATION_INT,
+)
+
+I2C.SMBus = FakeSMBus
+
+
+def compensate(sensor):
+    temp, t_fine = sensor._compensate_temperature(RAW_TEMP)
+    sensor._compensate_pressure(RAW_PRESSURE, t_fine)
+    sensor._compensate_humidity(RAW_HUMIDITY, t_fine)
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    print("{:<8} {:>12}".format("path", "us/reading"))
+    for name, compensation in (
+        ("float", BME280_COMPENSATION_FLOAT),
+        ("int", BME280_COMPENSATION_INT),
+    ):
+        sensor = BME280(busnum=1, compensation=compensation)
+        elapsed = min(
+            timeit.repeat(lambda: compensate(sensor), number=iterations, repeat=5)
+        )
+        print("{:<8} {:>12.2f}".format(name, elapsed / iterations * 1e6))
+
+    sensor = BME280(busnum=1)
+    calibration = sensor.get_calibration()
+    adc_T = [RAW_TEMP + i % 1000 for i in range(iterations)]
+    adc_P = [RAW_PRESSURE + i % 1000 for i in range(iterations)]
+    adc_H = [RAW_HUMIDITY + i % 1000 for i in range(iterations)]
+    elapsed = min(
+        timeit.repeat(
+            lambda: compensate_batch(adc_T, adc_P, adc_H, calibration),
+            number=1,
+            repeat=5,
+        )
+    )
+    print("{:<8} {:>12.2f}".format("batch", elapsed / iterations * 1e6))
+
+
+if __name__ == "__main__":
+    main()
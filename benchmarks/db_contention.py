@@ -0,0 +1,99 @@
+"""Measure settings write throughput with N concurrent RPC-style writer
+threads, while a scheduler-style thread keeps updating job rows, using the
+previous default engines and the shared, tuned engine from db.py.
+
+Usage: python benchmarks/db_contention.py [writers] [writes_per_thread]
+"""
+
+import os
+import sys
+import tempfile
+import threading
+import time
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+
+os.environ.setdefault("NIDOD_MQTT_PORT", "")
+os.environ.setdefault("NIDOD_MQTT_CLIENT_NAME", "")
+os.environ["NIDO_BASE"] = tempfile.mkdtemp()
+
+from nido.lib.exceptions import DBError  # noqa: E402
+from nido.supervisor import db  # noqa: E402
+
+
+def job_store_writer(engine, stop, errors):
+    # Stands in for APScheduler updating next_run_time after each run.
+    n = 0
+    while not stop.is_set():
+        try:
+            with engine.begin() as conn:
+                conn.execute(
+                    text("UPDATE jobs SET next_run_time = :t WHERE id = 1"), {"t": n}
+                )
+        except Exception:
+            errors.append(1)
+        n += 1
+
+
+def settings_writer(writes, errors):
+    for i in range(writes):
+        try:
+            db.set_settings(set_temp=18.0 + i % 5)
+        except DBError:
+            errors.append(1)
+
+
+def run(name, settings_engine, job_engine, writers, writes):
+    db.Base.metadata.create_all(settings_engine)
+    with job_engine.begin() as conn:
+        conn.execute(text("CREATE TABLE jobs (id INTEGER PRIMARY KEY, next_run_time)"))
+        conn.execute(text("INSERT INTO jobs VALUES (1, 0)"))
+    db.Session = sessionmaker(bind=settings_engine)
+    db._settings_cache = db._SettingsCache()
+    db._init_db(engine=settings_engine)
+
+    stop = threading.Event()
+    errors = []
+    scheduler = threading.Thread(
+        target=job_store_writer, args=(job_engine, stop, errors)
+    )
+    threads = [
+        threading.Thread(target=settings_writer, args=(writes, errors))
+        for _ in range(writers)
+    ]
+    start = time.perf_counter()
+    scheduler.start()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    stop.set()
+    scheduler.join()
+    total = writers * writes
+    print(
+        "{:<8} {:>10.0f} {:>10.2f} {:>8}".format(
+            name, total / elapsed, elapsed / total * 1000, len(errors)
+        )
+    )
+
+
+def main():
+    writers = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    writes = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    base = os.environ["NIDO_BASE"]
+    print(
+        "{:<8} {:>10} {:>10} {:>8}".format("engine", "writes/s", "ms/write", "errors")
+    )
+
+    path = os.path.join(base, "default.sqlite")
+    url = "sqlite:///{}".format(path)
+    run("default", create_engine(url), create_engine(url), writers, writes)
+
+    engine = db.create_db_engine(path=os.path.join(base, "tuned.sqlite"))
+    run("tuned", engine, engine, writers, writes)
+
+
+if __name__ == "__main__":
+    main()
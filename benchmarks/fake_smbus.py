@@ -0,0 +1,145 @@
+"""In-memory stand-in for smbus2.SMBus that emulates a BME280 and counts
+the system calls the real implementation would make against /dev/i2c-N.
+"""
+
+import struct
+
+# Bosch reference trimming parameters (BMP280 datasheet section 8.2 for
+# temperature and pressure, typical values for humidity).
+CALIBRATION = {
+    "dig_T1": 27504,
+    "dig_T2": 26435,
+    "dig_T3": -1000,
+    "dig_P1": 36477,
+    "dig_P2": -10685,
+    "dig_P3": 3024,
+    "dig_P4": 2855,
+    "dig_P5": 140,
+    "dig_P6": -7,
+    "dig_P7": 15500,
+    "dig_P8": -14600,
+    "dig_P9": 6000,
+    "dig_H1": 75,
+    "dig_H2": 362,
+    "dig_H3": 0,
+    "dig_H4": 313,
+    "dig_H5": 50,
+    "dig_H6": 30,
+}
+RAW_TEMP = 519888
+RAW_PRESSURE = 415148
+RAW_HUMIDITY = 30000
+
+
+def bme280_registers(calibration=CALIBRATION, raw=None):
+    """Return a 256-byte register map for a BME280 with the given trim."""
+    if raw is None:
+        raw = (RAW_TEMP, RAW_PRESSURE, RAW_HUMIDITY)
+    c = calibration
+    regs = bytearray(256)
+    regs[0x88:0xA0] = struct.pack(
+        "<HhhHhhhhhhhh",
+        c["dig_T1"],
+        c["dig_T2"],
+        c["dig_T3"],
+        c["dig_P1"],
+        c["dig_P2"],
+        c["dig_P3"],
+        c["dig_P4"],
+        c["dig_P5"],
+        c["dig_P6"],
+        c["dig_P7"],
+        c["dig_P8"],
+        c["dig_P9"],
+    )
+    regs[0xA1] = c["dig_H1"]
+    regs[0xE1:0xE3] = struct.pack("<h", c["dig_H2"])
+    regs[0xE3] = c["dig_H3"]
+    regs[0xE4] = (c["dig_H4"] >> 4) & 0xFF
+    regs[0xE5] = (c["dig_H4"] & 0x0F) | ((c["dig_H5"] & 0x0F) << 4)
+    regs[0xE6] = (c["dig_H5"] >> 4) & 0xFF
+    regs[0xE7] = c["dig_H6"] & 0xFF
+    regs[0xD0] = 0x60
+    set_raw(regs, *raw)
+    return regs
+
+
+def set_raw(regs, temp, pressure, humidity):
+    """Store raw ADC values in the data registers 0xF7..0xFE."""
+    regs[0xF7:0xFA] = bytes(
+        ((pressure >> 12) & 0xFF, (pressure >> 4) & 0xFF, (pressure << 4) & 0xF0)
+    )
+    regs[0xFA:0xFD] = bytes(
+        ((temp >> 12) & 0xFF, (temp >> 4) & 0xFF, (temp << 4) & 0xF0)
+    )
+    regs[0xFD:0xFF] = bytes(((humidity >> 8) & 0xFF, humidity & 0xFF))
+
+
+class SyscallCounter(object):
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.open = 0
+        self.close = 0
+        self.ioctl = 0
+
+    @property
+    def total(self):
+        return self.open + self.close + self.ioctl
+
+
+class FakeSMBus(object):
+    """Mimics the syscall pattern of smbus2.SMBus: open() plus an
+    I2C_FUNCS ioctl on construction, an I2C_SLAVE ioctl whenever the
+    target address changes, and one I2C_SMBUS/I2C_RDWR ioctl per
+    transaction.
+    """
+
+    counter = SyscallCounter()
+    registers = bme280_registers()
+
+    def __init__(self, bus=None):
+        self._address = None
+        self.counter.open += 1
+        self.counter.ioctl += 1
+
+    def close(self):
+        self.counter.close += 1
+
+    def _transfer(self, address):
+        if address != self._address:
+            self._address = address
+            self.counter.ioctl += 1
+        self.counter.ioctl += 1
+
+    def write_byte(self, address, value):
+        self._transfer(address)
+
+    def write_byte_data(self, address, register, value):
+        self._transfer(address)
+        self.registers[register] = value
+
+    def write_word_data(self, address, register, value):
+        self._transfer(address)
+        self.registers[register : register + 2] = struct.pack("<H", value)
+
+    def write_i2c_block_data(self, address, register, data):
+        self._transfer(address)
+        self.registers[register : register + len(data)] = bytes(data)
+
+    def read_byte(self, address):
+        self._transfer(address)
+        return 0
+
+    def read_byte_data(self, address, register):
+        self._transfer(address)
+        return self.registers[register]
+
+    def read_word_data(self, address, register):
+        self._transfer(address)
+        return struct.unpack("<H", bytes(self.registers[register : register + 2]))[0]
+
+    def read_i2c_block_data(self, address, register, length):
+        self._transfer(address)
+        return list(self.registers[register : register + length])
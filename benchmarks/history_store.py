@@ -0,0 +1,75 @@
+"""Measure the local history store: time to record a sample, including
+the rollup updates, disk space per year of 10 second samples, time to query
+a day at raw resolution, and time to query the whole range in at most 1000
+points from the rollups.
+
+Usage: python benchmarks/history_store.py [days]
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+for var in ("NIDO_BASE", "NIDOD_MQTT_PORT", "NIDOD_MQTT_CLIENT_NAME"):
+    os.environ.setdefault(var, "")
+
+from nido.supervisor.history import HistoryStore  # noqa: E402
+
+INTERVAL = 10
+
+
+def disk_usage(path):
+    return sum(
+        os.stat(os.path.join(root, n)).st_blocks * 512
+        for root, _, names in os.walk(path)
+        for n in names
+    )
+
+
+def main():
+    days = int(sys.argv[1]) if len(sys.argv) > 1 else 30
+    path = tempfile.mkdtemp()
+    store = HistoryStore(path, INTERVAL)
+    start = 1500076800
+    samples = days * 86400 // INTERVAL
+
+    begin = time.perf_counter()
+    for i in range(samples):
+        store.append(start + i * INTERVAL, 20.5, 1013.25, 45.5, 21.0, i & 1)
+    elapsed = time.perf_counter() - begin
+    store.close()
+
+    size = disk_usage(path)
+    print("samples          {:>10}".format(samples))
+    print("append us        {:>10.2f}".format(elapsed / samples * 1e6))
+    print("bytes/sample     {:>10.1f}".format(size / samples))
+    print("MB per year      {:>10.1f}".format(size / days * 365 / 1e6))
+
+    store = HistoryStore(path, INTERVAL)
+    day = start + 86400 * (days // 2)
+    runs = 20
+    begin = time.perf_counter()
+    for _ in range(runs):
+        result = store.query(day, day + 86400, limit=10000)
+    elapsed = time.perf_counter() - begin
+    print(
+        "query 1 day ms   {:>10.2f} ({} points)".format(
+            elapsed / runs * 1e3, len(result["time"])
+        )
+    )
+
+    end = start + days * 86400
+    begin = time.perf_counter()
+    for _ in range(runs):
+        result = store.query(start, end, resolution=store.resolution(start, end, 1000))
+    elapsed = time.perf_counter() - begin
+    print(
+        "query {} days ms {:>10.2f} ({} points at {})".format(
+            days, elapsed / runs * 1e3, len(result["time"]), result["resolution"]
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""Count the /dev/i2c-N system calls made per sensor reading, with and
+without the shared, long-lived bus handle in Adafruit_GPIO.I2C.
+
+Usage: python benchmarks/i2c_syscalls.py [readings]
+"""
+
+from contextlib import contextmanager
+import sys
+import time
+
+from fake_smbus import FakeSMBus
+
+from nido.lib.Adafruit_GPIO import I2C
+from nido.lib.Adafruit_BME280 import BME280, BME280_OSAMPLE_8
+
+I2C.SMBus = FakeSMBus
+# Don't sleep while waiting for the fake conversion to complete.
+time.sleep = lambda seconds: None
+
+
+class UnpooledBus(I2C.Bus):
+    """Reproduces the previous behaviour of opening and closing the bus
+    around every single transaction.
+    """
+
+    @contextmanager
+    def borrow(self):
+        with super().borrow() as bus:
+            yield bus
+        self.close()
+
+
+def get_conditions(sensor):
+    # Same register access sequence as Sensor.get_conditions()
+    sensor.read_all()
+
+
+def run(bus_class, readings):
+    I2C._buses.clear()
+    I2C._buses[1] = bus_class(1)
+    counter = FakeSMBus.counter
+    counter.reset()
+    sensor = BME280(BME280_OSAMPLE_8, busnum=1)
+    init = counter.total
+    counter.reset()
+    start = time.perf_counter()
+    for _ in range(readings):
+        get_conditions(sensor)
+    elapsed = time.perf_counter() - start
+    I2C.close_all()
+    return init, counter, elapsed
+
+
+def main():
+    readings = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    print(
+        "{:<10} {:>8} {:>8} {:>8} {:>8} {:>12}".format(
+            "bus", "init", "open", "close", "ioctl", "us/reading"
+        )
+    )
+    for name, bus_class in (("unpooled", UnpooledBus), ("pooled", I2C.Bus)):
+        init, c, elapsed = run(bus_class, readings)
+        print(
+            "{:<10} {:>8} {:>8.1f} {:>8.1f} {:>8.1f} {:>12.1f}".format(
+                name,
+                init,
+                c.open / readings,
+                c.close / readings,
+                c.ioctl / readings,
+                elapsed / readings * 1e6,
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""Measure InfluxDB line protocol encoding of one telemetry sample: the
+previous per-measurement str.format formatter, nido.lib.influx.encode_line,
+and the precompiled LineSchema used by DataLogger.
+
+The previous formatter wrote one line per measurement, five per sample,
+while the encoders write all fields on one line, so the rate is given per
+sample as well as per line.
+
+Usage: python benchmarks/line_protocol.py [samples]
+"""
+
+import sys
+import time
+
+from nido.lib.influx import LineSchema, encode_line
+
+FIELDS = (
+    ("controller", int),
+    ("set_temp", float),
+    ("temp_celsius", float),
+    ("temp_fahrenheit", float),
+    ("pressure_mb", float),
+    ("relative_humidity", float),
+)
+DATA = {
+    "controller": 0,
+    "temp": {"celsius": 20.53, "fahrenheit": 68.95},
+    "pressure_mb": 1013.25,
+    "relative_humidity": 45.12,
+    "set_temp": 21.0,
+}
+VALUES = (0, 21.0, 20.53, 68.95, 1013.25, 45.12)
+TAGS = {"device": "nido"}
+SCHEMA = LineSchema("thermostat", TAGS, FIELDS)
+
+
+def legacy(timestamp):
+    seconds = timestamp / 1e9
+    lines = []
+    for measurement in DATA:
+        nanoseconds = int(seconds * 1000000000)
+        lines.append(
+            "thermostat {}={} {}".format(measurement, DATA[measurement], nanoseconds)
+        )
+    return lines
+
+
+def general(timestamp):
+    return [encode_line("thermostat", TAGS, dict(zip(SCHEMA.keys, VALUES)), timestamp)]
+
+
+def schema(timestamp):
+    return [SCHEMA.encode(VALUES, timestamp)]
+
+
+def run(name, encode, samples):
+    timestamp = time.time_ns()
+    lines = len(encode(timestamp))
+    start = time.perf_counter()
+    for i in range(samples):
+        encode(timestamp + i)
+    elapsed = time.perf_counter() - start
+    print(
+        "{:<8} {:>12.0f} {:>12.0f} {:>10.2f}".format(
+            name, samples / elapsed, samples * lines / elapsed, elapsed / samples * 1e6
+        )
+    )
+
+
+def main():
+    samples = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    print(
+        "{:<8} {:>12} {:>12} {:>10}".format(
+            "encoder", "samples/s", "lines/s", "us/sample"
+        )
+    )
+    run("legacy", legacy, samples)
+    run("general", general, samples)
+    run("schema", schema, samples)
+
+
+if __name__ == "__main__":
+    main()
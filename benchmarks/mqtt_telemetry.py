@@ -0,0 +1,103 @@
+"""Compare MQTT telemetry traffic per hour between the old per-measurement
+publisher (one QoS 2 message per measurement) and MQTTDataLogger (one
+line protocol message per sample at MQTTConfig.QOS).
+
+Counts MQTT 3.1.1 packets and bytes on the wire, including the PUBACK or
+PUBREC/PUBREL/PUBCOMP handshake for each message, and the time spent
+formatting and publishing each sample.
+
+Usage: python benchmarks/mqtt_telemetry.py [poll_interval] [qos]
+"""
+
+import os
+import sys
+import time
+
+for var in ("NIDO_BASE", "NIDOD_MQTT_PORT", "NIDOD_MQTT_CLIENT_NAME", "NIDO_TESTING"):
+    os.environ.setdefault(var, "")
+os.environ.setdefault("NIDO_TESTING_GPIO", "/tmp/test_gpio.yml")
+
+from nido.supervisor.datalogger import MQTTDataLogger  # noqa: E402
+
+DATA = {
+    "controller": 0,
+    "temp": {"celsius": 20.53, "fahrenheit": 68.95},
+    "pressure_mb": 1013.25,
+    "relative_humidity": 45.12,
+    "set_temp": 21.0,
+}
+# Packets after each PUBLISH, by QoS, all 4 bytes long
+HANDSHAKE = {0: 0, 1: 1, 2: 3}
+
+
+class CountingClient(object):
+    def __init__(self):
+        self.on_publish = None
+        self.messages = 0
+        self.packets = 0
+        self.bytes = 0
+
+    def publish(self, topic, payload=None, qos=0):
+        remaining = 2 + len(topic.encode()) + len(payload.encode())
+        if qos:
+            remaining += 2
+        length_bytes = 1
+        while remaining >= 128**length_bytes:
+            length_bytes += 1
+        self.messages += 1
+        self.packets += 1 + HANDSHAKE[qos]
+        self.bytes += 1 + length_bytes + remaining + 4 * HANDSHAKE[qos]
+
+
+def legacy_publish(client, timestamp, data):
+    for measurement in data:
+        payload = "thermostat {}={} {}".format(
+            measurement, data[measurement], timestamp
+        )
+        client.publish("nido/{}".format(measurement), payload=payload, qos=2)
+
+
+def run(name, publish, client, samples, ticks_per_hour):
+    timestamp = time.time_ns()
+    start = time.perf_counter()
+    for i in range(samples):
+        publish(timestamp + i * 1000000000, DATA)
+    elapsed = time.perf_counter() - start
+    scale = ticks_per_hour / samples
+    print(
+        "{:<8} {:>10.0f} {:>10.0f} {:>10.0f} {:>10.1f}".format(
+            name,
+            client.messages * scale,
+            client.packets * scale,
+            client.bytes * scale,
+            elapsed / samples * 1e6,
+        )
+    )
+
+
+def main():
+    poll_interval = int(sys.argv[1]) if len(sys.argv) > 1 else 60
+    qos = int(sys.argv[2]) if len(sys.argv) > 2 else 1
+    ticks_per_hour = 3600 / poll_interval
+    samples = 10000
+
+    print(
+        "{:<8} {:>10} {:>10} {:>10} {:>10}".format(
+            "logger", "msgs/h", "packets/h", "bytes/h", "us/sample"
+        )
+    )
+    old = CountingClient()
+    run(
+        "before",
+        lambda t, d: legacy_publish(old, t, d),
+        old,
+        samples,
+        ticks_per_hour,
+    )
+    new = CountingClient()
+    logger = MQTTDataLogger(new, topic="nido/telemetry", qos=qos)
+    run("after", logger.publish, new, samples, ticks_per_hour)
+
+
+if __name__ == "__main__":
+    main()
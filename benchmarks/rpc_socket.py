@@ -0,0 +1,84 @@
+"""Compare ThermostatClient.get_mode() latency over TCP loopback and over a
+Unix domain socket, for both RPC transports.
+
+Usage: python benchmarks/rpc_socket.py [calls]
+"""
+
+import os
+import sys
+import tempfile
+import threading
+import time
+
+import rpyc
+from rpyc.utils.server import ThreadedServer
+
+from nido.lib.rpc.client import ThermostatClient
+from nido.lib.rpc.framed import FramedRPCServer
+
+
+class StubService(rpyc.Service):
+    def get_mode(self):
+        return 1
+
+
+def serve(server):
+    threading.Thread(target=server.start, daemon=True).start()
+    while not server.active:
+        time.sleep(0.01)
+    return server
+
+
+def run(name, client, calls):
+    client.get_mode()
+    samples = []
+    for _ in range(calls):
+        start = time.perf_counter()
+        client.get_mode()
+        samples.append(time.perf_counter() - start)
+    samples.sort()
+    print(
+        "{:<14} {:>8.1f} {:>8.1f} {:>8.1f}".format(
+            name,
+            samples[len(samples) // 2] * 1e6,
+            samples[int(len(samples) * 0.99)] * 1e6,
+            sum(samples) / len(samples) * 1e6,
+        )
+    )
+
+
+def main():
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    service = StubService()
+    config = {"allow_pickle": True, "allow_all_attrs": True}
+    tmp = tempfile.mkdtemp()
+    rpyc_path = os.path.join(tmp, "rpyc.sock")
+    framed_path = os.path.join(tmp, "framed.sock")
+    servers = [
+        serve(ThreadedServer(service, hostname="127.0.0.1", protocol_config=config)),
+        serve(ThreadedServer(service, socket_path=rpyc_path, protocol_config=config)),
+        serve(FramedRPCServer({"get_mode": service.get_mode}, hostname="127.0.0.1")),
+        serve(FramedRPCServer({"get_mode": service.get_mode}, socket_path=framed_path)),
+    ]
+    clients = [
+        ("rpyc tcp", ThermostatClient("127.0.0.1", servers[0].port)),
+        ("rpyc unix", ThermostatClient(None, None, socket_path=rpyc_path)),
+        (
+            "framed tcp",
+            ThermostatClient("127.0.0.1", servers[2].port, transport="framed"),
+        ),
+        (
+            "framed unix",
+            ThermostatClient(None, None, transport="framed", socket_path=framed_path),
+        ),
+    ]
+
+    print("{:<14} {:>8} {:>8} {:>8}".format("transport", "p50 us", "p99 us", "mean us"))
+    for name, client in clients:
+        run(name, client, calls)
+    for server in servers:
+        server.close()
+
+
+if __name__ == "__main__":
+    main()
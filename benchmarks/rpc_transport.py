@@ -0,0 +1,99 @@
+"""Measure ThermostatClient calls per second over rpyc and over the framed
+JSON transport (nido.lib.rpc.framed), against the same stub service.
+
+Usage: python benchmarks/rpc_transport.py [calls] [threads]
+"""
+
+import sys
+import threading
+import time
+
+import rpyc
+from rpyc.utils.server import ThreadedServer
+
+from nido.lib.rpc.client import ThermostatClient
+from nido.lib.rpc.framed import FramedRPCServer
+
+
+class StubService(rpyc.Service):
+    def get_mode(self):
+        return 1
+
+    def get_snapshot(self):
+        conditions = {
+            "temp": {"celsius": 20.5, "fahrenheit": 68.9},
+            "pressure_mb": 1013.2,
+            "relative_humidity": 45.0,
+        }
+        return {
+            "mode": 1,
+            "set_temp": 21.0,
+            "celsius": True,
+            "state": 0,
+            "conditions": conditions,
+            "sensors": {"default": conditions},
+        }
+
+
+def serve(server):
+    threading.Thread(target=server.start, daemon=True).start()
+    while not server.active:
+        time.sleep(0.01)
+    return server
+
+
+def run(name, client, method, calls, threads):
+    call = getattr(client, method)
+    call()
+
+    def worker():
+        for _ in range(calls):
+            call()
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    start = time.perf_counter()
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    elapsed = time.perf_counter() - start
+    print(
+        "{:<8} {:<14} {:>10.0f} {:>10.1f}".format(
+            name, method, calls * threads / elapsed, elapsed / calls * 1e6
+        )
+    )
+
+
+def main():
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    threads = int(sys.argv[2]) if len(sys.argv) > 2 else 1
+    service = StubService()
+    rpyc_server = serve(
+        ThreadedServer(
+            service,
+            hostname="127.0.0.1",
+            port=0,
+            protocol_config={"allow_pickle": True, "allow_all_attrs": True},
+        )
+    )
+    framed_server = serve(
+        FramedRPCServer(
+            {"get_mode": service.get_mode, "get_snapshot": service.get_snapshot},
+            hostname="127.0.0.1",
+        )
+    )
+    clients = {
+        "rpyc": ThermostatClient("127.0.0.1", rpyc_server.port),
+        "framed": ThermostatClient("127.0.0.1", framed_server.port, transport="framed"),
+    }
+
+    print("{:<8} {:<14} {:>10} {:>10}".format("proto", "call", "calls/s", "us/call"))
+    for method in ("get_mode", "get_snapshot"):
+        for name, client in clients.items():
+            run(name, client, method, calls, threads)
+    rpyc_server.close()
+    framed_server.close()
+
+
+if __name__ == "__main__":
+    main()
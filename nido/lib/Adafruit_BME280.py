@@ -29,9 +29,16 @@
 # support.
 #
 
+from array import array
 import logging
+import struct
 import time
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 
 # BME280 default address.
 BME280_I2CADDR = 0x77
@@ -43,6 +50,34 @@ BME280_OSAMPLE_4 = 3
 BME280_OSAMPLE_8 = 4
 BME280_OSAMPLE_16 = 5
 
+# Power modes (CONTROL register bits 1..0)
+BME280_MODE_SLEEP = 0
+BME280_MODE_FORCED = 1
+BME280_MODE_NORMAL = 3
+
+# Normal mode standby time between measurements, in milliseconds (CONFIG
+# register bits 7..5)
+BME280_STANDBY_0_5 = 0
+BME280_STANDBY_62_5 = 1
+BME280_STANDBY_125 = 2
+BME280_STANDBY_250 = 3
+BME280_STANDBY_500 = 4
+BME280_STANDBY_1000 = 5
+BME280_STANDBY_10 = 6
+BME280_STANDBY_20 = 7
+
+# IIR filter coefficients (CONFIG register bits 4..2)
+BME280_FILTER_OFF = 0
+BME280_FILTER_2 = 1
+BME280_FILTER_4 = 2
+BME280_FILTER_8 = 3
+BME280_FILTER_16 = 4
+
+# Compensation formulas: the datasheet's double precision floating point
+# formulas, or its 32/64-bit integer reference implementation.
+BME280_COMPENSATION_FLOAT = 0
+BME280_COMPENSATION_INT = 1
+
 # BME280 Registers
 
 BME280_REGISTER_DIG_T1 = 0x88  # Trimming parameter registers
@@ -72,17 +107,72 @@ BME280_REGISTER_VERSION = 0xD1
 BME280_REGISTER_SOFTRESET = 0xE0
 
 BME280_REGISTER_CONTROL_HUM = 0xF2
+BME280_REGISTER_STATUS = 0xF3
 BME280_REGISTER_CONTROL = 0xF4
 BME280_REGISTER_CONFIG = 0xF5
 BME280_REGISTER_PRESSURE_DATA = 0xF7
 BME280_REGISTER_TEMP_DATA = 0xFA
 BME280_REGISTER_HUMIDITY_DATA = 0xFD
 
+# STATUS register "measuring" bit, set while a conversion is running
+BME280_STATUS_MEASURING = 0x08
+
+# Forced-mode status polling: initial and maximum delay between polls, in
+# seconds
+BME280_POLL_INTERVAL = 0.001
+BME280_POLL_INTERVAL_MAX = 0.008
+
+# Trimming parameters, in the order they are stored by get_calibration()
+BME280_CALIBRATION_FIELDS = (
+    "dig_T1",
+    "dig_T2",
+    "dig_T3",
+    "dig_P1",
+    "dig_P2",
+    "dig_P3",
+    "dig_P4",
+    "dig_P5",
+    "dig_P6",
+    "dig_P7",
+    "dig_P8",
+    "dig_P9",
+    "dig_H1",
+    "dig_H2",
+    "dig_H3",
+    "dig_H4",
+    "dig_H5",
+    "dig_H6",
+)
+
+
+def _div(a, b):
+    """Integer division that truncates towards zero, like C."""
+    q = abs(a) // abs(b)
+    return q if (a < 0) == (b < 0) else -q
+
 
 class BME280(object):
     def __init__(
-        self, mode=BME280_OSAMPLE_1, address=BME280_I2CADDR, i2c=None, **kwargs
+        self,
+        mode=BME280_OSAMPLE_1,
+        address=BME280_I2CADDR,
+        i2c=None,
+        calibration=None,
+        standby=None,
+        filter=BME280_FILTER_OFF,
+        compensation=BME280_COMPENSATION_FLOAT,
+        **kwargs
     ):
+        """Pass a standby time to run the sensor in normal mode, where it
+        measures continuously and reads just fetch the latest result.
+        Otherwise each read triggers a forced-mode measurement and waits
+        for it to complete.
+
+        With BME280_COMPENSATION_INT, readings are compensated with the
+        datasheet's integer reference algorithms, which give bit-exact,
+        reproducible results matching Bosch's reference implementation.
+        In Python they are slower than the default floating point formulas.
+        """
         self._logger = logging.getLogger("Adafruit_BMP.BMP085")
         # Check that mode is valid.
         if mode not in [
@@ -97,98 +187,207 @@ class BME280(object):
                 "BME280_ULTRALOWPOWER, BME280_STANDARD, BME280_HIGHRES, or "
                 "BME280_ULTRAHIGHRES".format(mode)
             )
+        if standby is not None and standby not in range(8):
+            raise ValueError("Unexpected standby value {0}.".format(standby))
+        if filter not in range(5):
+            raise ValueError("Unexpected filter value {0}.".format(filter))
+        if compensation == BME280_COMPENSATION_INT:
+            self._compensate_temperature = self._compensate_temperature_int
+            self._compensate_pressure = self._compensate_pressure_int
+            self._compensate_humidity = self._compensate_humidity_int
+        elif compensation != BME280_COMPENSATION_FLOAT:
+            raise ValueError("Unexpected compensation value {0}.".format(compensation))
         self._mode = mode
+        self._standby = standby
+        self._filter = filter
         # Create I2C device.
         if i2c is None:
             from .Adafruit_GPIO import I2C as i2c
         self._device = i2c.get_i2c_device(address, **kwargs)
-        # Load calibration values.
+        # Load calibration values. A previously saved set is only kept if
+        # it matches the chip's, since every BME280 has the same chip ID.
+        self.chip_id = self._device.readU8(BME280_REGISTER_CHIPID)
         self._load_calibration()
-        self._device.write8(BME280_REGISTER_CONTROL, 0x3F)
+        if calibration is not None and calibration != self.get_calibration():
+            self._logger.warning(
+                "Saved calibration does not match the sensor, using the "
+                "sensor's trimming parameters."
+            )
         self.t_fine = 0.0
+        self._raw = None
+        # Duration of the last forced-mode conversion in seconds
+        self.conversion_time = None
+        self._configure()
 
     def _load_calibration(self):
+        """Reads the trimming parameters with two burst reads, of
+        0x88..0xA1 and 0xE1..0xE7.
+        """
+        data = bytes(self._device.readList(BME280_REGISTER_DIG_T1, 26))
+        (
+            self.dig_T1,
+            self.dig_T2,
+            self.dig_T3,
+            self.dig_P1,
+            self.dig_P2,
+            self.dig_P3,
+            self.dig_P4,
+            self.dig_P5,
+            self.dig_P6,
+            self.dig_P7,
+            self.dig_P8,
+            self.dig_P9,
+        ) = struct.unpack_from("<HhhHhhhhhhhh", data)
+        self.dig_H1 = data[BME280_REGISTER_DIG_H1 - BME280_REGISTER_DIG_T1]
 
-        self.dig_T1 = self._device.readU16LE(BME280_REGISTER_DIG_T1)
-        self.dig_T2 = self._device.readS16LE(BME280_REGISTER_DIG_T2)
-        self.dig_T3 = self._device.readS16LE(BME280_REGISTER_DIG_T3)
-
-        self.dig_P1 = self._device.readU16LE(BME280_REGISTER_DIG_P1)
-        self.dig_P2 = self._device.readS16LE(BME280_REGISTER_DIG_P2)
-        self.dig_P3 = self._device.readS16LE(BME280_REGISTER_DIG_P3)
-        self.dig_P4 = self._device.readS16LE(BME280_REGISTER_DIG_P4)
-        self.dig_P5 = self._device.readS16LE(BME280_REGISTER_DIG_P5)
-        self.dig_P6 = self._device.readS16LE(BME280_REGISTER_DIG_P6)
-        self.dig_P7 = self._device.readS16LE(BME280_REGISTER_DIG_P7)
-        self.dig_P8 = self._device.readS16LE(BME280_REGISTER_DIG_P8)
-        self.dig_P9 = self._device.readS16LE(BME280_REGISTER_DIG_P9)
-
-        self.dig_H1 = self._device.readU8(BME280_REGISTER_DIG_H1)
-        self.dig_H2 = self._device.readS16LE(BME280_REGISTER_DIG_H2)
-        self.dig_H3 = self._device.readU8(BME280_REGISTER_DIG_H3)
-        self.dig_H6 = self._device.readS8(BME280_REGISTER_DIG_H7)
-
-        h4 = self._device.readS8(BME280_REGISTER_DIG_H4)
-        h4 = (h4 << 24) >> 20
-        self.dig_H4 = h4 | (self._device.readU8(BME280_REGISTER_DIG_H5) & 0x0F)
-
-        h5 = self._device.readS8(BME280_REGISTER_DIG_H6)
-        h5 = (h5 << 24) >> 20
-        self.dig_H5 = h5 | (self._device.readU8(BME280_REGISTER_DIG_H5) >> 4 & 0x0F)
+        data = bytes(self._device.readList(BME280_REGISTER_DIG_H2, 7))
+        self.dig_H2, self.dig_H3, h4, h45, h5, self.dig_H6 = struct.unpack(
+            "<hBbBbb", data
+        )
+        self.dig_H4 = (h4 << 4) | (h45 & 0x0F)
+        self.dig_H5 = (h5 << 4) | (h45 >> 4 & 0x0F)
 
-    def read_raw_temp(self):
-        """Reads the raw (uncompensated) temperature from the sensor."""
-        meas = self._mode
-        self._device.write8(BME280_REGISTER_CONTROL_HUM, meas)
-        meas = self._mode << 5 | self._mode << 2 | 1
+    def get_calibration(self):
+        """Returns the trimming parameters as a dict that can be saved and
+        passed back to the constructor, which checks them against the chip.
+        """
+        calibration = {"chip_id": self.chip_id}
+        for field in BME280_CALIBRATION_FIELDS:
+            calibration[field] = getattr(self, field)
+        return calibration
+
+    def set_calibration(self, calibration):
+        """Applies trimming parameters returned by get_calibration()."""
+        for field in BME280_CALIBRATION_FIELDS:
+            setattr(self, field, calibration[field])
+
+    def reload_calibration(self):
+        """Re-reads the chip ID and trimming parameters from the chip and
+        returns them.
+
+        A chip that was reset comes back in sleep mode with CONFIG cleared,
+        so the measurement settings are written again too.
+        """
+        self.chip_id = self._device.readU8(BME280_REGISTER_CHIPID)
+        self._load_calibration()
+        self._configure()
+        return self.get_calibration()
+
+    @property
+    def normal_mode(self):
+        return self._standby is not None
+
+    def _configure(self):
+        """Writes the standby time, filter and oversampling settings.
+
+        CONFIG is only guaranteed to be written in sleep mode, so the
+        sensor is put to sleep first. In normal mode the sensor then starts
+        measuring continuously, so wait for the first result to be ready.
+        """
+        self._device.write8(BME280_REGISTER_CONTROL, BME280_MODE_SLEEP)
+        standby = self._standby if self.normal_mode else 0
+        self._device.write8(BME280_REGISTER_CONFIG, standby << 5 | self._filter << 2)
+        if self.normal_mode:
+            self._write_control(BME280_MODE_NORMAL)
+            time.sleep(self._measurement_time())
+
+    def _write_control(self, power_mode):
+        # Humidity oversampling only takes effect after CONTROL is written.
+        self._device.write8(BME280_REGISTER_CONTROL_HUM, self._mode)
+        meas = self._mode << 5 | self._mode << 2 | power_mode
         self._device.write8(BME280_REGISTER_CONTROL, meas)
+
+    def _measurement_time(self):
+        """Returns the worst-case duration of one measurement in seconds."""
         sleep_time = 0.00125 + 0.0023 * (1 << self._mode)
         sleep_time = sleep_time + 0.0023 * (1 << self._mode) + 0.000575
         sleep_time = sleep_time + 0.0023 * (1 << self._mode) + 0.000575
-        time.sleep(sleep_time)  # Wait the required time
-        msb = self._device.readU8(BME280_REGISTER_TEMP_DATA)
-        lsb = self._device.readU8(BME280_REGISTER_TEMP_DATA + 1)
-        xlsb = self._device.readU8(BME280_REGISTER_TEMP_DATA + 2)
-        raw = ((msb << 16) | (lsb << 8) | xlsb) >> 4
-        return raw
+        return sleep_time
+
+    def _measure(self):
+        """Triggers a forced-mode conversion and waits for it to finish.
+        In normal mode the latest result is always available, so there is
+        nothing to do.
+
+        Rather than sleeping for the worst-case measurement time, poll the
+        STATUS register until the "measuring" bit clears, backing off
+        between polls. Raises OSError if the conversion does not finish
+        within twice the worst-case time.
+        """
+        if self.normal_mode:
+            return
+        start = time.monotonic()
+        deadline = start + 2 * self._measurement_time()
+        delay = BME280_POLL_INTERVAL
+        self._write_control(BME280_MODE_FORCED)
+        while True:
+            time.sleep(delay)
+            status = self._device.readU8(BME280_REGISTER_STATUS)
+            now = time.monotonic()
+            if not status & BME280_STATUS_MEASURING:
+                break
+            if now > deadline:
+                raise OSError("Timed out waiting for BME280 conversion.")
+            delay = min(delay * 2, BME280_POLL_INTERVAL_MAX)
+        self.conversion_time = now - start
+        self._logger.debug("Conversion took %.1f ms", self.conversion_time * 1000)
+
+    def read_raw_all(self):
+        """Reads the raw (uncompensated) temperature, pressure and humidity
+        from the sensor.
+
+        All three values are fetched with a single burst read of the data
+        registers 0xF7..0xFE, so they always come from the same conversion.
+        Returns a (temperature, pressure, humidity) tuple.
+        """
+        self._measure()
+        data = self._device.readList(BME280_REGISTER_PRESSURE_DATA, 8)
+        pressure = ((data[0] << 16) | (data[1] << 8) | data[2]) >> 4
+        temp = ((data[3] << 16) | (data[4] << 8) | data[5]) >> 4
+        humidity = (data[6] << 8) | data[7]
+        self._raw = (temp, pressure, humidity)
+        return self._raw
+
+    def _raw_snapshot(self):
+        """Returns the most recent raw snapshot, reading one if needed."""
+        if self._raw is None:
+            return self.read_raw_all()
+        return self._raw
+
+    def read_raw_temp(self):
+        """Reads the raw (uncompensated) temperature from the sensor.
+        Takes a new snapshot of all data registers.
+        """
+        return self.read_raw_all()[0]
 
     def read_raw_pressure(self):
-        """Reads the raw (uncompensated) pressure level from the sensor.
-        Assumes that the temperature has already been read
-        i.e. that enough delay has been provided
+        """Reads the raw (uncompensated) pressure level from the most
+        recent snapshot taken by read_raw_temp() or read_raw_all().
         """
-        msb = self._device.readU8(BME280_REGISTER_PRESSURE_DATA)
-        lsb = self._device.readU8(BME280_REGISTER_PRESSURE_DATA + 1)
-        xlsb = self._device.readU8(BME280_REGISTER_PRESSURE_DATA + 2)
-        raw = ((msb << 16) | (lsb << 8) | xlsb) >> 4
-        return raw
+        return self._raw_snapshot()[1]
 
     def read_raw_humidity(self):
-        """Assumes that the temperature has already been read
-        i.e. that enough delay has been provided
+        """Reads the raw (uncompensated) humidity from the most recent
+        snapshot taken by read_raw_temp() or read_raw_all().
         """
-        msb = self._device.readU8(BME280_REGISTER_HUMIDITY_DATA)
-        lsb = self._device.readU8(BME280_REGISTER_HUMIDITY_DATA + 1)
-        raw = (msb << 8) | lsb
-        return raw
+        return self._raw_snapshot()[2]
 
-    def read_temperature(self):
-        """Gets the compensated temperature in degrees celsius."""
+    def _compensate_temperature(self, adc):
+        """Returns a (temperature in degrees celsius, t_fine) tuple."""
         # float in Python is double precision
-        UT = float(self.read_raw_temp())
+        UT = float(adc)
         var1 = (UT / 16384.0 - self.dig_T1 / 1024.0) * float(self.dig_T2)
         var2 = (
             (UT / 131072.0 - self.dig_T1 / 8192.0)
             * (UT / 131072.0 - self.dig_T1 / 8192.0)
         ) * float(self.dig_T3)
-        self.t_fine = int(var1 + var2)
+        t_fine = int(var1 + var2)
         temp = (var1 + var2) / 5120.0
-        return temp
+        return (temp, t_fine)
 
-    def read_pressure(self):
-        """Gets the compensated pressure in Pascals."""
-        adc = self.read_raw_pressure()
-        var1 = self.t_fine / 2.0 - 64000.0
+    def _compensate_pressure(self, adc, t_fine):
+        """Returns the pressure in Pascals."""
+        var1 = t_fine / 2.0 - 64000.0
         var2 = var1 * var1 * self.dig_P6 / 32768.0
         var2 = var2 + var1 * self.dig_P5 * 2.0
         var2 = var2 / 4.0 + self.dig_P4 * 65536.0
@@ -203,10 +402,9 @@ class BME280(object):
         p = p + (var1 + var2 + self.dig_P7) / 16.0
         return p
 
-    def read_humidity(self):
-        adc = self.read_raw_humidity()
-        # print 'Raw humidity = {0:d}'.format (adc)
-        h = self.t_fine - 76800.0
+    def _compensate_humidity(self, adc, t_fine):
+        """Returns the relative humidity in percent."""
+        h = t_fine - 76800.0
         h = (adc - (self.dig_H4 * 64.0 + self.dig_H5 / 16384.8 * h)) * (
             self.dig_H2
             / 65536.0
@@ -221,3 +419,163 @@ class BME280(object):
         elif h < 0:
             h = 0
         return h
+
+    def _compensate_temperature_int(self, adc):
+        """Returns a (temperature in degrees celsius, t_fine) tuple, using
+        the datasheet's int32 reference algorithm.
+        """
+        T1 = self.dig_T1
+        var1 = (((adc >> 3) - (T1 << 1)) * self.dig_T2) >> 11
+        var2 = (((((adc >> 4) - T1) * ((adc >> 4) - T1)) >> 12) * self.dig_T3) >> 14
+        t_fine = var1 + var2
+        return (((t_fine * 5 + 128) >> 8) / 100.0, t_fine)
+
+    def _compensate_pressure_int(self, adc, t_fine):
+        """Returns the pressure in Pascals, using the datasheet's int64
+        reference algorithm.
+        """
+        var1 = t_fine - 128000
+        var2 = var1 * var1 * self.dig_P6
+        var2 = var2 + ((var1 * self.dig_P5) << 17)
+        var2 = var2 + (self.dig_P4 << 35)
+        var1 = ((var1 * var1 * self.dig_P3) >> 8) + ((var1 * self.dig_P2) << 12)
+        var1 = (((1 << 47) + var1) * self.dig_P1) >> 33
+        if var1 == 0:
+            return 0
+        p = 1048576 - adc
+        p = _div(((p << 31) - var2) * 3125, var1)
+        var1 = (self.dig_P9 * (p >> 13) * (p >> 13)) >> 25
+        var2 = (self.dig_P8 * p) >> 19
+        p = ((p + var1 + var2) >> 8) + (self.dig_P7 << 4)
+        # Q24.8 fixed point
+        return p / 256.0
+
+    def _compensate_humidity_int(self, adc, t_fine):
+        """Returns the relative humidity in percent, using the datasheet's
+        int32 reference algorithm.
+        """
+        h = t_fine - 76800
+        h = (
+            (((adc << 14) - (self.dig_H4 << 20) - (self.dig_H5 * h)) + 16384) >> 15
+        ) * (
+            (
+                (
+                    (
+                        (
+                            ((h * self.dig_H6) >> 10)
+                            * (((h * self.dig_H3) >> 11) + 32768)
+                        )
+                        >> 10
+                    )
+                    + 2097152
+                )
+                * self.dig_H2
+                + 8192
+            )
+            >> 14
+        )
+        h = h - (((((h >> 15) * (h >> 15)) >> 7) * self.dig_H1) >> 4)
+        h = min(max(h, 0), 419430400)
+        # Q22.10 fixed point
+        return (h >> 12) / 1024.0
+
+    def read_all(self):
+        """Takes a new snapshot and returns the compensated
+        (temperature, pressure, humidity) tuple in degrees celsius,
+        Pascals and percent.
+        """
+        adc_T, adc_P, adc_H = self.read_raw_all()
+        temp, self.t_fine = self._compensate_temperature(adc_T)
+        return (
+            temp,
+            self._compensate_pressure(adc_P, self.t_fine),
+            self._compensate_humidity(adc_H, self.t_fine),
+        )
+
+    def read_temperature(self):
+        """Gets the compensated temperature in degrees celsius.
+        Takes a new snapshot of all data registers.
+        """
+        temp, self.t_fine = self._compensate_temperature(self.read_raw_temp())
+        return temp
+
+    def read_pressure(self):
+        """Gets the compensated pressure in Pascals.
+        Takes a new snapshot of all data registers.
+        """
+        adc_T, adc_P, _ = self.read_raw_all()
+        _, self.t_fine = self._compensate_temperature(adc_T)
+        return self._compensate_pressure(adc_P, self.t_fine)
+
+    def read_humidity(self):
+        """Gets the compensated relative humidity.
+        Takes a new snapshot of all data registers.
+        """
+        adc_T, _, adc_H = self.read_raw_all()
+        _, self.t_fine = self._compensate_temperature(adc_T)
+        return self._compensate_humidity(adc_H, self.t_fine)
+
+
+def compensate_batch(adc_T, adc_P, adc_H, calibration):
+    """Compensates arrays of raw temperature, pressure and humidity readings
+    in one pass, using the floating point formulas.
+
+    The raw readings can be NumPy arrays or any sequence of ints, eg.
+    array.array. calibration is a dict as returned by
+    BME280.get_calibration(). Returns a (temperature, pressure, humidity)
+    tuple of arrays in degrees celsius, Pascals and percent, with t_fine
+    computed per element. If NumPy is available the work is vectorized and
+    NumPy arrays are returned, otherwise array.array('d') is returned.
+    """
+    if numpy is None:
+        return _compensate_batch_python(adc_T, adc_P, adc_H, calibration)
+
+    c = calibration
+    UT = numpy.asarray(adc_T, dtype=numpy.float64)
+    adc_P = numpy.asarray(adc_P, dtype=numpy.float64)
+    adc_H = numpy.asarray(adc_H, dtype=numpy.float64)
+
+    var1 = (UT / 16384.0 - c["dig_T1"] / 1024.0) * float(c["dig_T2"])
+    var2 = (
+        (UT / 131072.0 - c["dig_T1"] / 8192.0) * (UT / 131072.0 - c["dig_T1"] / 8192.0)
+    ) * float(c["dig_T3"])
+    t_fine = numpy.trunc(var1 + var2)
+    temp = (var1 + var2) / 5120.0
+
+    var1 = t_fine / 2.0 - 64000.0
+    var2 = var1 * var1 * c["dig_P6"] / 32768.0
+    var2 = var2 + var1 * c["dig_P5"] * 2.0
+    var2 = var2 / 4.0 + c["dig_P4"] * 65536.0
+    var1 = (c["dig_P3"] * var1 * var1 / 524288.0 + c["dig_P2"] * var1) / 524288.0
+    var1 = (1.0 + var1 / 32768.0) * c["dig_P1"]
+    valid = var1 != 0
+    p = 1048576.0 - adc_P
+    p = ((p - var2 / 4096.0) * 6250.0) / numpy.where(valid, var1, 1.0)
+    var1 = c["dig_P9"] * p * p / 2147483648.0
+    var2 = p * c["dig_P8"] / 32768.0
+    p = p + (var1 + var2 + c["dig_P7"]) / 16.0
+    pressure = numpy.where(valid, p, 0.0)
+
+    h = t_fine - 76800.0
+    h = (adc_H - (c["dig_H4"] * 64.0 + c["dig_H5"] / 16384.8 * h)) * (
+        c["dig_H2"]
+        / 65536.0
+        * (1.0 + c["dig_H6"] / 67108864.0 * h * (1.0 + c["dig_H3"] / 67108864.0 * h))
+    )
+    h = h * (1.0 - c["dig_H1"] * h / 524288.0)
+    humidity = numpy.clip(h, 0.0, 100.0)
+
+    return (temp, pressure, humidity)
+
+
+def _compensate_batch_python(adc_T, adc_P, adc_H, calibration):
+    # Reuse the scalar formulas on a driver instance that has no device.
+    sensor = BME280.__new__(BME280)
+    sensor.set_calibration(calibration)
+    temp, pressure, humidity = array("d"), array("d"), array("d")
+    for t, p, h in zip(adc_T, adc_P, adc_H):
+        value, t_fine = sensor._compensate_temperature(t)
+        temp.append(value)
+        pressure.append(sensor._compensate_pressure(p, t_fine))
+        humidity.append(sensor._compensate_humidity(h, t_fine))
+    return (temp, pressure, humidity)
@@ -27,9 +27,11 @@
 # support.
 #
 
+from contextlib import contextmanager
 import logging
 import subprocess
-from smbus2 import SMBusWrapper
+import threading
+from smbus2 import SMBus
 from nido.lib.Adafruit_GPIO import Platform
 
 
@@ -68,6 +70,76 @@ def get_default_bus():
         raise RuntimeError("Could not determine default I2C bus for platform.")
 
 
+class Bus(object):
+    """Long-lived handle to an I2C bus, shared by every Device on that bus.
+
+    The underlying SMBus file descriptor is opened on first use and kept
+    open between transactions. Access is serialized with a lock, and the
+    handle is dropped after any I/O error so that the next transaction
+    reopens the bus from scratch.
+    """
+
+    def __init__(self, busnum):
+        self._busnum = busnum
+        self._smbus = None
+        self._lock = threading.RLock()
+        self._logger = logging.getLogger("Adafruit_I2C.Bus.{0}".format(busnum))
+
+    @property
+    def is_open(self):
+        return self._smbus is not None
+
+    def open(self):
+        """Open the bus if it is not already open."""
+        with self._lock:
+            if self._smbus is None:
+                self._smbus = SMBus(self._busnum)
+                self._logger.debug("Opened I2C bus %d", self._busnum)
+
+    def close(self):
+        """Close the bus. It will be reopened by the next transaction."""
+        with self._lock:
+            if self._smbus is not None:
+                try:
+                    self._smbus.close()
+                finally:
+                    self._smbus = None
+                self._logger.debug("Closed I2C bus %d", self._busnum)
+
+    @contextmanager
+    def borrow(self):
+        """Yield the open SMBus handle while holding the bus lock."""
+        with self._lock:
+            self.open()
+            try:
+                yield self._smbus
+            except (IOError, OSError):
+                self._logger.debug("I/O error on bus %d, reopening", self._busnum)
+                self.close()
+                raise
+
+
+_buses = {}
+_buses_lock = threading.Lock()
+
+
+def get_bus(busnum):
+    """Return the shared Bus handle for the specified bus number."""
+    with _buses_lock:
+        bus = _buses.get(busnum)
+        if bus is None:
+            bus = _buses[busnum] = Bus(busnum)
+    return bus
+
+
+def close_all():
+    """Close every open bus handle, eg. on process shutdown."""
+    with _buses_lock:
+        buses = list(_buses.values())
+    for bus in buses:
+        bus.close()
+
+
 def get_i2c_device(address, busnum=None, **kwargs):
     """Return an I2C device for the specified address and on the
     specified bus. If busnum isn't specified, the default I2C bus for
@@ -114,29 +186,40 @@ class Device(object):
         on the specified I2C bus number.
         """
         self._address = address
-        self._bus = busnum
+        self._busnum = busnum
+        self._bus = get_bus(busnum)
         self._logger = logging.getLogger(
             "Adafruit_I2C.Device.Bus.{0}.Address.{1:#0X}".format(busnum, address)
         )
 
+    def open(self):
+        """Open the shared handle to this device's bus."""
+        self._bus.open()
+
+    def close(self):
+        """Close the shared handle to this device's bus. Other devices on
+        the same bus will transparently reopen it on their next access.
+        """
+        self._bus.close()
+
     def writeRaw8(self, value):
         """Write an 8-bit value on the bus (without register)."""
         value = value & 0xFF
-        with SMBusWrapper(self._bus) as bus:
+        with self._bus.borrow() as bus:
             bus.write_byte(self._address, value)
         self._logger.debug("Wrote 0x%02X", value)
 
     def write8(self, register, value):
         """Write an 8-bit value to the specified register."""
         value = value & 0xFF
-        with SMBusWrapper(self._bus) as bus:
+        with self._bus.borrow() as bus:
             bus.write_byte_data(self._address, register, value)
         self._logger.debug("Wrote 0x%02X to register 0x%02X", value, register)
 
     def write16(self, register, value):
         """Write a 16-bit value to the specified register."""
         value = value & 0xFFFF
-        with SMBusWrapper(self._bus) as bus:
+        with self._bus.borrow() as bus:
             bus.write_word_data(self._address, register, value)
         self._logger.debug(
             "Wrote 0x%04X to register pair 0x%02X, 0x%02X",
@@ -147,14 +230,14 @@ class Device(object):
 
     def writeList(self, register, data):
         """Write bytes to the specified register."""
-        with SMBusWrapper(self._bus) as bus:
+        with self._bus.borrow() as bus:
             bus.write_i2c_block_data(self._address, register, data)
         self._logger.debug("Wrote to register 0x%02X: %s", register, data)
 
     def readList(self, register, length):
         """Read a length number of bytes from the specified register.
         Results will be returned as a bytearray."""
-        with SMBusWrapper(self._bus) as bus:
+        with self._bus.borrow() as bus:
             results = bus.read_i2c_block_data(self._address, register, length)
         self._logger.debug(
             "Read the following from register 0x%02X: %s", register, results
@@ -163,14 +246,14 @@ class Device(object):
 
     def readRaw8(self):
         """Read an 8-bit value on the bus (without register)."""
-        with SMBusWrapper(self._bus) as bus:
+        with self._bus.borrow() as bus:
             result = bus.read_byte(self._address) & 0xFF
         self._logger.debug("Read 0x%02X", result)
         return result
 
     def readU8(self, register):
         """Read an unsigned byte from the specified register."""
-        with SMBusWrapper(self._bus) as bus:
+        with self._bus.borrow() as bus:
             result = bus.read_byte_data(self._address, register) & 0xFF
         self._logger.debug("Read 0x%02X from register 0x%02X", result, register)
         return result
@@ -187,7 +270,7 @@ class Device(object):
         with the specified endianness (default little endian, or least
         significant byte first).
         """
-        with SMBusWrapper(self._bus) as bus:
+        with self._bus.borrow() as bus:
             result = bus.read_word_data(self._address, register) & 0xFFFF
         self._logger.debug(
             "Read 0x%04X from register pair 0x%02X, 0x%02X",
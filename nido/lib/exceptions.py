@@ -60,3 +60,7 @@ class SensorError(NidoDaemonError):
 
 class ThermostatError(NidoDaemonError):
     """Exception class for errors generated by the thermostat."""
+
+
+class SpoolError(NidoDaemonError):
+    """Exception class for errors generated by the telemetry spool."""
@@ -0,0 +1,122 @@
+#   Nido, a Raspberry Pi-based home thermostat.
+#
+#   Copyright (C) 2016 Alex Marshall
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.
+#   If not, see <http://www.gnu.org/licenses/>.
+
+"""InfluxDB line protocol encoding.
+
+A line is <measurement>[,<tag>=<value>...] <field>=<value>[,...] <time>,
+with the time in nanoseconds. See:
+https://docs.influxdata.com/influxdb/v1.8/write_protocols/line_protocol_reference/
+"""
+
+import math
+
+_MEASUREMENT_ESCAPES = str.maketrans({",": "\\,", " ": "\\ "})
+_KEY_ESCAPES = str.maketrans({",": "\\,", "=": "\\=", " ": "\\ "})
+_STRING_ESCAPES = str.maketrans({'"': '\\"', "\\": "\\\\"})
+
+
+def escape_measurement(name):
+    return name.translate(_MEASUREMENT_ESCAPES)
+
+
+def escape_key(key):
+    """Escapes a tag key, tag value or field key."""
+    return key.translate(_KEY_ESCAPES)
+
+
+def format_field(value):
+    """Returns a field value in line protocol, typed by its Python type, or
+    None if it can't be written (None, NaN or infinity).
+    """
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    elif isinstance(value, int):
+        return "{}i".format(value)
+    elif isinstance(value, float):
+        return repr(value) if math.isfinite(value) else None
+    elif value is None:
+        return None
+    return '"{}"'.format(str(value).translate(_STRING_ESCAPES))
+
+
+def _series(measurement, tags):
+    parts = [escape_measurement(measurement)]
+    for key in sorted(tags):
+        if tags[key] not in (None, ""):
+            parts.append("{}={}".format(escape_key(key), escape_key(str(tags[key]))))
+    return ",".join(parts)
+
+
+def encode_line(measurement, tags, fields, timestamp):
+    """Returns one line of line protocol, or None if none of the fields
+    have a value that can be written.
+
+    tags and fields are dicts. Tags are written sorted by key and empty
+    tags are left out. Fields are written in order, typed as in
+    format_field(). timestamp is an integer in nanoseconds, e.g. from
+    time.time_ns().
+    """
+    values = []
+    for key, value in fields.items():
+        value = format_field(value)
+        if value is not None:
+            values.append("{}={}".format(escape_key(key), value))
+    if not values:
+        return None
+    return "{} {} {:d}".format(_series(measurement, tags), ",".join(values), timestamp)
+
+
+class LineSchema(object):
+    """Encoder for a series whose tags and field types are fixed, such as
+    the thermostat's own telemetry.
+
+    The escaped series and field keys are joined into a format string once,
+    so encoding a line is a single % operation. Fields are float, int or
+    bool. Values are given as a tuple in field order; if any is None, NaN
+    or infinite, the line is encoded with encode_line() instead, which
+    leaves those fields out.
+    """
+
+    _FORMATS = {float: "%s", int: "%di", bool: "%s"}
+
+    def __init__(self, measurement, tags, fields):
+        """fields is a sequence of (key, type) pairs."""
+        self.measurement = measurement
+        self.tags = dict(tags)
+        self.keys = tuple(key for key, _ in fields)
+        self.types = tuple(ftype for _, ftype in fields)
+        try:
+            values = ",".join(
+                "{}={}".format(escape_key(key).replace("%", "%%"), self._FORMATS[ftype])
+                for key, ftype in fields
+            )
+        except KeyError as e:
+            raise ValueError("Unsupported field type: {}".format(e.args[0]))
+        series = _series(measurement, self.tags).replace("%", "%%")
+        self._template = "{} {} %d".format(series, values)
+        return None
+
+    def encode(self, values, timestamp):
+        # The sum is only finite if every value is
+        if None in values or not math.isfinite(sum(values)):
+            fields = {
+                key: None if value is None else ftype(value)
+                for key, ftype, value in zip(self.keys, self.types, values)
+            }
+            return encode_line(self.measurement, self.tags, fields, timestamp)
+        return self._template % (values + (timestamp,))
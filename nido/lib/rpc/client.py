@@ -16,14 +16,20 @@
 #   along with this program.
 #   If not, see <http://www.gnu.org/licenses/>.
 
+from collections import deque
 from contextlib import contextmanager
 import logging
+import os
+import threading
+import time
 
 import rpyc
 from rpyc.utils.classic import obtain
+from rpyc.utils.factory import unix_connect
 from apscheduler.jobstores.base import JobLookupError, ConflictingIdError
 
 from nido.lib.exceptions import (
+    NidoDaemonError,
     SchedulerClientError,
     ThermostatClientError,
     ControllerError,
@@ -31,92 +37,290 @@ from nido.lib.exceptions import (
     SensorError,
 )
 from nido.lib import Status
+from nido.lib.rpc.framed import FramedRPCConnection
 
 
-class NidoDaemonRPCClient(object):
-    def __init__(self, host, port):
-        self._host = host
-        self._port = port
+class RPCConnectionPool(object):
+    """Thread-safe pool of persistent connections to the Nido daemon.
+
+    Connections are borrowed with connection() and returned to the pool
+    afterwards, rather than opened and closed for every call. A connection
+    that has been idle for longer than ping_interval seconds is checked
+    with a ping before it is handed out, and one that has been idle for
+    longer than max_idle seconds is closed. Failed connection attempts are
+    retried with exponential backoff, and at most max_size connections
+    are open at any time.
+    """
+
+    def __init__(
+        self,
+        connect,
+        max_size=4,
+        max_idle=60,
+        ping_interval=10,
+        timeout=5,
+        retries=3,
+        backoff=0.1,
+    ):
+        self._connect = connect
+        self._max_size = max_size
+        self._max_idle = max_idle
+        self._ping_interval = ping_interval
+        self._timeout = timeout
+        self._retries = retries
+        self._backoff = backoff
+        self._idle = deque()
+        self._size = 0
+        self._cond = threading.Condition()
         self._l = logging.getLogger(__name__)
         return None
 
-    def _is_connected(self):
-        return not self._connection.closed
+    def _healthy(self, conn, last_used):
+        idle = time.monotonic() - last_used
+        if conn.closed or idle > self._max_idle:
+            return False
+        if idle > self._ping_interval:
+            try:
+                conn.ping(timeout=self._timeout)
+            except Exception:
+                return False
+        return True
+
+    def _create(self):
+        delay = self._backoff
+        for attempt in range(self._retries + 1):
+            try:
+                return self._connect()
+            except (OSError, EOFError) as e:
+                if attempt == self._retries:
+                    raise
+                self._l.warning("RPC connection failed, retrying: {}".format(e))
+                time.sleep(delay)
+                delay *= 2
+
+    def _acquire(self):
+        deadline = time.monotonic() + self._timeout
+        while True:
+            with self._cond:
+                if self._idle:
+                    conn, last_used = self._idle.pop()
+                elif self._size < self._max_size:
+                    self._size += 1
+                    conn = None
+                else:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0 or not self._cond.wait(remaining):
+                        raise NidoDaemonError("No RPC connection available.")
+                    continue
+            if conn is None:
+                try:
+                    return self._create()
+                except BaseException:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+            if self._healthy(conn, last_used):
+                return conn
+            self._discard(conn)
+
+    def _close(self, conn):
+        # Caller holds self._cond
+        self._size -= 1
+        try:
+            conn.close()
+        except Exception:
+            pass
+        return None
 
-    def _connect(self):
-        self._connection = rpyc.connect(
-            self._host,
-            self._port,
-            config={"allow_pickle": True, "instantiate_custom_exceptions": True},
-        )
-        self.r = self._connection.root
+    def _release(self, conn):
+        with self._cond:
+            self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
         return None
 
-    def _disconnect(self):
-        if self._is_connected:
-            self._connection.close()
+    def _discard(self, conn):
+        with self._cond:
+            self._close(conn)
+            self._cond.notify()
+        return None
+
+    @contextmanager
+    def connection(self):
+        """Borrows a connection for the duration of the context. The
+        connection is discarded instead of returned if the connection
+        itself failed.
+        """
+        conn = self._acquire()
+        try:
+            yield conn
+        except (EOFError, OSError):
+            self._discard(conn)
+            raise
+        except BaseException:
+            if conn.closed:
+                self._discard(conn)
+            else:
+                self._release(conn)
+            raise
+        else:
+            self._release(conn)
+        return None
+
+    def close(self):
+        """Closes all idle connections."""
+        with self._cond:
+            while self._idle:
+                self._close(self._idle.pop()[0])
+        return None
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+_pools_pid = None
+
+
+def get_pool(host, port, transport="rpyc", socket_path=None, **kwargs):
+    """Returns the connection pool for host and port, or for the Unix
+    socket at socket_path if given, shared by all clients in the current
+    process. Pools are not inherited across fork(), so each gunicorn worker
+    gets its own.
+    """
+    global _pools_pid
+    with _pools_lock:
+        if _pools_pid != os.getpid():
+            _pools.clear()
+            _pools_pid = os.getpid()
+        key = (transport, socket_path) if socket_path else (transport, host, port)
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _pools[key] = RPCConnectionPool(
+                lambda: _connect(host, port, transport, socket_path), **kwargs
+            )
+    return pool
+
+
+def _connect(host, port, transport="rpyc", socket_path=None):
+    if transport == "framed":
+        if socket_path:
+            return FramedRPCConnection.connect_unix(socket_path)
+        return FramedRPCConnection.connect(host, port)
+    elif transport == "rpyc":
+        config = {"allow_pickle": True, "instantiate_custom_exceptions": True}
+        if socket_path:
+            return unix_connect(socket_path, config=config)
+        return rpyc.connect(host, port, config=config)
+    raise NidoDaemonError("Unknown RPC transport: {}".format(transport))
+
+
+class NidoDaemonRPCClient(object):
+    _error = NidoDaemonError
+
+    def __init__(self, host, port, transport="rpyc", socket_path=None, **pool_kwargs):
+        """transport is either "rpyc" or "framed" (see
+        nido.lib.rpc.framed), and must match the daemon. If socket_path is
+        given, the daemon is reached through that Unix socket instead of
+        host and port. Any additional keyword arguments configure the
+        process-wide connection pool when it is first created.
+        """
+        self._host = host
+        self._port = port
+        self._pool = get_pool(
+            host, port, transport=transport, socket_path=socket_path, **pool_kwargs
+        )
+        self._l = logging.getLogger(__name__)
         return None
 
     @contextmanager
     def _rpc_session(self):
-        self._connect()
+        """Borrows a pooled connection and yields its root service. Clients
+        hold no per-call state, so one client can be shared across threads.
+        """
         try:
-            yield
+            with self._pool.connection() as conn:
+                yield conn.root
         except (ControllerError, ThermostatError, SensorError) as e:
-            raise ThermostatClientError(e)
+            raise ThermostatClientError(e.msg)
         except (JobLookupError, ConflictingIdError) as e:
-            raise SchedulerClientError(e)
-        finally:
-            pass
-            self._disconnect()
+            # Only seen over rpyc; the framed transport raises
+            # SchedulerClientError with the same message
+            raise SchedulerClientError(e.args[0] if e.args else type(e).__name__)
+        except (EOFError, OSError) as e:
+            raise self._error("Could not reach the Nido daemon: {}".format(e))
+        except NidoDaemonError as e:
+            if isinstance(e, (ThermostatClientError, SchedulerClientError)):
+                raise
+            raise self._error(e.msg)
         return None
 
 
 class ThermostatClient(NidoDaemonRPCClient):
     """RPC client service to get and set thermostat settings."""
 
+    _error = ThermostatClientError
+
     def get_mode(self):
-        with self._rpc_session():
-            mode = self.r.get_mode()
+        with self._rpc_session() as r:
+            mode = r.get_mode()
         return int(mode)
 
     def set_mode(self, mode):
-        with self._rpc_session():
-            self.r.set_mode(mode)
+        with self._rpc_session() as r:
+            r.set_mode(mode)
         return None
 
     def get_temp_units(self):
-        with self._rpc_session():
-            celsius = self.r.get_temp_units()
+        with self._rpc_session() as r:
+            celsius = r.get_temp_units()
         return celsius
 
     def set_temp_units(self, units):
-        with self._rpc_session():
-            self.r.set_temp_units(units)
+        with self._rpc_session() as r:
+            r.set_temp_units(units)
 
     def get_set_temp(self):
-        with self._rpc_session():
-            set_temp = self.r.get_set_temp()
+        with self._rpc_session() as r:
+            set_temp = r.get_set_temp()
         return float(set_temp)
 
     def set_temp(self, temp, scale):
-        with self._rpc_session():
-            self.r.set_temp(temp, scale)
+        with self._rpc_session() as r:
+            r.set_temp(temp, scale)
 
     def get_conditions(self):
-        with self._rpc_session():
-            sensor_data = self.r.get_sensor_data()
+        with self._rpc_session() as r:
+            sensor_data = r.get_sensor_data()
             conditions = obtain(sensor_data)
         return conditions
 
+    def get_snapshot(self):
+        with self._rpc_session() as r:
+            snapshot = obtain(r.get_snapshot())
+        return snapshot
+
+    def set_settings(self, mode=None, temp=None, scale=None, units=None):
+        with self._rpc_session() as r:
+            r.set_settings(mode=mode, temp=temp, scale=scale, celsius=units)
+        return None
+
+    def get_history(self, start, end, limit=None, points=None):
+        with self._rpc_session() as r:
+            history = obtain(r.get_history(start, end, limit, points))
+        return history
+
+    def get_server_stats(self):
+        with self._rpc_session() as r:
+            stats = obtain(r.get_server_stats())
+        return stats
+
     def get_state(self):
-        with self._rpc_session():
-            status = int(self.r.get_controller_status())
+        with self._rpc_session() as r:
+            status = int(r.get_controller_status())
         return status
 
     def wakeup(self):
-        with self._rpc_session():
-            self.r.wakeup()
+        with self._rpc_session() as r:
+            r.wakeup()
         return None
 
 
@@ -125,19 +329,22 @@ class SchedulerClient(NidoDaemonRPCClient):
     jobs.
     """
 
-    def get_scheduled_jobs(self, callback, jobstore=None):
-        with self._rpc_session():
-            self.r.get_jobs(callback, jobstore=jobstore)
-        return None
+    _error = SchedulerClientError
 
-    def get_scheduled_job(self, callback, job_id):
-        with self._rpc_session():
-            self.r.get_job(callback, job_id)
-        return None
+    def get_scheduled_jobs(self, jobstore=None):
+        with self._rpc_session() as r:
+            jobs = obtain(r.get_jobs(jobstore=jobstore))
+        return jobs
+
+    def get_scheduled_job(self, job_id):
+        with self._rpc_session() as r:
+            job = obtain(r.get_job(job_id))
+        if job is None:
+            raise SchedulerClientError("No job exists with that ID.")
+        return job
 
     def add_scheduled_job(
         self,
-        callback,
         type,
         day_of_week=None,
         hour=None,
@@ -151,9 +358,8 @@ class SchedulerClient(NidoDaemonRPCClient):
             type, mode=mode, temp=temp, scale=scale
         )
         self._check_cron_parameters(day_of_week=day_of_week, hour=hour, minute=minute)
-        with self._rpc_session():
-            self.r.add_job(
-                callback,
+        with self._rpc_session() as r:
+            job = r.add_job(
                 "nido.lib.rpc.server:NidoDaemonService.{}".format(func),
                 args=args,
                 name=name,
@@ -164,52 +370,52 @@ class SchedulerClient(NidoDaemonRPCClient):
                 hour=hour,
                 minute=minute,
             )
-        return None
+            job = obtain(job)
+        return job
 
-    def modify_scheduled_job(
-        self, callback, job_id, type=None, mode=None, temp=None, scale=None
-    ):
+    def modify_scheduled_job(self, job_id, type=None, mode=None, temp=None, scale=None):
         func, args, name = self._parse_mode_settings(
             type, mode=mode, temp=temp, scale=scale
         )
-        with self._rpc_session():
-            self.r.modify_job(
-                callback,
+        with self._rpc_session() as r:
+            job = r.modify_job(
                 job_id,
                 func="nido.lib.rpc.server:NidoDaemonService.{}".format(func),
                 args=args,
                 name=name,
             )
-        return None
+            job = obtain(job)
+        return job
 
-    def reschedule_job(
-        self, callback, job_id, day_of_week=None, hour=None, minute=None
-    ):
+    def reschedule_job(self, job_id, day_of_week=None, hour=None, minute=None):
         self._check_cron_parameters(day_of_week=day_of_week, hour=hour, minute=minute)
-        with self._rpc_session():
-            self.r.reschedule_job(
-                callback,
+        with self._rpc_session() as r:
+            job = r.reschedule_job(
                 job_id,
                 trigger="cron",
                 day_of_week=day_of_week,
                 hour=hour,
                 minute=minute,
             )
-        return None
-
-    def pause_scheduled_job(self, callback, job_id):
-        with self._rpc_session():
-            self.r.pause_job(callback, job_id)
-        return None
-
-    def resume_scheduled_job(self, callback, job_id):
-        with self._rpc_session():
-            self.r.resume_job(callback, job_id)
-        return None
+            job = obtain(job)
+        return job
+
+    def pause_scheduled_job(self, job_id):
+        with self._rpc_session() as r:
+            job = obtain(r.pause_job(job_id))
+        return job
+
+    def resume_scheduled_job(self, job_id):
+        """Returns the resumed job, or None if it would not have run again
+        and was removed instead.
+        """
+        with self._rpc_session() as r:
+            job = obtain(r.resume_job(job_id))
+        return job
 
     def remove_scheduled_job(self, job_id):
-        with self._rpc_session():
-            self.r.remove_job(job_id)
+        with self._rpc_session() as r:
+            r.remove_job(job_id)
         return None
 
     def _parse_mode_settings(self, type, mode=None, temp=None, scale=None):
@@ -0,0 +1,295 @@
+#   Nido, a Raspberry Pi-based home thermostat.
+#
+#   Copyright (C) 2016 Alex Marshall
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.
+#   If not, see <http://www.gnu.org/licenses/>.
+
+"""Lightweight RPC transport for the Nido daemon.
+
+Messages are JSON objects, each prefixed with its length as a 4-byte
+big-endian integer. A request is {"method", "args", "kwargs"} and the
+response is either {"result"} or {"error": {"type", "message"}}. Only the
+methods in the table given to the server can be called, and only plain
+JSON values are exchanged, so unlike rpyc no remote object references or
+pickled data cross the connection.
+"""
+
+import asyncio
+from functools import partial
+import json
+import logging
+import socket
+import struct
+
+from apscheduler.jobstores.base import JobLookupError, ConflictingIdError
+
+from nido.lib.exceptions import (
+    NidoDaemonError,
+    DBError,
+    SchedulerClientError,
+    ThermostatClientError,
+    ControllerError,
+    SensorError,
+    ThermostatError,
+)
+
+HEADER = struct.Struct("!I")
+MAX_FRAME_SIZE = 1024 * 1024
+
+# Exceptions that are raised again by the client, by type name
+_ERRORS = {
+    e.__name__: e
+    for e in (
+        NidoDaemonError,
+        DBError,
+        SchedulerClientError,
+        ThermostatClientError,
+        ControllerError,
+        SensorError,
+        ThermostatError,
+    )
+}
+_ERRORS[JobLookupError.__name__] = SchedulerClientError
+_ERRORS[ConflictingIdError.__name__] = SchedulerClientError
+
+
+def pack(message):
+    """Returns message encoded as a length-prefixed frame."""
+    body = json.dumps(message, separators=(",", ":")).encode("utf-8")
+    if len(body) > MAX_FRAME_SIZE:
+        raise NidoDaemonError("RPC message too large: {} bytes".format(len(body)))
+    return HEADER.pack(len(body)) + body
+
+
+def _error_message(e):
+    if isinstance(e, NidoDaemonError):
+        return str(e.msg)
+    elif e.args:
+        return str(e.args[0])
+    return type(e).__name__
+
+
+class FramedRPCServer(object):
+    """asyncio server for the framed protocol.
+
+    methods maps each callable name to a function. Calls are blocking (I2C,
+    SQLite), so they run in executor, or the event loop's default executor,
+    while the loop keeps serving other connections. Methods named in inline
+    must not block and are called on the loop itself. Requests on one
+    connection are handled in order.
+    """
+
+    def __init__(
+        self,
+        methods,
+        hostname=None,
+        port=0,
+        socket_path=None,
+        executor=None,
+        inline=(),
+    ):
+        """Listens on socket_path, a Unix domain socket, if given, or on
+        hostname and port otherwise. Like rpyc's servers, the socket is
+        bound here so that port is known before start() is called.
+        """
+        self._methods = dict(methods)
+        self._executor = executor
+        self._inline = frozenset(inline)
+        if socket_path is not None:
+            self._listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self._listener.bind(socket_path)
+            self._listener.listen(socket.SOMAXCONN)
+            self.port = socket_path
+        else:
+            self._listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self._listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            self._listener.bind((hostname or "", port))
+            self._listener.listen(socket.SOMAXCONN)
+            self.port = self._listener.getsockname()[1]
+        self.active = False
+        self._loop = None
+        self._stop = None
+        self._l = logging.getLogger(__name__)
+        return None
+
+    def start(self):
+        """Runs the server on a new event loop until close() is called.
+        Blocking.
+        """
+        asyncio.run(self.serve())
+        return None
+
+    def close(self):
+        """Stops the server. Safe to call from any thread or a signal
+        handler.
+        """
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._stop.set)
+        return None
+
+    async def serve(self):
+        """Serves on the running event loop until close() is called."""
+        self._loop = asyncio.get_running_loop()
+        self._stop = asyncio.Event()
+        if self._listener.family == socket.AF_UNIX:
+            server = await asyncio.start_unix_server(self._handle, sock=self._listener)
+        else:
+            server = await asyncio.start_server(self._handle, sock=self._listener)
+        self._l.info("RPC server listening on {}".format(self.port))
+        self.active = True
+        try:
+            async with server:
+                await self._stop.wait()
+        finally:
+            self.active = False
+        return None
+
+    async def _handle(self, reader, writer):
+        try:
+            while True:
+                try:
+                    (size,) = HEADER.unpack(await reader.readexactly(HEADER.size))
+                    if size > MAX_FRAME_SIZE:
+                        self._l.warning("Dropping client: frame too large")
+                        break
+                    request = json.loads(await reader.readexactly(size))
+                except asyncio.IncompleteReadError:
+                    break
+                except ValueError:
+                    self._l.warning("Dropping client: invalid message")
+                    break
+                writer.write(await self._dispatch(request))
+                await writer.drain()
+        except (ConnectionError, OSError) as e:
+            self._l.debug("RPC connection lost: {}".format(e))
+        except asyncio.CancelledError:
+            # The server is shutting down with this client still connected
+            pass
+        finally:
+            writer.close()
+        return None
+
+    async def _dispatch(self, request):
+        """Runs the requested call and returns the packed response."""
+        try:
+            method = request["method"]
+            if method == "ping":
+                return pack({"result": None})
+            try:
+                func = self._methods[method]
+            except KeyError:
+                raise NidoDaemonError("Unknown RPC method: {}".format(method))
+            call = partial(func, *request.get("args", []), **request.get("kwargs", {}))
+            if method in self._inline:
+                result = call()
+            else:
+                result = await self._loop.run_in_executor(self._executor, call)
+            return pack({"result": result})
+        except Exception as e:
+            if not isinstance(e, (NidoDaemonError, JobLookupError, ConflictingIdError)):
+                self._l.exception("Error in RPC call")
+            return pack(
+                {"error": {"type": type(e).__name__, "message": _error_message(e)}}
+            )
+
+
+class _Root(object):
+    """Exposes calls as attributes, like the root of an rpyc connection."""
+
+    def __init__(self, conn):
+        self._conn = conn
+        return None
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return partial(self._conn.call, name)
+
+
+class FramedRPCConnection(object):
+    """Blocking client connection for the framed protocol, with the subset
+    of the rpyc connection interface used by RPCConnectionPool.
+    """
+
+    def __init__(self, sock, timeout=30):
+        self._sock = sock
+        self._sock.settimeout(timeout)
+        self._timeout = timeout
+        self.closed = False
+        self.root = _Root(self)
+        return None
+
+    @classmethod
+    def connect(cls, host, port, timeout=30):
+        sock = socket.create_connection((host, port), timeout=timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return cls(sock, timeout=timeout)
+
+    @classmethod
+    def connect_unix(cls, path, timeout=30):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.settimeout(timeout)
+            sock.connect(path)
+        except OSError:
+            sock.close()
+            raise
+        return cls(sock, timeout=timeout)
+
+    def call(self, method, *args, **kwargs):
+        if self.closed:
+            raise EOFError("Connection is closed")
+        try:
+            self._sock.sendall(pack({"method": method, "args": args, "kwargs": kwargs}))
+            (size,) = HEADER.unpack(self._recv(HEADER.size))
+            response = json.loads(self._recv(size))
+        except BaseException:
+            # The stream is no longer in a known state
+            self.close()
+            raise
+
+        if "error" in response:
+            error = response["error"]
+            cls = _ERRORS.get(error["type"])
+            if cls is None:
+                raise NidoDaemonError("{}: {}".format(error["type"], error["message"]))
+            raise cls(error["message"])
+        return response["result"]
+
+    def ping(self, timeout=None):
+        if timeout is not None:
+            self._sock.settimeout(timeout)
+        try:
+            self.call("ping")
+        finally:
+            if not self.closed:
+                self._sock.settimeout(self._timeout)
+        return None
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self._sock.close()
+        return None
+
+    def _recv(self, size):
+        buf = bytearray(size)
+        view = memoryview(buf)
+        while view:
+            n = self._sock.recv_into(view)
+            if n == 0:
+                raise EOFError("Connection closed by the Nido daemon")
+            view = view[n:]
+        return buf
@@ -16,14 +16,74 @@
 #   along with this program.
 #   If not, see <http://www.gnu.org/licenses/>.
 
+from functools import partial
+
 import rpyc
+from apscheduler.triggers.cron import CronTrigger
+from apscheduler.triggers.date import DateTrigger
+from apscheduler.triggers.interval import IntervalTrigger
 
-from nido.supervisor.hardware import Controller, Sensor
+from nido.lib import Mode
+from nido.supervisor.config import HistoryConfig
+from nido.supervisor.hardware import Controller, SensorRegistry
+from nido.supervisor.history import HistoryStore
 from nido.supervisor.thermostat import Thermostat
-from nido.lib.exceptions import ThermostatError
-from nido.supervisor.datalogger import MQTTDataLogger
+from nido.lib.exceptions import ThermostatError, SchedulerClientError
 from nido.supervisor import db
 
+DATE_FORMAT = "%m/%d/%Y %H:%M:%S"
+
+
+def serialize_job(j):
+    """Converts apscheduler.job.Job object to a JSON representation, or
+    returns None if there is no job. Jobs are serialized in the daemon so
+    that clients receive plain data in a single response rather than
+    making a round trip for every attribute of a remote Job.
+
+    The 'trigger' representation varies depending on the trigger object that was
+    assigned to the job. Should be one of:
+        apscheduler.triggers.cron.CronTrigger
+        apscheduler.triggers.date.DateTrigger
+        apscheduler.triggers.interval.IntervalTrigger
+
+    The 'misfire_grace_time' key represents the time in seconds of how long the
+    job's execution is allowed to be late.
+
+    Full API documentation is available here:
+    https://apscheduler.readthedocs.io/en/v3.6.0/py-modindex.html
+    """
+    if j is None:
+        return None
+
+    t = j.trigger
+    if isinstance(t, DateTrigger):
+        trigger = {
+            "timezone": str(t.run_date.tzinfo),
+            "run_date": t.run_date.strftime(DATE_FORMAT),
+        }
+    elif isinstance(t, (CronTrigger, IntervalTrigger)):
+        trigger = {
+            "start_date": t.start_date.strftime(DATE_FORMAT) if t.start_date else None,
+            "end_date": t.end_date.strftime(DATE_FORMAT) if t.end_date else None,
+            "timezone": str(t.timezone),
+        }
+        if isinstance(t, CronTrigger):
+            trigger["cron"] = {f.name: str(f) for f in t.fields}
+        else:
+            trigger["interval"] = str(t.interval) if t.interval else None
+    else:
+        raise SchedulerClientError("Unknown trigger type: {}".format(type(t)))
+
+    return {
+        "id": str(j.id),
+        "name": str(j.name),
+        "misfire_grace_time": str(j.misfire_grace_time),
+        "next_run_time": (
+            j.next_run_time.strftime(DATE_FORMAT) if j.next_run_time else None
+        ),
+        "trigger": trigger,
+    }
+
 
 class NidoDaemonService(rpyc.Service):
     """Service class that is exposed via RPC.
@@ -36,52 +96,106 @@ class NidoDaemonService(rpyc.Service):
     /examples/rpc/server.py
     """
 
-    def __init__(self, scheduler):
+    # Methods callable over the framed transport (nido.lib.rpc.framed)
+    RPC_METHODS = (
+        "add_job",
+        "modify_job",
+        "reschedule_job",
+        "pause_job",
+        "resume_job",
+        "remove_job",
+        "get_job",
+        "get_jobs",
+        "get_mode",
+        "set_mode",
+        "get_temp_units",
+        "set_temp_units",
+        "get_set_temp",
+        "set_temp",
+        "get_snapshot",
+        "set_settings",
+        "get_controller_status",
+        "get_sensor_data",
+        "wakeup",
+        "get_history",
+        "get_server_stats",
+    )
+    # Methods that don't block and bypass the worker pool, so that it can
+    # be monitored while it is saturated
+    INLINE_METHODS = ("get_server_stats",)
+    # Service methods that scheduled jobs are allowed to run
+    JOB_FUNCS = ("set_mode", "set_temp", "set_settings")
+
+    def __init__(self, scheduler, workers=None):
+        """workers is an optional nido.lib.rpc.workers.RPCWorkerPool. Over
+        rpyc, calls are then run on it rather than directly on the
+        connection's thread.
+        """
         self._scheduler = scheduler
+        self._workers = workers
 
     def __call__(self, conn):
-        return self.__class__(self._scheduler)
+        return self.__class__(self._scheduler, self._workers)
 
-    def add_job(self, callback, func, *args, **kwargs):
-        job = self._scheduler.add_job(func, *args, **kwargs)
-        callback(job)
+    def _rpyc_getattr(self, name):
+        attr = getattr(self, name)
+        if (
+            self._workers is not None
+            and name in self.RPC_METHODS
+            and name not in self.INLINE_METHODS
+        ):
+            return partial(self._workers.call, attr)
+        return attr
+
+    def rpc_methods(self):
+        """Returns the method table for nido.lib.rpc.framed.FramedRPCServer."""
+        return {name: getattr(self, name) for name in self.RPC_METHODS}
+
+    def _check_job_func(self, func):
+        prefix = "{}:{}.".format(__name__, self.__class__.__name__)
+        if (
+            not isinstance(func, str)
+            or not func.startswith(prefix)
+            or func[len(prefix) :] not in self.JOB_FUNCS
+        ):
+            raise SchedulerClientError("Invalid job function: {}".format(func))
         return None
 
-    def modify_job(self, callback, job_id, jobstore=None, **changes):
+    def add_job(self, func, *args, **kwargs):
+        self._check_job_func(func)
+        job = self._scheduler.add_job(func, *args, **kwargs)
+        return serialize_job(job)
+
+    def modify_job(self, job_id, jobstore=None, **changes):
+        if "func" in changes:
+            self._check_job_func(changes["func"])
         job = self._scheduler.modify_job(job_id, jobstore, **changes)
-        callback(job)
-        return None
+        return serialize_job(job)
 
-    def reschedule_job(
-        self, callback, job_id, jobstore=None, trigger=None, **trigger_args
-    ):
+    def reschedule_job(self, job_id, jobstore=None, trigger=None, **trigger_args):
         job = self._scheduler.reschedule_job(job_id, jobstore, trigger, **trigger_args)
-        callback(job)
-        return None
+        return serialize_job(job)
 
-    def pause_job(self, callback, job_id, jobstore=None):
+    def pause_job(self, job_id, jobstore=None):
         job = self._scheduler.pause_job(job_id, jobstore)
-        callback(job)
-        return None
+        return serialize_job(job)
 
-    def resume_job(self, callback, job_id, jobstore=None):
+    def resume_job(self, job_id, jobstore=None):
+        # Returns None if the job would not run again and was removed
         job = self._scheduler.resume_job(job_id, jobstore)
-        callback(job)
-        return None
+        return serialize_job(job)
 
     def remove_job(self, job_id, jobstore=None):
         self._scheduler.remove_job(job_id, jobstore)
         return None
 
-    def get_job(self, callback, job_id):
+    def get_job(self, job_id):
         job = self._scheduler.get_job(job_id)
-        callback(job)
-        return None
+        return serialize_job(job)
 
-    def get_jobs(self, callback, jobstore=None):
+    def get_jobs(self, jobstore=None):
         jobs = self._scheduler.get_jobs(jobstore)
-        callback(jobs)
-        return None
+        return [serialize_job(j) for j in jobs if j is not None]
 
     @staticmethod
     def get_mode():
@@ -129,18 +243,66 @@ class NidoDaemonService(rpyc.Service):
         else:
             return NidoDaemonService.wakeup()
 
+    @staticmethod
+    def get_snapshot():
+        """Returns the mode, set temperature, display units, controller
+        state and sensor conditions together, from a single settings read
+        and sensor sample.
+        """
+        settings = Thermostat.get_settings()
+        snapshot = {
+            "mode": Mode[settings["set_mode"]].value,
+            "set_temp": settings["set_temp"],
+            "celsius": settings["celsius"],
+            "state": Controller.get_instance().get_status(),
+        }
+        snapshot.update(SensorRegistry.get_instance().get_conditions())
+        return snapshot
+
+    @staticmethod
+    def set_settings(mode=None, temp=None, scale=None, celsius=None):
+        """Applies any of the mode, set temperature and display units in
+        one transaction, then updates the controller once.
+        """
+        try:
+            Thermostat().update(mode=mode, temp=temp, scale=scale, celsius=celsius)
+        except ThermostatError:
+            raise
+        else:
+            return NidoDaemonService.wakeup()
+
     @staticmethod
     def get_controller_status():
-        return Controller().get_status()
+        return Controller.get_instance().get_status()
 
     @staticmethod
     def get_sensor_data():
-        return Sensor().get_conditions()
+        return SensorRegistry.get_instance().get_conditions()
 
     @staticmethod
     def wakeup():
-        return Controller().update()
+        return Controller.get_instance().update()
 
     @staticmethod
-    def log_data(client):
-        return MQTTDataLogger(client).publish_data()
+    def get_history(start, end, limit=None, points=None):
+        """Returns the recorded samples from start up to end, in Unix
+        seconds, at most limit or HistoryConfig.MAX_POINTS of them.
+
+        If points is given, returns the rollup buckets of the finest
+        resolution that fits the range in that many points instead.
+        """
+        if limit is None or limit > HistoryConfig.MAX_POINTS:
+            limit = HistoryConfig.MAX_POINTS
+        store = HistoryStore.get_instance()
+        if points is None:
+            return store.query(start, end, limit)
+        limit = min(limit, points)
+        return store.query(start, end, limit, store.resolution(start, end, points))
+
+    def get_server_stats(self):
+        """Returns the worker pool's queue length, call counts and service
+        times, or None if the server isn't using a bounded pool.
+        """
+        if self._workers is None:
+            return None
+        return self._workers.stats()
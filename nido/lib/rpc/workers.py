@@ -0,0 +1,151 @@
+#   Nido, a Raspberry Pi-based home thermostat.
+#
+#   Copyright (C) 2016 Alex Marshall
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.
+#   If not, see <http://www.gnu.org/licenses/>.
+
+from concurrent.futures import Executor, ThreadPoolExecutor
+import socket
+import threading
+import time
+
+from rpyc.utils.server import ThreadedServer
+
+from nido.lib.exceptions import NidoDaemonError
+
+
+class RPCWorkerPool(Executor):
+    """Bounded pool that RPC calls are run on, with a limit on how many
+    calls may wait for a worker.
+
+    Calls submitted while max_queue calls are already waiting fail
+    immediately with NidoDaemonError instead of piling up threads and
+    hardware I/O behind a slow sensor or a misbehaving client. The pool
+    keeps counters for monitoring, see stats().
+
+    By default calls run on a private pool of max_workers threads. An
+    existing executor can be given instead, e.g. the supervisor's single
+    hardware thread in asyncio mode, in which case max_workers is unused.
+    """
+
+    def __init__(self, max_workers=4, max_queue=16, executor=None):
+        if executor is None:
+            executor = ThreadPoolExecutor(
+                max_workers=max_workers, thread_name_prefix="rpc"
+            )
+        self._executor = executor
+        self._max_queue = max_queue
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._active = 0
+        self._completed = 0
+        self._rejected = 0
+        self._wait_time = 0.0
+        self._service_time = 0.0
+        self._service_time_max = 0.0
+        return None
+
+    def submit(self, fn, *args, **kwargs):
+        with self._lock:
+            if self._queued >= self._max_queue:
+                self._rejected += 1
+                raise NidoDaemonError(
+                    "Nido daemon is busy ({} calls queued).".format(self._queued)
+                )
+            self._queued += 1
+        try:
+            return self._executor.submit(self._run, time.monotonic(), fn, args, kwargs)
+        except BaseException:
+            with self._lock:
+                self._queued -= 1
+            raise
+
+    def call(self, fn, *args, **kwargs):
+        """Runs fn on the pool and waits for its result."""
+        return self.submit(fn, *args, **kwargs).result()
+
+    def _run(self, submitted, fn, args, kwargs):
+        started = time.monotonic()
+        with self._lock:
+            self._queued -= 1
+            self._active += 1
+            self._wait_time += started - submitted
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            elapsed = time.monotonic() - started
+            with self._lock:
+                self._active -= 1
+                self._completed += 1
+                self._service_time += elapsed
+                self._service_time_max = max(self._service_time_max, elapsed)
+
+    def stats(self):
+        """Returns the current queue length and running calls, totals of
+        completed and rejected calls, and the mean time calls waited for a
+        worker and took to run, and the longest run, in seconds.
+        """
+        with self._lock:
+            completed = self._completed
+            return {
+                "queued": self._queued,
+                "active": self._active,
+                "max_queue": self._max_queue,
+                "completed": completed,
+                "rejected": self._rejected,
+                "wait_time_avg": self._wait_time / completed if completed else 0.0,
+                "service_time_avg": (
+                    self._service_time / completed if completed else 0.0
+                ),
+                "service_time_max": self._service_time_max,
+            }
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
+        return None
+
+
+class BoundedThreadedServer(ThreadedServer):
+    """rpyc ThreadedServer that serves at most max_connections clients at
+    once.
+
+    ThreadedServer runs a thread per connection, so a burst of connections
+    or a client that leaks them would otherwise create threads without
+    limit. Connections beyond max_connections are closed as soon as they
+    are accepted, and the client sees the connection drop.
+    """
+
+    def __init__(self, *args, max_connections=20, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.max_connections = max_connections
+        self.rejected = 0
+        return None
+
+    def _accept_method(self, sock):
+        # accept() has already added sock to self.clients
+        if len(self.clients) > self.max_connections:
+            self.rejected += 1
+            self.logger.warning(
+                "Rejected connection, {} clients connected".format(self.max_connections)
+            )
+            self.clients.discard(sock)
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            sock.close()
+            return None
+        super()._accept_method(sock)
+        return None
@@ -16,39 +16,107 @@
 #   along with this program.
 #   If not, see <http://www.gnu.org/licenses/>.
 
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 import logging
 import logging.handlers
 import os
 import signal
+import stat
 import sys
 import time
 
 import paho.mqtt.client as mqtt
-from rpyc.utils.server import ThreadedServer
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.jobstores.sqlalchemy import SQLAlchemyJobStore
 from nido.lib.rpc.server import NidoDaemonService
+from nido.lib.rpc.framed import FramedRPCServer
+from nido.lib.rpc.workers import BoundedThreadedServer, RPCWorkerPool
 from nido.lib import Status
-from nido.supervisor.config import SchedulerConfig, DaemonConfig, MQTTConfig
-from nido.supervisor.hardware import Controller
+from nido.lib.exceptions import NidoDaemonError, SensorError, SpoolError
+from nido.supervisor.config import (
+    SchedulerConfig,
+    DaemonConfig,
+    HardwareConfig,
+    MQTTConfig,
+)
+from nido.supervisor.hardware import Controller, SensorRegistry
+from nido.supervisor.sampler import Sampler
+from nido.supervisor.datalogger import HistoryLogger, MQTTDataLogger
+from nido.supervisor.spool import Spool, SpoolReplayer
+from nido.supervisor.aio import AsyncioMQTTHelper
 from nido.supervisor import db
 
 
+def _remove_socket(path):
+    """Removes a Unix socket left behind by a previous run, which would
+    otherwise prevent binding to path.
+    """
+    try:
+        if stat.S_ISSOCK(os.stat(path).st_mode):
+            os.unlink(path)
+    except FileNotFoundError:
+        pass
+    return None
+
+
 class Supervisor(object):
     def __init__(self):
         self._l = logging.getLogger()
-        self.controller = Controller()
+        self.controller = Controller.get_instance()
         self.scheduler = BackgroundScheduler()
+        self.sensors = SensorRegistry.get_instance()
+        self.history = HistoryLogger()
+        self.sampler = Sampler(
+            self.sensors, HardwareConfig.SAMPLE_INTERVAL, self._record_history
+        )
+        self.replayer = None
         return None
 
     def run(self):
         self._l.debug("Starting Nido supervisor...")
 
+        self._configure_scheduler()
+        if MQTTConfig.HOSTNAME:
+            self.MQTTclient = self._create_mqtt_client()
+            self.datalogger = self._create_datalogger()
+            if self.datalogger.spool is not None:
+                self.replayer = SpoolReplayer(
+                    self.datalogger.replay, MQTTConfig.REPLAY_RATE
+                )
+            self.scheduler.add_job(
+                self.datalogger.publish_data,
+                trigger="interval",
+                seconds=MQTTConfig.POLL_INTERVAL,
+                name="DataLogger",
+            )
+
+        self.RPCworkers = RPCWorkerPool(
+            max_workers=DaemonConfig.RPC_WORKERS,
+            max_queue=DaemonConfig.RPC_QUEUE_DEPTH,
+        )
+        self.RPCserver = self._create_rpc_server(
+            self.RPCworkers, DaemonConfig.RPC_TRANSPORT
+        )
+
+        signal.signal(signal.SIGTERM, self.shutdown_handler)
+        signal.signal(signal.SIGINT, self.shutdown_handler)
+        signal.signal(signal.SIGHUP, self.reload_handler)
+
+        if MQTTConfig.HOSTNAME:
+            self.MQTTclient.loop_start()
+            if self.replayer is not None:
+                self.replayer.start()
+        self.sampler.start()
+        self.scheduler.start()
+        self.RPCserver.start()  # Blocking
+        return None
+
+    def _configure_scheduler(self):
         jobstores = {
             "default": {"type": "memory"},
-            "schedule": SQLAlchemyJobStore(
-                url="sqlite:///{}".format(DaemonConfig.DB_PATH)
-            ),
+            "schedule": SQLAlchemyJobStore(engine=db.engine),
         }
         job_defaults = {"coalesce": True, "misfire_grace_time": 10}
         self.scheduler.configure(jobstores=jobstores, job_defaults=job_defaults)
@@ -59,59 +127,226 @@ class Supervisor(object):
             seconds=SchedulerConfig.POLL_INTERVAL,
             name="Poll",
         )
-
-        if MQTTConfig.HOSTNAME:
-            self.MQTTclient = mqtt.Client(MQTTConfig.CLIENT_NAME, clean_session=False)
-            self.MQTTclient.enable_logger()
-            self.MQTTclient.connect_async(
-                MQTTConfig.HOSTNAME,
-                port=int(MQTTConfig.PORT),
-                keepalive=MQTTConfig.KEEPALIVE,
-            )
+        if HardwareConfig.GPIO_VERIFY_INTERVAL:
             self.scheduler.add_job(
-                NidoDaemonService.log_data,
-                args=[self.MQTTclient],
+                self.controller.verify,
                 trigger="interval",
-                seconds=MQTTConfig.POLL_INTERVAL,
-                name="DataLogger",
+                seconds=HardwareConfig.GPIO_VERIFY_INTERVAL,
+                name="VerifyGPIO",
             )
+        return None
 
-        self.RPCserver = ThreadedServer(
-            NidoDaemonService(self.scheduler),
-            port=int(os.environ["NIDOD_RPC_PORT"]),
-            protocol_config={
-                "allow_pickle": True,
-                "allow_all_attrs": True,
-                "instantiate_custom_exceptions": True,
-            },
+    def _create_mqtt_client(self):
+        client = mqtt.Client(MQTTConfig.CLIENT_NAME, clean_session=False)
+        client.enable_logger()
+        client.connect_async(
+            MQTTConfig.HOSTNAME,
+            port=int(MQTTConfig.PORT),
+            keepalive=MQTTConfig.KEEPALIVE,
         )
+        return client
 
-        signal.signal(signal.SIGTERM, self.shutdown_handler)
-        signal.signal(signal.SIGINT, self.shutdown_handler)
-
-        if MQTTConfig.HOSTNAME:
-            self.MQTTclient.loop_start()
-        self.scheduler.start()
-        self.RPCserver.start()  # Blocking
+    def _record_history(self):
+        try:
+            self.history.record()
+        except (NidoDaemonError, OSError) as e:
+            self._l.warning("Could not record history: {}".format(e))
         return None
 
+    def _create_datalogger(self, defer_acks=False):
+        spool = Spool(MQTTConfig.SPOOL_PATH) if MQTTConfig.SPOOL_PATH else None
+        return MQTTDataLogger(self.MQTTclient, spool=spool, defer_acks=defer_acks)
+
+    def _create_rpc_server(self, workers, transport):
+        service = NidoDaemonService(self.scheduler, workers)
+        if DaemonConfig.RPC_SOCKET:
+            _remove_socket(DaemonConfig.RPC_SOCKET)
+            address = {"socket_path": DaemonConfig.RPC_SOCKET}
+            # The servers bind the socket when they are created, so it gets
+            # RPC_SOCKET_MODE from the umask instead of a chmod afterwards
+            umask = os.umask(0o777 & ~DaemonConfig.RPC_SOCKET_MODE)
+        else:
+            address = {"port": int(os.environ["NIDOD_RPC_PORT"])}
+        try:
+            server = self._create_rpc_listener(service, workers, transport, address)
+        finally:
+            if DaemonConfig.RPC_SOCKET:
+                os.umask(umask)
+        return server
+
+    def _create_rpc_listener(self, service, workers, transport, address):
+        if transport == "framed":
+            server = FramedRPCServer(
+                service.rpc_methods(),
+                executor=workers,
+                inline=service.INLINE_METHODS,
+                **address
+            )
+        else:
+            server = BoundedThreadedServer(
+                service,
+                max_connections=DaemonConfig.RPC_MAX_CONNECTIONS,
+                protocol_config={
+                    "allow_pickle": True,
+                    "allow_all_attrs": True,
+                    "instantiate_custom_exceptions": True,
+                },
+                **address
+            )
+        return server
+
     def shutdown_handler(self, sig, frame):
         self._l.info("Received signal {}, shutting down...".format(sig))
         self.shutdown()
         sys.exit(0)
 
+    def reload_handler(self, sig, frame):
+        self._l.info("Received signal {}, reloading settings...".format(sig))
+        db.invalidate_settings()
+        return None
+
     def shutdown(self):
         self.controller.shutdown()
         self.RPCserver.close()
+        self.RPCworkers.shutdown(wait=False)
+        if DaemonConfig.RPC_SOCKET:
+            _remove_socket(DaemonConfig.RPC_SOCKET)
         self.scheduler.shutdown()
+        self.sampler.stop()
+        self.history.store.close()
         if MQTTConfig.HOSTNAME:
+            if self.replayer is not None:
+                self.replayer.stop()
             self.MQTTclient.disconnect()
-        while self.controller.get_status() is not Status.Off.value:
-            supervisor._l.critical("Hardware not shutdown. Retrying...")
+            if self.datalogger.spool is not None:
+                self.datalogger.spool.close()
+        self._shutdown_hardware()
+        return None
+
+    def _shutdown_hardware(self):
+        self.sensors.shutdown()
+        while self.controller.get_status(cached=False) is not Status.Off.value:
+            self._l.critical("Hardware not shutdown. Retrying...")
             self.controller.shutdown()
             time.sleep(1)
-        supervisor._l.info("Shutdown complete")
-        supervisor._l.info("*****************")
+        self.controller.cleanup()
+        self._l.info("Shutdown complete")
+        self._l.info("*****************")
+        return None
+
+
+class AsyncSupervisor(Supervisor):
+    """Runs the supervisor on a single asyncio event loop.
+
+    The scheduler, the framed RPC server, sensor sampling and the MQTT
+    client share the loop instead of each running their own threads.
+    Scheduled jobs, RPC requests, sampling and the telemetry spool and
+    history writes run on the loop's default executor, which has a single
+    thread, so hardware access is serialized without locks and fsyncs
+    don't stall the loop. The exception is the scheduler itself:
+    AsyncIOScheduler queries its SQLite job store on the loop when jobs are
+    added, changed or due.
+    """
+
+    def __init__(self):
+        self._l = logging.getLogger()
+        self.controller = Controller.get_instance()
+        self.scheduler = AsyncIOScheduler()
+        self.sensors = SensorRegistry.get_instance()
+        # Reads already run on the hardware thread, so don't hand them to
+        # the registry's per-bus threads
+        self.sensors.inline = True
+        self.history = HistoryLogger()
+        self.MQTTclient = None
+        return None
+
+    def run(self):
+        self._l.debug("Starting Nido supervisor (asyncio)...")
+        asyncio.run(self._run())
+        self._shutdown_hardware()
+        return None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        hardware = ThreadPoolExecutor(max_workers=1, thread_name_prefix="hardware")
+        loop.set_default_executor(hardware)
+        stop = asyncio.Event()
+        tasks = [loop.create_task(self._sample())]
+
+        self._configure_scheduler()
+        if MQTTConfig.HOSTNAME:
+            self.MQTTclient = self._create_mqtt_client()
+            # Acknowledgements are written to the spool by _replay() on the
+            # hardware thread rather than by paho's callbacks on the loop
+            self.datalogger = self._create_datalogger(defer_acks=True)
+            mqtt_helper = AsyncioMQTTHelper(loop, self.MQTTclient)
+            tasks.append(loop.create_task(mqtt_helper.run()))
+            if self.datalogger.spool is not None:
+                tasks.append(loop.create_task(self._replay()))
+            self.scheduler.add_job(
+                self._log_data,
+                trigger="interval",
+                seconds=MQTTConfig.POLL_INTERVAL,
+                name="DataLogger",
+            )
+
+        # RPC calls queue for the hardware thread with everything else, but
+        # only up to RPC_QUEUE_DEPTH of them
+        self.RPCworkers = RPCWorkerPool(
+            max_queue=DaemonConfig.RPC_QUEUE_DEPTH, executor=hardware
+        )
+        self.RPCserver = self._create_rpc_server(self.RPCworkers, "framed")
+
+        loop.add_signal_handler(signal.SIGTERM, stop.set)
+        loop.add_signal_handler(signal.SIGINT, stop.set)
+        loop.add_signal_handler(signal.SIGHUP, self.reload_handler, signal.SIGHUP, None)
+
+        self.scheduler.start()
+        rpc = loop.create_task(self.RPCserver.serve())
+        await stop.wait()
+
+        self._l.info("Shutting down...")
+        await loop.run_in_executor(None, self.controller.shutdown)
+        self.RPCserver.close()
+        if DaemonConfig.RPC_SOCKET:
+            _remove_socket(DaemonConfig.RPC_SOCKET)
+        self.scheduler.shutdown(wait=False)
+        if self.MQTTclient is not None:
+            self.MQTTclient.disconnect()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(rpc, *tasks, return_exceptions=True)
+        if self.MQTTclient is not None and self.datalogger.spool is not None:
+            await loop.run_in_executor(None, self.datalogger.spool.close)
+        await loop.run_in_executor(None, self.history.store.close)
+        return None
+
+    async def _sample(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                await loop.run_in_executor(None, self.sensors.read)
+            except SensorError as e:
+                self._l.warning("Could not read sensor: {}".format(e))
+            else:
+                await loop.run_in_executor(None, self._record_history)
+            await asyncio.sleep(HardwareConfig.SAMPLE_INTERVAL)
+
+    async def _replay(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                await loop.run_in_executor(
+                    None, self.datalogger.replay, MQTTConfig.REPLAY_RATE
+                )
+            except (SpoolError, OSError) as e:
+                self._l.error("Could not replay spooled messages: {}".format(e))
+            await asyncio.sleep(1)
+
+    async def _log_data(self):
+        # Spooling fsyncs, so publish on the hardware thread too
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self.datalogger.publish_data)
         return None
 
 
@@ -136,5 +371,8 @@ if __name__ == "__main__":
     if not os.path.exists(DaemonConfig.DB_PATH):
         db._init_db()
 
-    supervisor = Supervisor()
+    if DaemonConfig.ASYNCIO:
+        supervisor = AsyncSupervisor()
+    else:
+        supervisor = Supervisor()
     supervisor.run()
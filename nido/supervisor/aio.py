@@ -0,0 +1,107 @@
+#   Nido, a Raspberry Pi-based home thermostat.
+#
+#   Copyright (C) 2016 Alex Marshall
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.
+#   If not, see <http://www.gnu.org/licenses/>.
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import logging
+
+
+class AsyncioMQTTHelper(object):
+    """Drives a paho MQTT client from an asyncio event loop instead of
+    paho's network thread (loop_start()).
+
+    The client's socket is watched with the loop's reader and writer
+    callbacks, and run() keeps the connection alive, reconnecting with
+    backoff if it is lost. Connecting blocks on DNS and the TCP handshake,
+    so it runs on a small executor of its own rather than on the loop.
+
+    Adapted from: https://github.com/eclipse/paho.mqtt.python/blob/master \
+    /examples/loop_asyncio.py
+    """
+
+    MISC_INTERVAL = 1
+    RECONNECT_DELAY_MAX = 60
+
+    def __init__(self, loop, client):
+        self._l = logging.getLogger(__name__)
+        self._loop = loop
+        self._client = client
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="mqtt")
+        client.on_socket_open = self._on_socket_open
+        client.on_socket_close = self._on_socket_close
+        client.on_socket_register_write = self._on_socket_register_write
+        client.on_socket_unregister_write = self._on_socket_unregister_write
+        return None
+
+    async def run(self):
+        """Connects, then services keepalives until cancelled."""
+        delay = self.MISC_INTERVAL
+        try:
+            while True:
+                if self._client.socket() is None:
+                    try:
+                        await self._loop.run_in_executor(
+                            self._executor, self._client.reconnect
+                        )
+                    except (OSError, ValueError) as e:
+                        self._l.warning(
+                            "MQTT connection failed, retrying in {}s: {}".format(
+                                delay, e
+                            )
+                        )
+                        await asyncio.sleep(delay)
+                        delay = min(delay * 2, self.RECONNECT_DELAY_MAX)
+                        continue
+                    delay = self.MISC_INTERVAL
+                self._client.loop_misc()
+                await asyncio.sleep(self.MISC_INTERVAL)
+        finally:
+            self._executor.shutdown(wait=False)
+        return None
+
+    def _call(self, func, *args):
+        # paho invokes the socket callbacks from whichever thread connects
+        # or publishes, but loop methods may only be used on the loop.
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self._loop:
+            func(*args)
+        else:
+            self._loop.call_soon_threadsafe(func, *args)
+        return None
+
+    def _on_socket_open(self, client, userdata, sock):
+        self._call(self._loop.add_reader, sock, client.loop_read)
+        return None
+
+    def _on_socket_close(self, client, userdata, sock):
+        # The socket is closed once this returns, so pass on its descriptor
+        fd = sock.fileno()
+        self._call(self._loop.remove_reader, fd)
+        self._call(self._loop.remove_writer, fd)
+        return None
+
+    def _on_socket_register_write(self, client, userdata, sock):
+        self._call(self._loop.add_writer, sock, client.loop_write)
+        return None
+
+    def _on_socket_unregister_write(self, client, userdata, sock):
+        self._call(self._loop.remove_writer, sock.fileno())
+        return None
@@ -19,6 +19,11 @@
 import os
 
 from nido.lib import Mode
+from nido.lib.Adafruit_BME280 import (
+    BME280_STANDBY_1000,
+    BME280_FILTER_16,
+    BME280_COMPENSATION_FLOAT,
+)
 
 
 class SchedulerConfig(object):
@@ -27,12 +32,67 @@ class SchedulerConfig(object):
 
 class DaemonConfig(object):
     DB_PATH = "{}/instance/nido.sqlite".format(os.environ["NIDO_BASE"])
+    # "rpyc", or "framed" for the lightweight JSON protocol in
+    # nido.lib.rpc.framed. The web app must use the same transport.
+    RPC_TRANSPORT = os.environ.get("NIDOD_RPC_TRANSPORT", "rpyc")
+    # Listen on this Unix socket instead of NIDOD_RPC_PORT. Access is
+    # limited to the owner and group of the socket file.
+    RPC_SOCKET = os.environ.get("NIDOD_RPC_SOCKET")
+    RPC_SOCKET_MODE = 0o660
+    # RPC calls run on a pool of RPC_WORKERS threads. Calls that arrive
+    # while RPC_QUEUE_DEPTH calls are already waiting for a worker are
+    # rejected with a "busy" error. In asyncio mode calls share the single
+    # hardware thread and RPC_WORKERS is unused.
+    RPC_WORKERS = int(os.environ.get("NIDOD_RPC_WORKERS", 4))
+    RPC_QUEUE_DEPTH = int(os.environ.get("NIDOD_RPC_QUEUE_DEPTH", 16))
+    # The rpyc transport runs a thread per connection, so connections
+    # beyond this are closed straight away
+    RPC_MAX_CONNECTIONS = int(
+        os.environ.get("NIDOD_RPC_MAX_CONNECTIONS", RPC_WORKERS + RPC_QUEUE_DEPTH)
+    )
+    # Run the scheduler, RPC server, sampling and MQTT on one asyncio
+    # event loop, with hardware and database calls on a single thread.
+    # Implies the framed RPC transport.
+    ASYNCIO = "NIDOD_ASYNCIO" in os.environ
+    # SQLite pragmas and connection pool size for the shared engine.
+    # busy_timeout is in milliseconds, mmap_size in bytes.
+    DB_JOURNAL_MODE = "WAL"
+    DB_SYNCHRONOUS = "NORMAL"
+    DB_BUSY_TIMEOUT = 5000
+    DB_MMAP_SIZE = 8 * 1024 * 1024
+    DB_POOL_SIZE = 4
+    DB_POOL_OVERFLOW = 4
+    # Formatted with the sensor ID
+    CALIBRATION_PATH = "{}/instance/bme280_calibration_{{}}.json".format(
+        os.environ["NIDO_BASE"]
+    )
 
 
 class HardwareConfig(object):
     GPIO_COOL_PIN = 20
     GPIO_HEAT_PIN = 26
     HYSTERESIS = 0.6
+    # Interval in seconds to check the cached GPIO state against the pins,
+    # or None to disable
+    GPIO_VERIFY_INTERVAL = 600
+    # Background sensor sampling: interval and maximum age of a buffered
+    # sample in seconds, and the number of samples kept in memory.
+    SAMPLE_INTERVAL = 10
+    SAMPLE_MAX_AGE = 30
+    SAMPLE_BUFFER_SIZE = 360
+    # Run the BME280 in normal mode with this standby time (None to trigger
+    # a forced-mode measurement on every read) and IIR filter coefficient.
+    SENSOR_STANDBY = BME280_STANDBY_1000
+    SENSOR_FILTER = BME280_FILTER_16
+    # BME280_COMPENSATION_INT selects the bit-exact integer formulas
+    SENSOR_COMPENSATION = BME280_COMPENSATION_FLOAT
+    # Sensors to read, keyed by ID. A bus of None selects the platform's
+    # default I2C bus. Readings are aggregated by "mean", "median" or
+    # "weighted" mean using each sensor's weight.
+    SENSORS = [{"id": "default", "bus": None, "address": 0x77, "weight": 1.0}]
+    SENSOR_AGGREGATE = "mean"
+    # Maximum time in seconds to wait for sensors to be read
+    SENSOR_READ_TIMEOUT = 1.0
     MODES = [Mode.Off.name, Mode.Heat.name]
 
 
@@ -45,4 +105,28 @@ class MQTTConfig(object):
     KEEPALIVE = 60
     CLIENT_NAME = os.environ["NIDOD_MQTT_CLIENT_NAME"]
     TOPIC_BASE = "nido/"
+    # Telemetry is published as one line protocol message per sample
+    TOPIC = os.environ.get("NIDOD_MQTT_TOPIC", "{}telemetry".format(TOPIC_BASE))
+    QOS = int(os.environ.get("NIDOD_MQTT_QOS", 1))
+    # InfluxDB measurement, and the device tag that identifies this
+    # thermostat in it
+    MEASUREMENT = "thermostat"
+    DEVICE_ID = os.environ.get("NIDOD_DEVICE_ID", CLIENT_NAME)
+    # Telemetry is kept in this directory until the broker acknowledges it,
+    # and replayed at up to REPLAY_RATE messages per second after an
+    # outage. Set NIDOD_MQTT_SPOOL to an empty string to disable.
+    SPOOL_PATH = os.environ.get(
+        "NIDOD_MQTT_SPOOL", "{}/instance/spool".format(os.environ["NIDO_BASE"])
+    )
+    REPLAY_RATE = 10
     POLL_INTERVAL = 60
+
+
+class HistoryConfig(object):
+    # Local history of sensor and controller data, one file per day, and
+    # its rollups in a subdirectory per tier
+    PATH = "{}/instance/history".format(os.environ["NIDO_BASE"])
+    INTERVAL = HardwareConfig.SAMPLE_INTERVAL
+    RETENTION_DAYS = 400
+    # Most samples returned by one query
+    MAX_POINTS = 10000
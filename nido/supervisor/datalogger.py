@@ -16,63 +16,243 @@
 #   along with this program.
 #   If not, see <http://www.gnu.org/licenses/>.
 
-from datetime import datetime
 import logging
+import threading
+import time
 
-from nido.supervisor.hardware import Sensor, Controller
+import paho.mqtt.client as mqtt
+
+from nido.lib.exceptions import SpoolError
+from nido.lib.influx import LineSchema
+from nido.supervisor.hardware import SensorRegistry, Controller
 from nido.supervisor.config import MQTTConfig
+from nido.supervisor.history import HistoryStore
 from nido.supervisor import db
 
 
 class DataLogger(object):
-    def __init__(self):
+    """Collects thermostat data and encodes it as InfluxDB line protocol.
+
+    Each sample is a line tagged with the device ID, with the controller
+    state, set temperature and aggregated sensor conditions as fields. With
+    more than one sensor, each sensor's conditions follow on a line of its
+    own, also tagged with the sensor ID.
+    """
+
+    CONDITIONS = (
+        ("temp_celsius", float),
+        ("temp_fahrenheit", float),
+        ("pressure_mb", float),
+        ("relative_humidity", float),
+    )
+    FIELDS = (("controller", int), ("set_temp", float)) + CONDITIONS
+
+    def __init__(self, measurement=None, device=None):
         self._l = logging.getLogger(__name__)
+        self.measurement = (
+            MQTTConfig.MEASUREMENT if measurement is None else measurement
+        )
+        self.device = MQTTConfig.DEVICE_ID if device is None else device
+        self._schema = LineSchema(
+            self.measurement, {"device": self.device}, self.FIELDS
+        )
+        self._sensor_schemas = {}
         return None
 
     def _get_sensor_data(self):
-        return Sensor().get_conditions()["conditions"]
+        return SensorRegistry.get_instance().get_conditions()
 
     def _get_controller_state(self):
-        return Controller().get_status()
+        return Controller.get_instance().get_status()
 
     def _get_thermostat_settings(self):
         return db.get_settings()
 
     def get_data(self):
+        """Returns the time in nanoseconds and the current data."""
         data = {}
         sensor_data = self._get_sensor_data()
         settings = self._get_thermostat_settings()
 
-        unixtime = datetime.now().timestamp()
+        timestamp = time.time_ns()
         data["controller"] = self._get_controller_state()
-        data.update(sensor_data)
+        data.update(sensor_data["conditions"])
         data["set_temp"] = settings["set_temp"]
-        return (unixtime, data)
+        data["sensors"] = sensor_data.get("sensors", {})
+        return (timestamp, data)
+
+    def format_influx(self, data, timestamp):
+        """Returns data from get_data() as line protocol."""
+        values = (data["controller"], data["set_temp"]) + self._conditions(data)
+        lines = [self._schema.encode(values, timestamp)]
+        sensors = data.get("sensors", {})
+        if len(sensors) > 1:
+            for sensor_id, conditions in sensors.items():
+                schema = self._sensor_schemas.get(sensor_id)
+                if schema is None:
+                    schema = LineSchema(
+                        self.measurement,
+                        {"device": self.device, "sensor": sensor_id},
+                        self.CONDITIONS,
+                    )
+                    self._sensor_schemas[sensor_id] = schema
+                lines.append(schema.encode(self._conditions(conditions), timestamp))
+        return "\n".join(line for line in lines if line is not None)
 
     @staticmethod
-    def format_influx(measurement, data, time):
-        nanoseconds = int(time * 1000000000)
-        line_protocol = "thermostat {}={} {}".format(measurement, data, nanoseconds)
-        return line_protocol
+    def _conditions(conditions):
+        return (
+            conditions["temp"]["celsius"],
+            conditions["temp"]["fahrenheit"],
+            conditions["pressure_mb"],
+            conditions["relative_humidity"],
+        )
+
+
+class HistoryLogger(DataLogger):
+    """Records each sample of thermostat data in the local history store
+    (nido.supervisor.history.HistoryStore).
+    """
+
+    def __init__(self, store=None, **kwargs):
+        super().__init__(**kwargs)
+        self.store = HistoryStore.get_instance() if store is None else store
+        return None
+
+    def record(self):
+        (timestamp, data) = self.get_data()
+        self.store.append(
+            timestamp // 1000000000,
+            data["temp"]["celsius"],
+            data["pressure_mb"],
+            data["relative_humidity"],
+            data["set_temp"],
+            data["controller"],
+        )
+        return None
 
 
 class MQTTDataLogger(DataLogger):
-    def __init__(self, client):
-        super().__init__()
+    """Publishes each sample of thermostat data as a single multi-line
+    line protocol message to MQTTConfig.TOPIC.
+
+    One message per tick rather than one per measurement means one QoS
+    handshake instead of five. Create one logger per MQTT client and keep
+    it for the life of the daemon.
+
+    If a spool (nido.supervisor.spool.Spool) is given, every message is
+    stored in it until the broker acknowledges it. Messages are only
+    handed to the client while it is connected, so they don't pile up in
+    paho's in-memory queue during an outage. Once a publish is confirmed
+    after reconnecting, replay() sends the backlog, oldest first.
+
+    With defer_acks, paho's on_publish callback doesn't write to the spool
+    and replay(), which must then be called regularly, records the
+    acknowledgements instead. This keeps spool I/O off the thread that
+    drives the client.
+    """
+
+    # Most spooled messages awaiting acknowledgement at once
+    REPLAY_WINDOW = 20
+
+    def __init__(
+        self, client, topic=None, qos=None, spool=None, defer_acks=False, **kwargs
+    ):
+        super().__init__(**kwargs)
         self.client = client
         self.client.on_publish = self._on_publish
+        self.client.on_disconnect = self._on_disconnect
+        self.topic = MQTTConfig.TOPIC if topic is None else topic
+        self.qos = MQTTConfig.QOS if qos is None else qos
+        self.spool = spool
+        self._defer_acks = defer_acks
+        # mid -> (seq, MQTTMessageInfo) of spooled messages being published
+        self._inflight = {}
+        self._online = False
+        self._lock = threading.Lock()
+        return None
 
     def publish_data(self):
-        (unixtime, data) = self.get_data()
-        for measurement in data:
-            payload = self.format_influx(measurement, data[measurement], unixtime)
-            self._l.debug("payload: {}".format(payload))
-            self.client.publish(
-                "{}{}".format(MQTTConfig.TOPIC_BASE, measurement),
-                payload=payload,
-                qos=2,
-            )
+        (timestamp, data) = self.get_data()
+        return self.publish(timestamp, data)
+
+    def publish(self, timestamp, data):
+        """Publishes data previously collected with get_data()."""
+        payload = self.format_influx(data, timestamp)
+        self._l.debug("payload: {}".format(payload))
+        if self.spool is None:
+            self.client.publish(self.topic, payload=payload, qos=self.qos)
+            return None
+
+        payload = payload.encode("utf-8")
+        try:
+            seq = self.spool.append(timestamp, payload)
+        except (SpoolError, OSError) as e:
+            self._l.error("Could not spool telemetry: {}".format(e))
+            self.client.publish(self.topic, payload=payload, qos=self.qos)
+            return None
+        if self.client.is_connected():
+            self._send(seq, payload)
+        return None
+
+    def replay(self, limit):
+        """Publishes up to limit spooled messages that haven't been
+        acknowledged, oldest first. Does nothing until the broker has
+        confirmed a publish since the client last connected. Returns the
+        number of messages sent.
+        """
+        if self.spool is None:
+            return 0
+        with self._lock:
+            # Acknowledgements that arrived before _send() recorded the mid
+            for mid, (seq, info) in list(self._inflight.items()):
+                if info.is_published():
+                    del self._inflight[mid]
+                    self.spool.ack(seq)
+            if not self._online:
+                return 0
+            limit = min(limit, self.REPLAY_WINDOW - len(self._inflight))
+            skip = {seq for seq, _ in self._inflight.values()}
+        if limit <= 0 or not self.client.is_connected():
+            return 0
+
+        messages = self.spool.pending(limit, skip)
+        for seq, payload in messages:
+            self._send(seq, payload)
+        return len(messages)
+
+    def _send(self, seq, payload):
+        # paho calls on_publish with its own locks held, so the client must
+        # not be called with self._lock held
+        info = self.client.publish(self.topic, payload=payload, qos=self.qos)
+        if info.rc != mqtt.MQTT_ERR_SUCCESS and not (
+            info.rc == mqtt.MQTT_ERR_NO_CONN and self.qos > 0
+        ):
+            # Not queued by paho, replay() will retry
+            return None
+        with self._lock:
+            if info.is_published():
+                self.spool.ack(seq)
+            else:
+                self._inflight[info.mid] = (seq, info)
         return None
 
     def _on_publish(self, client, userdata, mid):
-        pass
+        if self.spool is None:
+            return None
+        with self._lock:
+            self._online = True
+            if self._defer_acks:
+                return None
+            entry = self._inflight.pop(mid, None)
+            if entry is not None:
+                self.spool.ack(entry[0])
+        return None
+
+    def _on_disconnect(self, client, userdata, rc):
+        with self._lock:
+            self._online = False
+            if self.qos == 0:
+                # Unsent QoS 0 messages are dropped by paho
+                self._inflight.clear()
+        return None
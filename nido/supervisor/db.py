@@ -17,18 +17,58 @@
 #   If not, see <http://www.gnu.org/licenses/>.
 
 from contextlib import contextmanager
+import threading
+from types import MappingProxyType
 
-from sqlalchemy import create_engine, Column, Integer, Boolean, Float
+from sqlalchemy import create_engine, event, Column, Integer, Boolean, Float
 from sqlalchemy.exc import OperationalError, SQLAlchemyError
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.orm.exc import MultipleResultsFound, NoResultFound
+from sqlalchemy.pool import QueuePool
 
 from nido.supervisor.config import DaemonConfig
 from nido.lib import Mode
 from nido.lib.exceptions import DBError
 
-engine = create_engine("sqlite:///{}".format(DaemonConfig.DB_PATH))
+
+def create_db_engine(
+    path=DaemonConfig.DB_PATH,
+    journal_mode=DaemonConfig.DB_JOURNAL_MODE,
+    synchronous=DaemonConfig.DB_SYNCHRONOUS,
+    busy_timeout=DaemonConfig.DB_BUSY_TIMEOUT,
+    mmap_size=DaemonConfig.DB_MMAP_SIZE,
+    pool_size=DaemonConfig.DB_POOL_SIZE,
+    max_overflow=DaemonConfig.DB_POOL_OVERFLOW,
+):
+    """Returns an engine for the SQLite database at path, with a sized
+    connection pool and the given pragmas applied to every connection.
+
+    The settings store and the scheduler's job store share a single engine,
+    so that their writers wait on each other in the pool and on
+    busy_timeout (in ms) rather than failing with "database is locked".
+    """
+    engine = create_engine(
+        "sqlite:///{}".format(path),
+        poolclass=QueuePool,
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        connect_args={"check_same_thread": False, "timeout": busy_timeout / 1000},
+    )
+
+    @event.listens_for(engine, "connect")
+    def _set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode={}".format(journal_mode))
+        cursor.execute("PRAGMA synchronous={}".format(synchronous))
+        cursor.execute("PRAGMA busy_timeout={:d}".format(busy_timeout))
+        cursor.execute("PRAGMA mmap_size={:d}".format(mmap_size))
+        cursor.close()
+
+    return engine
+
+
+engine = create_db_engine()
 Base = declarative_base()
 Session = sessionmaker(bind=engine)
 
@@ -70,22 +110,76 @@ def _get_settings(session):
     return session.query(_Settings).one()
 
 
+class _SettingsCache(object):
+    """Process-local, write-through cache of the settings row.
+
+    Readers get an immutable snapshot without touching SQLite. Every change
+    made through set_settings() replaces the snapshot and bumps the version
+    counter. Call invalidate() after editing the database out-of-band.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self.version = 0
+
+    def get(self):
+        snapshot = self._snapshot
+        if snapshot is None:
+            with self._lock:
+                if self._snapshot is None:
+                    with _db_session() as session:
+                        settings = _get_settings(session).to_dict()
+                    self._snapshot = MappingProxyType(settings)
+                snapshot = self._snapshot
+        return snapshot
+
+    def set(self, set_temp=None, set_mode=None, celsius=None):
+        with self._lock:
+            with _db_session() as session:
+                settings = _get_settings(session)
+                if set_temp is not None:
+                    settings.set_temp = set_temp
+                if set_mode is not None:
+                    settings.set_mode = set_mode
+                if celsius is not None:
+                    settings.celsius = celsius
+                session.add(settings)
+                snapshot = settings.to_dict()
+            self._snapshot = MappingProxyType(snapshot)
+            self.version += 1
+
+    def invalidate(self):
+        with self._lock:
+            self._snapshot = None
+            self.version += 1
+
+
+_settings_cache = _SettingsCache()
+
+
 def get_settings():
-    with _db_session() as session:
-        settings = _get_settings(session)
-        return settings.to_dict()
+    """Returns a read-only snapshot of the settings."""
+    return _settings_cache.get()
 
 
 def set_settings(set_temp=None, set_mode=None, celsius=None):
-    with _db_session() as session:
-        settings = _get_settings(session)
-        if set_temp is not None:
-            settings.set_temp = set_temp
-        if set_mode is not None:
-            settings.set_mode = set_mode
-        if celsius is not None:
-            settings.celsius = celsius
-        session.add(settings)
+    _settings_cache.set(set_temp=set_temp, set_mode=set_mode, celsius=celsius)
+    return None
+
+
+def get_settings_version():
+    """Returns a counter that changes whenever the settings may have
+    changed.
+    """
+    return _settings_cache.version
+
+
+def invalidate_settings():
+    """Drops the cached settings, so that the next read goes to the
+    database. Use after the database was edited by another process.
+    """
+    _settings_cache.invalidate()
     return None
 
 
@@ -114,4 +208,5 @@ def _init_db(base=Base, engine=engine):
         print("Initializing database with default settings: {}".format(settings))
         session.add(settings)
         session.commit()
+        invalidate_settings()
     return None
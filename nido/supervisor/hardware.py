@@ -16,13 +16,20 @@
 #   along with this program.
 #   If not, see <http://www.gnu.org/licenses/>.
 
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait
+import json
 import os
 import logging
+import statistics
+import threading
+import time
 
 from nido.supervisor.config import HardwareConfig, DaemonConfig
 from nido.lib import Mode, Status, c_to_f
 from nido.lib.exceptions import ControllerError, SensorError
 from nido.supervisor.thermostat import Thermostat
+from nido.supervisor.sampler import SampleBuffer
 
 if "NIDO_TESTING" in os.environ:
     from nido.supervisor.simulator import FakeGPIO, FakeSensor as BME280
@@ -35,49 +42,329 @@ else:
 
 
 class Sensor(object):
-    def __init__(self, mode=BME280_OSAMPLE_8):
+    """Wrapper around the BME280 driver.
+
+    Sensors are meant to be long-lived (see SensorRegistry), so that the
+    chip's trimming parameters are only read once. If a calibration_path is
+    given, the trimming parameters are also saved there. On restart the
+    saved set is checked against the chip's, so a replaced sensor module is
+    logged and its own calibration used and saved.
+
+    Every reading is stored in a ring buffer of samples. get_conditions()
+    returns the latest buffered sample if it is no older than max_age
+    seconds, and only reads the sensor directly otherwise.
+    """
+
+    def __init__(
+        self,
+        mode=BME280_OSAMPLE_8,
+        calibration_path=None,
+        buffer_size=1,
+        max_age=0,
+        **kwargs
+    ):
+        """Any additional keyword arguments are passed on to the BME280
+        driver, eg. standby, filter or compensation.
+        """
+        self._l = logging.getLogger(__name__)
+        self._mode = mode
+        self._options = kwargs
+        self._calibration_path = calibration_path
+        self.samples = SampleBuffer(buffer_size)
+        self._max_age = max_age
+        self._lock = threading.Lock()
+        self._revalidate = False
+        self.sensor = None
+        self._connect()
+        return None
+
+    def _connect(self):
         try:
-            self.sensor = BME280(mode)
+            self.sensor = BME280(
+                self._mode, calibration=self._read_calibration(), **self._options
+            )
         except OSError:
             self.sensor = None
+        else:
+            self._write_calibration(self.sensor.get_calibration())
+        return None
+
+    def _read_calibration(self):
+        if self._calibration_path is None:
+            return None
+        try:
+            with open(self._calibration_path, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_calibration(self, calibration):
+        if self._calibration_path is None:
+            return None
+        if calibration == self._read_calibration():
+            return None
+        try:
+            with open(self._calibration_path, "w") as f:
+                json.dump(calibration, f)
+        except OSError as e:
+            self._l.warning("Could not save sensor calibration: {}".format(e))
+        return None
+
+    def _validate(self):
+        """Re-reads the trimming parameters after an I2C error, in case the
+        chip was reset or replaced.
+        """
+        calibration = self.sensor.reload_calibration()
+        self._write_calibration(calibration)
+        self._revalidate = False
+        self._l.info("Sensor calibration re-validated.")
+        return None
+
+    def read(self):
+        """Reads the sensor, stores the result in the sample buffer and
+        returns it as a (timestamp, temp_c, pressure_pa, relative_humidity)
+        tuple.
+        """
+        with self._lock:
+            try:
+                if self.sensor is None:
+                    self._connect()
+                # Could not connect to sensor
+                if self.sensor is None:
+                    raise SensorError("Sensor was not detected.")
+                if self._revalidate:
+                    self._validate()
+                temp_c, pressure_pa, relative_humidity = self.sensor.read_all()
+            except OSError as e:
+                self._revalidate = True
+                raise SensorError("Error reading sensor: {}".format(e))
+            sample = (time.time(), temp_c, pressure_pa, relative_humidity)
+            self.samples.append(*sample)
+        return sample
+
+    def latest(self):
+        """Returns the latest buffered sample if it is no older than
+        max_age seconds, otherwise None.
+        """
+        sample = self.samples.latest()
+        if sample is None or time.time() - sample[0] > self._max_age:
+            return None
+        return sample
+
+    def get_conditions(self):
+        # Initialize response dict
+        resp = {}
+
+        sample = self.latest()
+        if sample is None:
+            sample = self.read()
+        resp["conditions"] = _conditions(sample)
+
+        return resp
+
+
+class SensorRegistry(object):
+    """Set of sensors that are read and aggregated together.
+
+    Sensors are read concurrently, with one thread per I2C bus. A read waits
+    at most timeout seconds, and a bus whose previous read has not finished
+    yet is skipped, so that a slow or failed sensor never stalls the
+    control loop. The remaining sensors are aggregated by "mean", "median"
+    or "weighted" mean.
+
+    Set inline to read the sensors one after another on the calling thread
+    instead, when the caller already serializes hardware access on a
+    thread of its own.
+
+    Use SensorRegistry.get_instance() to get the process-wide registry of
+    the sensors in HardwareConfig.SENSORS.
+    """
+
+    AGGREGATES = ["mean", "median", "weighted"]
+
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self, sensors, aggregate="mean", timeout=None):
+        """sensors is a list of (sensor_id, Sensor, bus, weight) tuples."""
+        if aggregate not in self.AGGREGATES:
+            raise SensorError("Invalid sensor aggregate: {}".format(aggregate))
         self._l = logging.getLogger(__name__)
+        self._aggregate = aggregate
+        self._timeout = timeout
+        self.sensors = OrderedDict()
+        self._weights = {}
+        self._buses = {}
+        for sensor_id, sensor, bus, weight in sensors:
+            self.sensors[sensor_id] = sensor
+            self._weights[sensor_id] = weight
+            self._buses[sensor_id] = bus
+        self._executors = {
+            bus: ThreadPoolExecutor(max_workers=1) for bus in set(self._buses.values())
+        }
+        self._pending = {}
+        self._lock = threading.Lock()
+        self.inline = False
         return None
 
+    @classmethod
+    def get_instance(cls):
+        """Returns the process-wide SensorRegistry, creating it on first use."""
+        with cls._instance_lock:
+            if cls._instance is None:
+                sensors = []
+                for config in HardwareConfig.SENSORS:
+                    sensor = Sensor(
+                        calibration_path=DaemonConfig.CALIBRATION_PATH.format(
+                            config["id"]
+                        ),
+                        buffer_size=HardwareConfig.SAMPLE_BUFFER_SIZE,
+                        max_age=HardwareConfig.SAMPLE_MAX_AGE,
+                        standby=HardwareConfig.SENSOR_STANDBY,
+                        filter=HardwareConfig.SENSOR_FILTER,
+                        compensation=HardwareConfig.SENSOR_COMPENSATION,
+                        address=config["address"],
+                        busnum=config["bus"],
+                    )
+                    sensors.append(
+                        (config["id"], sensor, config["bus"], config["weight"])
+                    )
+                cls._instance = cls(
+                    sensors,
+                    aggregate=HardwareConfig.SENSOR_AGGREGATE,
+                    timeout=HardwareConfig.SENSOR_READ_TIMEOUT,
+                )
+            return cls._instance
+
+    def _read_bus(self, sensor_ids):
+        samples = {}
+        for sensor_id in sensor_ids:
+            try:
+                samples[sensor_id] = self.sensors[sensor_id].read()
+            except SensorError as e:
+                self._l.warning("Error reading sensor {}: {}".format(sensor_id, e))
+        return samples
+
+    def _read(self, sensor_ids):
+        """Reads the given sensors concurrently, one thread per bus, and
+        returns a dict of the samples that were read in time.
+        """
+        if self.inline:
+            return self._read_bus(sensor_ids)
+        by_bus = {}
+        for sensor_id in sensor_ids:
+            by_bus.setdefault(self._buses[sensor_id], []).append(sensor_id)
+
+        futures = []
+        with self._lock:
+            for bus, ids in by_bus.items():
+                pending = self._pending.get(bus)
+                if pending is not None and not pending.done():
+                    self._l.warning("Skipping busy I2C bus {}".format(bus))
+                    continue
+                self._pending[bus] = self._executors[bus].submit(self._read_bus, ids)
+                futures.append(self._pending[bus])
+
+        done, not_done = wait(futures, timeout=self._timeout)
+        if not_done:
+            self._l.warning("Timed out reading {} bus(es)".format(len(not_done)))
+        samples = {}
+        for future in done:
+            samples.update(future.result())
+        return samples
+
+    def read(self):
+        """Reads every sensor and returns a dict of samples by sensor ID."""
+        samples = self._read(list(self.sensors))
+        if not samples:
+            raise SensorError("No sensor could be read.")
+        return samples
+
+    def _combine(self, values, weights):
+        if self._aggregate == "median":
+            return statistics.median(values)
+        elif self._aggregate == "weighted":
+            return sum(v * w for v, w in zip(values, weights)) / sum(weights)
+        else:
+            return sum(values) / len(values)
+
     def get_conditions(self):
+        """Returns the aggregated conditions, and the conditions of each
+        sensor that could be read keyed by sensor ID.
+        """
         # Initialize response dict
         resp = {}
 
-        # Could not connect to sensor
-        if self.sensor is None:
-            raise SensorError("Sensor was not detected.")
+        samples = {}
+        stale = []
+        for sensor_id, sensor in self.sensors.items():
+            sample = sensor.latest()
+            if sample is None:
+                stale.append(sensor_id)
+            else:
+                samples[sensor_id] = sample
+        if stale:
+            samples.update(self._read(stale))
+        if not samples:
+            raise SensorError("No sensor could be read.")
 
-        temp_c = self.sensor.read_temperature()
-        pressure_mb = round(self.sensor.read_pressure()) / 100
-        relative_humidity = self.sensor.read_humidity()
-        self._l.debug(
-            "Sensor data: T = {}C | P = {} | RH = {}".format(
-                temp_c, pressure_mb, relative_humidity
-            )
+        ids = [i for i in self.sensors if i in samples]
+        weights = [self._weights[i] for i in ids]
+        aggregate = tuple(
+            self._combine([samples[i][field] for i in ids], weights)
+            for field in range(4)
         )
-        conditions = {
-            "temp": {"celsius": temp_c, "fahrenheit": c_to_f(temp_c)},
-            "pressure_mb": pressure_mb,
-            "relative_humidity": relative_humidity,
-        }
-        resp["conditions"] = conditions
+        resp["conditions"] = _conditions(aggregate)
+        resp["sensors"] = {i: _conditions(samples[i]) for i in ids}
 
         return resp
 
+    def shutdown(self):
+        for executor in self._executors.values():
+            executor.shutdown(wait=False)
+        return None
+
+
+def _conditions(sample):
+    """Formats a (timestamp, temp_c, pressure_pa, relative_humidity) sample
+    as a conditions dict.
+    """
+    _, temp_c, pressure_pa, relative_humidity = sample
+    pressure_mb = round(pressure_pa) / 100
+    logging.getLogger(__name__).debug(
+        "Sensor data: T = {}C | P = {} | RH = {}".format(
+            temp_c, pressure_mb, relative_humidity
+        )
+    )
+    return {
+        "temp": {"celsius": temp_c, "fahrenheit": c_to_f(temp_c)},
+        "pressure_mb": pressure_mb,
+        "relative_humidity": relative_humidity,
+    }
+
 
 class Controller(object):
     """This is the controller code that determines whether the
     heating / cooling system should be enabled based on the thermostat
-    set point."""
+    set point.
+
+    The state of the output pins is cached as a bitmask that is updated on
+    every output, so get_status() does not need to read the pins. Use
+    Controller.get_instance() to share a single controller across the
+    process, and verify() to check the cached state against the hardware.
+    """
+
+    _HEATING_BIT = 0x1
+    _COOLING_BIT = 0x2
+
+    _instance = None
+    _instance_lock = threading.Lock()
 
     def __init__(self):
         self._l = logging.getLogger(__name__)
         self._HEATING = HardwareConfig.GPIO_HEAT_PIN
         self._COOLING = HardwareConfig.GPIO_COOL_PIN
+        self._lock = threading.RLock()
 
         # Set up the GPIO pins
         GPIO.setwarnings(False)
@@ -89,35 +376,81 @@ class Controller(object):
                 self._HEATING, self._COOLING
             )
         )
+        self._state = self._read_state()
+
+        return
+
+    @classmethod
+    def get_instance(cls):
+        """Returns the process-wide Controller, creating it on first use."""
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = cls()
+            return cls._instance
 
+    def _read_state(self):
+        state = 0
+        if GPIO.input(self._HEATING):
+            state |= self._HEATING_BIT
+        if GPIO.input(self._COOLING):
+            state |= self._COOLING_BIT
+        return state
+
+    def _output(self, heating, cooling):
+        with self._lock:
+            GPIO.output(self._HEATING, heating)
+            GPIO.output(self._COOLING, cooling)
+            self._state = (self._HEATING_BIT if heating else 0) | (
+                self._COOLING_BIT if cooling else 0
+            )
         return
 
-    def get_status(self):
-        if GPIO.input(self._HEATING) and GPIO.input(self._COOLING):
+    def get_status(self, cached=True):
+        """Returns the controller status. Pass cached=False to read the
+        state of the pins from the hardware.
+        """
+        state = self._state if cached else self._read_state()
+        if state == self._HEATING_BIT | self._COOLING_BIT:
             self._l.error("** Both heating and cooling pins enabled. **")
             self.shutdown()
             raise ControllerError(
                 "Both heating and cooling pins were enabled. "
                 "Both pins disabled as a precaution."
             )
-        elif GPIO.input(self._HEATING):
+        elif state & self._HEATING_BIT:
             self._l.debug("Get status: {}".format(Status.Heating.name))
             return Status.Heating.value
-        elif GPIO.input(self._COOLING):
+        elif state & self._COOLING_BIT:
             self._l.debug("Get state: {}".format(Status.Cooling.name))
             return Status.Cooling.value
         else:
             self._l.debug("Get state: {}".format(Status.Off.name))
             return Status.Off.value
 
+    def verify(self):
+        """Checks the cached state against the pins, and re-applies the
+        cached state if they have drifted apart.
+        """
+        with self._lock:
+            state = self._read_state()
+            if state != self._state:
+                self._l.warning(
+                    "GPIO state drifted: cached = {:#x} | hardware = {:#x}".format(
+                        self._state, state
+                    )
+                )
+                self._output(
+                    bool(self._state & self._HEATING_BIT),
+                    bool(self._state & self._COOLING_BIT),
+                )
+        return
+
     def _enable_heating(self, status, temp, set_temp, hysteresis):
         if (temp + hysteresis) < set_temp:
-            GPIO.output(self._HEATING, True)
-            GPIO.output(self._COOLING, False)
+            self._output(True, False)
             self._l.debug("Enabled HEAT: {} < {}".format(temp + hysteresis, set_temp))
         elif (temp < set_temp) and (status is Status.Heating):
-            GPIO.output(self._HEATING, True)
-            GPIO.output(self._COOLING, False)
+            self._output(True, False)
             self._l.debug(
                 "Enabled HEAT: {} < {} and status = Heating".format(temp, set_temp)
             )
@@ -125,26 +458,30 @@ class Controller(object):
 
     def _enable_cooling(self, status, temp, set_temp, hysteresis):
         if (temp + hysteresis) > set_temp:
-            GPIO.output(self._HEATING, False)
-            GPIO.output(self._COOLING, True)
+            self._output(False, True)
         elif (temp > set_temp) and (status is Status.Cooling):
-            GPIO.output(self._HEATING, False)
-            GPIO.output(self._COOLING, True)
+            self._output(False, True)
         return
 
     def shutdown(self):
-        GPIO.output(self._HEATING, False)
-        GPIO.output(self._COOLING, False)
-        GPIO.cleanup()
+        self._output(False, False)
         self._l.info("Shut down hardware GPIO pins.")
         return
 
+    def cleanup(self):
+        """Releases the GPIO pins on process exit. The controller cannot be
+        used afterwards.
+        """
+        GPIO.cleanup()
+        return
+
     def update(self):
         settings = Thermostat.get_settings()
         try:
             mode = settings["set_mode"]
             status = self.get_status()
-            temp = Sensor().get_conditions()["conditions"]["temp"]["celsius"]
+            conditions = SensorRegistry.get_instance().get_conditions()
+            temp = conditions["conditions"]["temp"]["celsius"]
             set_temp = settings["set_temp"]
             hysteresis = HardwareConfig.HYSTERESIS
         except KeyError as e:
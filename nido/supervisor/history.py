@@ -0,0 +1,623 @@
+#   Nido, a Raspberry Pi-based home thermostat.
+#
+#   Copyright (C) 2016 Alex Marshall
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.
+#   If not, see <http://www.gnu.org/licenses/>.
+
+from bisect import bisect_left
+from datetime import datetime, timezone
+import logging
+import math
+import mmap
+import os
+import struct
+import threading
+
+from nido.lib import Status
+from nido.supervisor.config import HistoryConfig
+
+SECONDS_PER_DAY = 86400
+# Sample columns aggregated by the rollup tiers
+METRICS = ("temp_c", "pressure_mb", "relative_humidity")
+
+
+class SegmentFile(object):
+    """Columns of a span of history rows, stored in a single file.
+
+    The file has a header followed by one block per column, each with room
+    for capacity values, so a column can be read as a single typed
+    memoryview of the mapped file. Rows are written column by column, then
+    the row count in the header is updated, so readers only ever see
+    complete rows.
+    """
+
+    # magic, version, capacity, count
+    HEADER = struct.Struct("<4sHxxII")
+    HEADER_SIZE = 64
+    COUNT_OFFSET = 12
+    MAGIC = b"NIDH"
+    VERSION = 1
+
+    def __init__(self, path, columns, capacity=None, writable=False):
+        """columns is a sequence of (name, struct format character) pairs. A
+        new file with room for capacity rows is created if writable and path
+        doesn't exist.
+        """
+        self.path = path
+        self.columns = tuple(columns)
+        self.writable = writable
+        if writable and not os.path.exists(path):
+            self._create(path, capacity)
+        with open(path, "r+b" if writable else "rb") as f:
+            access = mmap.ACCESS_WRITE if writable else mmap.ACCESS_READ
+            self._map = mmap.mmap(f.fileno(), 0, access=access)
+        magic, version, self.capacity, _ = self.HEADER.unpack_from(self._map)
+        if magic != self.MAGIC or version != self.VERSION:
+            self._map.close()
+            raise ValueError("Not a history file: {}".format(path))
+        self._view = memoryview(self._map)
+        self._names = [name for name, _ in self.columns]
+        self._sizes = [struct.calcsize(typecode) for _, typecode in self.columns]
+        self._offsets = []
+        offset = self.HEADER_SIZE
+        for size in self._sizes:
+            self._offsets.append(offset)
+            offset += size * self.capacity
+        return None
+
+    def _create(self, path, capacity):
+        size = self.HEADER_SIZE + capacity * sum(
+            struct.calcsize(t) for _, t in self.columns
+        )
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(self.HEADER.pack(self.MAGIC, self.VERSION, capacity, 0))
+            f.truncate(size)
+        os.replace(tmp, path)
+        return None
+
+    def __len__(self):
+        return self.HEADER.unpack_from(self._map)[3]
+
+    def append(self, row):
+        """Writes a row of values, in column order. Returns False if the
+        file is full.
+        """
+        count = len(self)
+        if count >= self.capacity:
+            return False
+        for (_, typecode), size, offset, value in zip(
+            self.columns, self._sizes, self._offsets, row
+        ):
+            struct.pack_into(typecode, self._map, offset + count * size, value)
+        struct.pack_into("<I", self._map, self.COUNT_OFFSET, count + 1)
+        return True
+
+    def column(self, name, start=0, stop=None):
+        """Returns rows start to stop of a column as a typed memoryview."""
+        i = self._names.index(name)
+        typecode = self.columns[i][1]
+        count = len(self)
+        stop = count if stop is None else min(stop, count)
+        size = self._sizes[i]
+        offset = self._offsets[i]
+        return self._view[offset + start * size : offset + stop * size].cast(typecode)
+
+    def flush(self):
+        if self.writable:
+            self._map.flush()
+        return None
+
+    def close(self):
+        self.flush()
+        self._view.release()
+        self._map.close()
+        return None
+
+
+class Series(object):
+    """Rows of a table whose first column is a uint32 Unix time, stored in
+    one SegmentFile per period seconds under path and named by the UTC date
+    the period starts on. Rows must be appended in time order.
+
+    Series doesn't lock; HistoryStore serializes appends.
+    """
+
+    SUFFIX = ".hist"
+
+    def __init__(self, path, columns, period, capacity, retention=None):
+        """Files are created with room for capacity rows and grow if more
+        arrive. Files that end more than retention days before the one
+        being written are deleted, if given.
+        """
+        self._l = logging.getLogger(__name__)
+        self.path = path
+        self.columns = tuple(columns)
+        self.period = period
+        self._capacity = capacity
+        self._retention = retention
+        self._index = None
+        self._file = None
+        os.makedirs(path, exist_ok=True)
+        self.last = self._find_last()
+        return None
+
+    def _file_path(self, index):
+        date = datetime.fromtimestamp(index * self.period, timezone.utc)
+        return os.path.join(self.path, date.strftime("%Y-%m-%d") + self.SUFFIX)
+
+    def _find_last(self):
+        """Returns the newest row on disk, or None if there are none."""
+        names = sorted(n for n in os.listdir(self.path) if n.endswith(self.SUFFIX))
+        for name in reversed(names):
+            f = SegmentFile(os.path.join(self.path, name), self.columns)
+            try:
+                count = len(f)
+                if count:
+                    row = []
+                    for column, _ in self.columns:
+                        view = f.column(column, count - 1)
+                        row.append(view[0])
+                        view.release()
+                    return tuple(row)
+            finally:
+                f.close()
+        return None
+
+    def append(self, row):
+        index = row[0] // self.period
+        if index != self._index:
+            self._open(index)
+        if not self._file.append(row):
+            self._grow()
+            self._file.append(row)
+        self.last = tuple(row)
+        return None
+
+    def _open(self, index):
+        if self._file is not None:
+            self._file.close()
+        self._file = SegmentFile(
+            self._file_path(index), self.columns, self._capacity, writable=True
+        )
+        self._index = index
+        if self._retention:
+            oldest = (index * self.period - self._retention * SECONDS_PER_DAY) // (
+                self.period
+            )
+            self._expire(oldest)
+        return None
+
+    def _expire(self, before):
+        oldest = os.path.basename(self._file_path(before))
+        for name in os.listdir(self.path):
+            if name.endswith(self.SUFFIX) and name < oldest:
+                os.unlink(os.path.join(self.path, name))
+                self._l.info("Deleted expired history file {}".format(name))
+        return None
+
+    def _grow(self):
+        """Copies the current file to a new one with twice the room."""
+        old = self._file
+        path = old.path + ".grow"
+        if os.path.exists(path):
+            os.unlink(path)
+        new = SegmentFile(path, self.columns, old.capacity * 2, writable=True)
+        columns = [old.column(name) for name, _ in self.columns]
+        for row in zip(*columns):
+            new.append(row)
+        for view in columns:
+            view.release()
+        new.close()
+        old.close()
+        os.replace(path, old.path)
+        self._file = SegmentFile(old.path, self.columns, writable=True)
+        self._l.info("History file {} grown".format(old.path))
+        return None
+
+    def flush(self):
+        if self._file is not None:
+            self._file.flush()
+        return None
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+            self._index = None
+        return None
+
+    def query(self, start, end, limit=None):
+        """Returns the rows from start up to but not including end as a dict
+        of lists keyed by column name.
+
+        If there are more than limit rows, only the first limit are returned
+        and "next" is the time to continue from; otherwise "next" is None.
+        """
+        result = {name: [] for name, _ in self.columns}
+        result["next"] = None
+        count = 0
+        first = os.path.basename(self._file_path(int(start) // self.period))
+        last = os.path.basename(self._file_path(int(end - 1) // self.period))
+        names = sorted(
+            name
+            for name in os.listdir(self.path)
+            if name.endswith(self.SUFFIX) and first <= name <= last
+        )
+        for name in names:
+            f = SegmentFile(os.path.join(self.path, name), self.columns)
+            try:
+                times = f.column("time")
+                i = bisect_left(times, start)
+                j = bisect_left(times, end)
+                if limit is not None and count + j - i > limit:
+                    j = i + limit - count
+                    if j < len(times):
+                        result["next"] = times[j]
+                times.release()
+                for col, _ in self.columns:
+                    view = f.column(col, i, j)
+                    result[col].extend(view.tolist())
+                    view.release()
+                count += j - i
+            finally:
+                f.close()
+            if result["next"] is not None:
+                break
+        return result
+
+    def rows(self, start, batch=10000):
+        """Yields the rows from start onwards as tuples."""
+        if self.last is None:
+            return
+        end = self.last[0] + 1
+        while start is not None:
+            result = self.query(start, end, batch)
+            yield from zip(*(result[name] for name, _ in self.columns))
+            start = result["next"]
+
+
+class _Bucket(object):
+    """Running aggregate of the samples in one rollup bucket."""
+
+    __slots__ = ("time", "count", "mins", "sums", "maxs", "set_temp", "heating")
+
+    def __init__(self, time):
+        self.time = time
+        self.count = 0
+        self.mins = [math.inf] * len(METRICS)
+        self.sums = [0.0] * len(METRICS)
+        self.maxs = [-math.inf] * len(METRICS)
+        self.set_temp = 0.0
+        self.heating = 0.0
+        return None
+
+    def add_sample(self, values, set_temp, state):
+        self.count += 1
+        for i, value in enumerate(values):
+            self.sums[i] += value
+            if value < self.mins[i]:
+                self.mins[i] = value
+            if value > self.maxs[i]:
+                self.maxs[i] = value
+        self.set_temp += set_temp
+        if state == Status.Heating.value:
+            self.heating += 1
+        return None
+
+    def add_row(self, row):
+        """Adds a finished bucket of a finer tier, as a Rollup row."""
+        count = row[1]
+        self.count += count
+        for i in range(len(METRICS)):
+            low, mean, high = row[2 + 3 * i : 5 + 3 * i]
+            self.sums[i] += mean * count
+            self.mins[i] = min(self.mins[i], low)
+            self.maxs[i] = max(self.maxs[i], high)
+        self.set_temp += row[-2] * count
+        self.heating += row[-1] * count
+        return None
+
+    def merge(self, other):
+        self.count += other.count
+        for i in range(len(METRICS)):
+            self.sums[i] += other.sums[i]
+            self.mins[i] = min(self.mins[i], other.mins[i])
+            self.maxs[i] = max(self.maxs[i], other.maxs[i])
+        self.set_temp += other.set_temp
+        self.heating += other.heating
+        return None
+
+    def row(self):
+        row = [self.time, self.count]
+        for low, total, high in zip(self.mins, self.sums, self.maxs):
+            row.extend((low, total / self.count, high))
+        row.extend((self.set_temp / self.count, self.heating / self.count))
+        return tuple(row)
+
+
+class Rollup(object):
+    """One tier of aggregates: a row per width seconds with the count of
+    samples, the min, mean and max of each of METRICS, the mean set
+    temperature, and the heating duty cycle, the fraction of samples taken
+    while the controller was heating.
+
+    The bucket being filled is kept in memory and written to the series
+    once a sample or finer bucket for a later one arrives.
+    """
+
+    COLUMNS = (
+        (("time", "I"), ("count", "I"))
+        + tuple(
+            ("{}_{}".format(metric, stat), "f")
+            for metric in METRICS
+            for stat in ("min", "mean", "max")
+        )
+        + (("set_temp", "f"), ("heating_duty", "f"))
+    )
+
+    def __init__(self, name, width, series):
+        self.name = name
+        self.width = width
+        self.series = series
+        self.bucket = None
+        return None
+
+    def _start(self, timestamp):
+        """Returns the finished bucket's row if timestamp is past it, and
+        makes sure there is a bucket for timestamp. Returns False if the
+        timestamp is before the current bucket.
+        """
+        start = timestamp - timestamp % self.width
+        finished = None
+        if self.bucket is not None and start != self.bucket.time:
+            if start < self.bucket.time:
+                return False
+            finished = self.bucket.row()
+            self.series.append(finished)
+            self.bucket = None
+        if self.bucket is None:
+            self.bucket = _Bucket(start)
+        return finished
+
+    def add_sample(self, timestamp, values, set_temp, state):
+        """Adds a raw sample. Returns the row of the bucket it finished, or
+        None.
+        """
+        finished = self._start(timestamp)
+        if finished is not False:
+            self.bucket.add_sample(values, set_temp, state)
+        return finished or None
+
+    def add_row(self, row):
+        """Adds a finished bucket of a finer tier. Returns the row of the
+        bucket it finished, or None.
+        """
+        finished = self._start(row[0])
+        if finished is not False:
+            self.bucket.add_row(row)
+        return finished or None
+
+
+class HistoryStore(object):
+    """Embedded store of the thermostat's sensor and controller history.
+
+    Raw samples are kept in one file per UTC day (see SegmentFile) under
+    path. The columns are a uint32 Unix time and float32 or uint8 values,
+    21 bytes per sample, so a year of 10 second samples takes about 66 MB.
+    Appends are writes to the current day's memory-mapped file. Queries map
+    the files they need read-only and slice the time range out of each
+    column.
+
+    Each sample also updates the rollup tiers in TIERS, kept in a
+    subdirectory per tier (see Rollup). A finished bucket of one tier is
+    added to the next coarser one, so a sample costs one aggregate update
+    and each tier only sees the buckets of the tier below. Buckets missing
+    from a tier, such as those being filled when the daemon stopped, are
+    rebuilt from the tier below when the store is opened. Together the
+    tiers take about 30 MB a year, nearly all of it the 1 minute tier.
+
+    Use HistoryStore.get_instance() to get the store at
+    HistoryConfig.PATH.
+    """
+
+    COLUMNS = (
+        ("time", "I"),
+        ("temp_c", "f"),
+        ("pressure_mb", "f"),
+        ("relative_humidity", "f"),
+        ("set_temp", "f"),
+        ("state", "B"),
+    )
+    # name, bucket width and file period, in seconds
+    TIERS = (
+        ("1m", 60, SECONDS_PER_DAY),
+        ("15m", 900, SECONDS_PER_DAY * 16),
+        ("1h", 3600, SECONDS_PER_DAY * 64),
+        ("1d", SECONDS_PER_DAY, SECONDS_PER_DAY * 1024),
+    )
+
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self, path, interval=10, retention=None):
+        """Day files are sized for a sample every interval seconds, and
+        grow if more samples arrive. Files more than retention days old are
+        deleted, if given.
+        """
+        self._l = logging.getLogger(__name__)
+        self._interval = interval
+        self._lock = threading.Lock()
+        self._raw = Series(
+            path, self.COLUMNS, SECONDS_PER_DAY, SECONDS_PER_DAY // interval, retention
+        )
+        self._tiers = [
+            Rollup(
+                name,
+                width,
+                Series(
+                    os.path.join(path, name),
+                    Rollup.COLUMNS,
+                    period,
+                    period // width,
+                    retention,
+                ),
+            )
+            for name, width, period in self.TIERS
+        ]
+        self._catch_up()
+        return None
+
+    @classmethod
+    def get_instance(cls):
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = cls(
+                    HistoryConfig.PATH,
+                    HistoryConfig.INTERVAL,
+                    HistoryConfig.RETENTION_DAYS,
+                )
+            return cls._instance
+
+    def _catch_up(self):
+        """Rebuilds each tier's buckets after its last one on disk from the
+        tier below, leaving the newest bucket in memory.
+        """
+        source = None
+        for tier in self._tiers:
+            last = tier.series.last
+            start = 0 if last is None else last[0] + tier.width
+            count = 0
+            if source is None:
+                for row in self._raw.rows(start):
+                    tier.add_sample(row[0], row[1:4], row[4], row[5])
+                    count += 1
+            else:
+                for row in source.series.rows(start):
+                    tier.add_row(row)
+                    count += 1
+            if count:
+                self._l.info(
+                    "Rebuilt {} history rollup from {} rows".format(tier.name, count)
+                )
+            source = tier
+        return None
+
+    def append(
+        self, timestamp, temp_c, pressure_mb, relative_humidity, set_temp, state
+    ):
+        """Records a sample taken at timestamp, in Unix seconds. Samples
+        must be added in time order; older ones are dropped.
+        """
+        timestamp = int(timestamp)
+        with self._lock:
+            last = self._raw.last
+            if last is not None and timestamp < last[0]:
+                self._l.warning("Dropping out of order history sample")
+                return None
+            self._raw.append(
+                (timestamp, temp_c, pressure_mb, relative_humidity, set_temp, state)
+            )
+            row = self._tiers[0].add_sample(
+                timestamp, (temp_c, pressure_mb, relative_humidity), set_temp, state
+            )
+            for tier in self._tiers[1:]:
+                if row is None:
+                    break
+                row = tier.add_row(row)
+        return None
+
+    def flush(self):
+        with self._lock:
+            self._raw.flush()
+            for tier in self._tiers:
+                tier.series.flush()
+        return None
+
+    def close(self):
+        with self._lock:
+            self._raw.close()
+            for tier in self._tiers:
+                tier.series.close()
+        return None
+
+    def resolution(self, start, end, points):
+        """Returns the name of the finest resolution, "raw" or a tier, that
+        covers start to end in at most points rows. If none does, returns
+        the coarsest tier.
+        """
+        if (end - start) / self._interval <= points:
+            return "raw"
+        for name, width, _ in self.TIERS:
+            if (end - start) / width <= points:
+                return name
+        return self.TIERS[-1][0]
+
+    def _pending(self, index):
+        """Returns the rows of the buckets of a tier still being filled, in
+        memory in it and the finer tiers.
+        """
+        width = self._tiers[index].width
+        buckets = {}
+        for tier in self._tiers[: index + 1]:
+            if tier.bucket is None:
+                continue
+            start = tier.bucket.time - tier.bucket.time % width
+            if start not in buckets:
+                buckets[start] = _Bucket(start)
+            buckets[start].merge(tier.bucket)
+        return [buckets[start].row() for start in sorted(buckets)]
+
+    def query(self, start, end, limit=None, resolution="raw"):
+        """Returns the samples, or a tier's buckets, from start up to but
+        not including end, in Unix seconds, as a dict of lists keyed by
+        column name. A tier's buckets are returned from the one start falls
+        in. "resolution" in the result is the one used.
+
+        If there are more than limit rows, only the first limit are returned
+        and "next" is the time to continue from; otherwise "next" is None.
+        """
+        if resolution == "raw":
+            result = self._raw.query(start, end, limit)
+            columns = self.COLUMNS
+        else:
+            names = [name for name, _, _ in self.TIERS]
+            if resolution not in names:
+                raise ValueError("Unknown history resolution: {}".format(resolution))
+            index = names.index(resolution)
+            tier = self._tiers[index]
+            columns = Rollup.COLUMNS
+            # Include the bucket that start falls in
+            start = int(start) - int(start) % tier.width
+            with self._lock:
+                pending = self._pending(index)
+            result = tier.series.query(start, end, limit)
+            times = result["time"]
+            for row in pending:
+                if result["next"] is not None:
+                    break
+                if not start <= row[0] < end or (times and row[0] <= times[-1]):
+                    continue
+                if limit is not None and len(times) >= limit:
+                    result["next"] = row[0]
+                    break
+                for (name, _), value in zip(columns, row):
+                    result[name].append(value)
+        for name, typecode in columns:
+            if typecode == "f":
+                digits = 3 if name.endswith("_duty") else 2
+                result[name] = [round(v, digits) for v in result[name]]
+        result["resolution"] = resolution
+        return result
@@ -0,0 +1,113 @@
+#   Nido, a Raspberry Pi-based home thermostat.
+#
+#   Copyright (C) 2016 Alex Marshall
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.
+#   If not, see <http://www.gnu.org/licenses/>.
+
+from array import array
+import logging
+import threading
+
+from nido.lib.exceptions import SensorError
+
+
+class SampleBuffer(object):
+    """Fixed-size ring buffer of (timestamp, temp_c, pressure_pa,
+    relative_humidity) sensor samples, backed by a single array of doubles.
+    """
+
+    FIELDS = 4
+
+    def __init__(self, size):
+        if size < 1:
+            raise ValueError("Sample buffer size must be at least 1.")
+        self._size = size
+        self._data = array("d", bytes(8 * self.FIELDS * size))
+        self._count = 0
+        self._lock = threading.Lock()
+        return None
+
+    def __len__(self):
+        return min(self._count, self._size)
+
+    def append(self, timestamp, temp_c, pressure_pa, relative_humidity):
+        with self._lock:
+            i = (self._count % self._size) * self.FIELDS
+            self._data[i : i + self.FIELDS] = array(
+                "d", (timestamp, temp_c, pressure_pa, relative_humidity)
+            )
+            self._count += 1
+        return None
+
+    def latest(self):
+        """Returns the most recent sample, or None if the buffer is empty."""
+        with self._lock:
+            if self._count == 0:
+                return None
+            i = ((self._count - 1) % self._size) * self.FIELDS
+            return tuple(self._data[i : i + self.FIELDS])
+
+    def samples(self):
+        """Returns all buffered samples, oldest first."""
+        samples = []
+        with self._lock:
+            for k in range(self._count - len(self), self._count):
+                i = (k % self._size) * self.FIELDS
+                samples.append(tuple(self._data[i : i + self.FIELDS]))
+        return samples
+
+
+class Sampler(object):
+    """Background thread that reads the sensors at a fixed interval, so that
+    consumers of get_conditions() are served from the sensors' sample
+    buffers without any bus I/O. If given, callback is called after each
+    successful read.
+    """
+
+    def __init__(self, sensor, interval, callback=None):
+        self._l = logging.getLogger(__name__)
+        self._sensor = sensor
+        self._interval = interval
+        self._callback = callback
+        self._stop = threading.Event()
+        self._thread = None
+        return None
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="Sampler", daemon=True)
+        self._thread.start()
+        self._l.debug("Sampling sensor every {}s".format(self._interval))
+        return None
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        return None
+
+    def _run(self):
+        while True:
+            try:
+                self._sensor.read()
+            except SensorError as e:
+                self._l.warning("Sampler could not read sensor: {}".format(e))
+            else:
+                if self._callback is not None:
+                    self._callback()
+            if self._stop.wait(self._interval):
+                break
+        return None
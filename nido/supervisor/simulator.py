@@ -71,12 +71,19 @@ class FakeGPIO(object):
 
 
 class FakeSensor(object):
-    def __init__(self, mode):
+    def __init__(self, mode, calibration=None, **kwargs):
         self._temp = 17.17
         self._pressure = 101331.01
         self._humidity = 50.05
+        self.chip_id = 0x60
         return None
 
+    def get_calibration(self):
+        return {"chip_id": self.chip_id}
+
+    def reload_calibration(self):
+        return self.get_calibration()
+
     def read_temperature(self):
         return self._temp
 
@@ -85,3 +92,6 @@ class FakeSensor(object):
 
     def read_humidity(self):
         return self._humidity
+
+    def read_all(self):
+        return (self._temp, self._pressure, self._humidity)
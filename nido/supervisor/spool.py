@@ -0,0 +1,321 @@
+#   Nido, a Raspberry Pi-based home thermostat.
+#
+#   Copyright (C) 2016 Alex Marshall
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.
+#   If not, see <http://www.gnu.org/licenses/>.
+
+from bisect import bisect_right
+from collections import OrderedDict
+import logging
+import os
+import struct
+import threading
+import time
+import zlib
+
+from nido.lib.exceptions import SpoolError
+
+
+class _Segment(object):
+    __slots__ = ("base", "fd", "records", "unacked", "dirty")
+
+    def __init__(self, base, fd, records=0):
+        self.base = base
+        self.fd = fd
+        self.records = records
+        self.unacked = 0
+        self.dirty = False
+
+
+class Spool(object):
+    """Append-only, disk-backed queue of messages, used to store telemetry
+    until the MQTT broker has acknowledged it.
+
+    Messages are stored in fixed-size records of record_size bytes, in
+    segment files of segment_records records that are named after the
+    sequence number of their first record. Acknowledging a message sets a
+    flag in its record in place, and a segment file is deleted once all of
+    its records have been acknowledged.
+
+    Appends are fsynced in batches, every sync_records messages or
+    sync_interval seconds, so a power cut loses at most one batch.
+    Acknowledgements are not fsynced, so a message may be delivered twice
+    after a crash but is never lost. At most max_segments files are kept;
+    once they are full the oldest segment is dropped, whether or not it has
+    been delivered.
+
+    Methods are thread-safe.
+    """
+
+    # flags, payload length, timestamp in ns, CRC-32 of the rest
+    HEADER = struct.Struct("!BIQI")
+    ACKED = 0x01
+    SUFFIX = ".seg"
+
+    def __init__(
+        self,
+        path,
+        record_size=1024,
+        segment_records=1024,
+        max_segments=32,
+        sync_records=16,
+        sync_interval=60,
+    ):
+        if record_size <= self.HEADER.size:
+            raise SpoolError("Spool record size is too small: {}".format(record_size))
+        self._l = logging.getLogger(__name__)
+        self._path = path
+        self._record_size = record_size
+        self._segment_records = segment_records
+        self._max_segments = max_segments
+        self._sync_records = sync_records
+        self._sync_interval = sync_interval
+        self._lock = threading.Lock()
+        self._segments = OrderedDict()
+        self._pending = OrderedDict()
+        self._next_seq = 0
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+        os.makedirs(path, exist_ok=True)
+        self._load()
+        return None
+
+    def __len__(self):
+        """Returns the number of messages waiting to be acknowledged."""
+        return len(self._pending)
+
+    @property
+    def capacity(self):
+        """Largest message that fits in a record, in bytes."""
+        return self._record_size - self.HEADER.size
+
+    def append(self, timestamp, payload):
+        """Stores payload, a bytes object, with its timestamp in
+        nanoseconds. Returns the message's sequence number.
+        """
+        if len(payload) > self.capacity:
+            raise SpoolError(
+                "Message too large for the spool: {} bytes".format(len(payload))
+            )
+        record = bytearray(self._record_size)
+        self.HEADER.pack_into(
+            record, 0, 0, len(payload), timestamp, self._crc(timestamp, payload)
+        )
+        record[self.HEADER.size : self.HEADER.size + len(payload)] = payload
+        with self._lock:
+            segment = self._active_segment()
+            seq = segment.base + segment.records
+            os.pwrite(segment.fd, record, segment.records * self._record_size)
+            segment.records += 1
+            segment.unacked += 1
+            segment.dirty = True
+            self._pending[seq] = timestamp
+            self._next_seq = seq + 1
+            self._unsynced += 1
+            if (
+                self._unsynced >= self._sync_records
+                or time.monotonic() - self._last_sync >= self._sync_interval
+            ):
+                self._sync()
+        return seq
+
+    def pending(self, limit, skip=()):
+        """Returns up to limit (seq, payload) tuples of unacknowledged
+        messages, oldest first, leaving out the sequence numbers in skip.
+        """
+        messages = []
+        with self._lock:
+            for seq in self._pending:
+                if len(messages) >= limit:
+                    break
+                if seq in skip:
+                    continue
+                segment = self._segment(seq)
+                record = os.pread(
+                    segment.fd,
+                    self._record_size,
+                    (seq - segment.base) * self._record_size,
+                )
+                _, length, _, _ = self.HEADER.unpack_from(record)
+                messages.append((seq, bytes(record[self.HEADER.size :][:length])))
+        return messages
+
+    def ack(self, seq):
+        """Marks a message as delivered. Unknown or already acknowledged
+        sequence numbers are ignored.
+        """
+        with self._lock:
+            if self._pending.pop(seq, None) is None:
+                return None
+            segment = self._segment(seq)
+            os.pwrite(
+                segment.fd,
+                bytes((self.ACKED,)),
+                (seq - segment.base) * self._record_size,
+            )
+            segment.unacked -= 1
+            if segment.unacked == 0 and segment.records >= self._segment_records:
+                self._remove(segment)
+        return None
+
+    def sync(self):
+        """Flushes appended messages to disk."""
+        with self._lock:
+            self._sync()
+        return None
+
+    def close(self):
+        with self._lock:
+            self._sync()
+            for segment in self._segments.values():
+                os.close(segment.fd)
+            self._segments.clear()
+        return None
+
+    def _crc(self, timestamp, payload):
+        return zlib.crc32(payload, zlib.crc32(struct.pack("!Q", timestamp)))
+
+    def _file(self, base):
+        return os.path.join(self._path, "{:020d}{}".format(base, self.SUFFIX))
+
+    def _load(self):
+        pending = []
+        names = sorted(n for n in os.listdir(self._path) if n.endswith(self.SUFFIX))
+        for name in names:
+            try:
+                base = int(name[: -len(self.SUFFIX)])
+            except ValueError:
+                self._l.warning("Ignoring unknown spool file {}".format(name))
+                continue
+            fd = os.open(os.path.join(self._path, name), os.O_RDWR)
+            size = os.fstat(fd).st_size
+            segment = _Segment(base, fd, size // self._record_size)
+            if size % self._record_size:
+                # The last append was interrupted
+                os.ftruncate(fd, segment.records * self._record_size)
+            data = os.pread(fd, size, 0)
+            for i in range(segment.records):
+                offset = i * self._record_size
+                flags, length, timestamp, crc = self.HEADER.unpack_from(data, offset)
+                if flags & self.ACKED:
+                    continue
+                start = offset + self.HEADER.size
+                payload = data[start : start + length]
+                if length > self.capacity or crc != self._crc(timestamp, payload):
+                    self._l.warning("Skipping corrupt spool record {}".format(base + i))
+                    continue
+                pending.append((timestamp, base + i))
+                segment.unacked += 1
+            self._segments[base] = segment
+            self._next_seq = base + segment.records
+
+        # The last segment may still be appended to
+        for segment in list(self._segments.values())[:-1]:
+            if segment.unacked == 0:
+                self._remove(segment)
+        pending.sort()
+        self._pending = OrderedDict((seq, timestamp) for timestamp, seq in pending)
+        if pending:
+            self._l.info("{} spooled messages to deliver".format(len(pending)))
+        return None
+
+    def _segment(self, seq):
+        bases = list(self._segments)
+        return self._segments[bases[bisect_right(bases, seq) - 1]]
+
+    def _active_segment(self):
+        if self._segments:
+            segment = next(reversed(self._segments.values()))
+            if segment.records < self._segment_records:
+                return segment
+            if segment.unacked == 0:
+                self._remove(segment)
+        while len(self._segments) >= self._max_segments:
+            oldest = next(iter(self._segments.values()))
+            self._l.warning(
+                "Spool full, dropping {} undelivered messages".format(oldest.unacked)
+            )
+            for seq in range(oldest.base, oldest.base + oldest.records):
+                self._pending.pop(seq, None)
+            self._remove(oldest)
+
+        base = self._next_seq
+        fd = os.open(self._file(base), os.O_RDWR | os.O_CREAT | os.O_EXCL, 0o600)
+        self._sync_dir()
+        segment = _Segment(base, fd)
+        self._segments[base] = segment
+        return segment
+
+    def _remove(self, segment):
+        del self._segments[segment.base]
+        os.close(segment.fd)
+        os.unlink(self._file(segment.base))
+        return None
+
+    def _sync(self):
+        for segment in self._segments.values():
+            if segment.dirty:
+                os.fsync(segment.fd)
+                segment.dirty = False
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+        return None
+
+    def _sync_dir(self):
+        fd = os.open(self._path, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+        return None
+
+
+class SpoolReplayer(object):
+    """Background thread that calls replay(rate) every second, to send
+    spooled messages at up to rate messages per second.
+    """
+
+    def __init__(self, replay, rate):
+        self._l = logging.getLogger(__name__)
+        self._replay = replay
+        self._rate = rate
+        self._stop = threading.Event()
+        self._thread = None
+        return None
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="SpoolReplayer", daemon=True
+        )
+        self._thread.start()
+        return None
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        return None
+
+    def _run(self):
+        while True:
+            try:
+                self._replay(self._rate)
+            except (SpoolError, OSError) as e:
+                self._l.error("Could not replay spooled messages: {}".format(e))
+            if self._stop.wait(1):
+                break
+        return None
@@ -27,7 +27,7 @@ class Thermostat(object):
     def get_settings():
         """Returns a dictionary of the thermostat settings."""
         try:
-            state = db.get_settings()
+            state = dict(db.get_settings())
         except DBError as e:
             raise ThermostatError(e)
         else:
@@ -60,12 +60,7 @@ class Thermostat(object):
             return settings["set_temp"]
 
     def set_temp(self, temp, scale):
-        if scale.upper() == "C":
-            return self.set_settings(set_temp=temp)
-        elif scale.upper() == "F":
-            return self.set_settings(set_temp=f_to_c(temp))
-        else:
-            raise ThermostatError("Invalid temperature scale.")
+        return self.set_settings(set_temp=self._to_celsius(temp, scale))
 
     @staticmethod
     def get_mode():
@@ -77,7 +72,31 @@ class Thermostat(object):
             return Mode[settings["set_mode"]].value
 
     def set_mode(self, mode):
-        """Set the thermostat mode.
+        return self.set_settings(set_mode=self._match_mode(mode))
+
+    def update(self, mode=None, temp=None, scale=None, celsius=None):
+        """Set any of the mode, set temperature and display units in a
+        single database transaction. All values are validated before
+        anything is written.
+        """
+        set_mode = self._match_mode(mode) if mode is not None else None
+        set_temp = self._to_celsius(temp, scale) if temp is not None else None
+        return self.set_settings(set_temp=set_temp, set_mode=set_mode, celsius=celsius)
+
+    @staticmethod
+    def _to_celsius(temp, scale):
+        if scale is None:
+            raise ThermostatError("Invalid temperature scale.")
+        elif scale.upper() == "C":
+            return temp
+        elif scale.upper() == "F":
+            return f_to_c(temp)
+        else:
+            raise ThermostatError("Invalid temperature scale.")
+
+    @staticmethod
+    def _match_mode(mode):
+        """Returns the configured mode name matching mode.
 
         If we can't find a match against the configured modes
         in HardwareConfig.MODES, raise an exception.
@@ -86,6 +105,6 @@ class Thermostat(object):
 
         for m in modes:
             if m.upper() == mode.upper():
-                return self.set_settings(set_mode=m)
+                return m
 
         raise ThermostatError("Invalid or unconfigured mode.")
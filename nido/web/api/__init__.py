@@ -21,7 +21,24 @@ from flask import current_app, request
 from werkzeug.routing import BaseConverter
 import json
 
-from nido.lib.exceptions import SchedulerClientError
+
+def get_client(client_class):
+    """Returns the app-wide RPC client of the given class, creating it on
+    first use. Clients are stateless and share a per-process connection
+    pool, so a single instance serves every request.
+    """
+    clients = current_app.extensions.setdefault("nido.rpc", {})
+    client = clients.get(client_class)
+    if client is None:
+        client = clients[client_class] = client_class(
+            current_app.config["RPC_HOST"],
+            current_app.config["RPC_PORT"],
+            transport=current_app.config["RPC_TRANSPORT"],
+            socket_path=current_app.config["RPC_SOCKET"],
+            max_size=current_app.config["RPC_POOL_SIZE"],
+            max_idle=current_app.config["RPC_POOL_MAX_IDLE"],
+        )
+    return client
 
 
 def require_secret(route):
@@ -64,98 +81,6 @@ class JSONResponse(object):
         response.status_code = self.status
         return response
 
-    def process_jobs(self, jobs):
-        """This method is only passed as a callback reference to
-        nido.lib.rpc.client.SchedulerClient.
-        """
-        if isinstance(jobs, list):
-            job_list = []
-            for j in jobs:
-                if j is None:
-                    continue
-                job_list.append(self._jsonify_job(j))
-            self.data["jobs"] = job_list
-        else:
-            self.data["job"] = self._jsonify_job(jobs)
-        return None
-
-    def _jsonify_job(self, j):
-        """Converts apscheduler.job.Job object to a JSON representation.
-
-        The 'trigger' representation varies depending on the trigger object that was
-        assigned to the job. Should be one of:
-            apscheduler.triggers.cron.CronTrigger
-            apscheduler.triggers.date.DateTrigger
-            apscheduler.triggers.interval.IntervalTrigger
-
-        The 'misfire_grace_time' key represents the time in seconds of how long the
-        job's execution is allowed to be late.
-
-        Full API documentation is available here:
-        https://apscheduler.readthedocs.io/en/v3.6.0/py-modindex.html
-        """
-        if j is None:
-            raise SchedulerClientError("No job exists with that ID.")
-
-        try:
-            # Test if j.trigger is a DateTrigger type
-            trigger = {"timezone": str(j.trigger.run_date.tzinfo)}
-        except AttributeError:
-            trigger_start_date = (
-                j.trigger.start_date.strftime("%m/%d/%Y %H:%M:%S")
-                if j.trigger.start_date
-                else None
-            )
-            trigger_end_date = (
-                j.trigger.end_date.strftime("%m/%d/%Y %H:%M:%S")
-                if j.trigger.end_date
-                else None
-            )
-            trigger = {
-                "start_date": trigger_start_date,
-                "end_date": trigger_end_date,
-                "timezone": str(j.trigger.timezone),
-            }
-
-        try:
-            # Test if j.trigger is a CronTrigger type
-            j.trigger.fields
-        except AttributeError:
-            try:
-                # Test if j.trigger is an IntervalTrigger type
-                trigger_interval = (
-                    str(j.trigger.interval) if j.trigger.interval else None
-                )
-            except AttributeError:
-                try:
-                    trigger["run_date"] = j.trigger.run_date.strftime(
-                        "%m/%d/%Y %H:%M:%S"
-                    )
-                except AttributeError:
-                    raise SchedulerClientError(
-                        "Unknown trigger type: {}".format(type(j.trigger))
-                    )
-            else:
-                trigger["interval"] = trigger_interval
-        else:
-            trigger["cron"] = {}
-            for f in j.trigger.fields:
-                trigger["cron"][f.name] = str(f)
-
-        job = {
-            "id": str(j.id),
-            "name": str(j.name),
-            "misfire_grace_time": str(j.misfire_grace_time),
-            "next_run_time": (
-                j.next_run_time.strftime("%m/%d/%Y %H:%M:%S")
-                if j.next_run_time
-                else None
-            ),
-            "trigger": trigger,
-        }
-
-        return job
-
 
 class RegexConverter(BaseConverter):
     """Custom URL converter to allow use of regular expressions.
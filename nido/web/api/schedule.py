@@ -16,21 +16,23 @@
 #   along with this program.
 #   If not, see <http://www.gnu.org/licenses/>.
 
+from werkzeug.local import LocalProxy
 from flask import Blueprint, current_app, request, g
 
-from nido.web.api import require_secret, JSONResponse
+from nido.web.api import require_secret, get_client, JSONResponse
 from nido.lib.rpc.client import SchedulerClient
 from nido.lib.exceptions import SchedulerClientError
 
 bp = Blueprint("api_rpc", __name__)
 
 
-@bp.before_app_request
+# Resolved to the app-wide client on first use in each request
+sc = LocalProxy(lambda: get_client(SchedulerClient))
+
+
+@bp.before_request
 def json_response():
     g.resp = JSONResponse()
-    g.sc = SchedulerClient(
-        current_app.config["RPC_HOST"], current_app.config["RPC_PORT"]
-    )
     return None
 
 
@@ -38,7 +40,7 @@ def json_response():
 @require_secret
 def api_schedule_get_all():
     """Endpoint that returns all jobs in the scheduler."""
-    g.sc.get_scheduled_jobs(g.resp.process_jobs)
+    g.resp.data["jobs"] = sc.get_scheduled_jobs()
     return g.resp.get_flask_response(current_app)
 
 
@@ -47,7 +49,7 @@ def api_schedule_get_all():
 def api_schedule_get_jobid(id):
     """Endpoint that returns a scheduled job with a specific id."""
     try:
-        g.sc.get_scheduled_job(g.resp.process_jobs, id)
+        g.resp.data["job"] = sc.get_scheduled_job(id)
     except SchedulerClientError as e:
         g.resp.data["error"] = "Error getting job: {}".format(e)
     return g.resp.get_flask_response(current_app)
@@ -80,7 +82,7 @@ def api_schedule_add_job(type):
 
     if type.lower() == "mode" or type.lower() == "temp":
         try:
-            g.sc.add_scheduled_job(g.resp.process_jobs, type, **job_kwargs)
+            g.resp.data["job"] = sc.add_scheduled_job(type, **job_kwargs)
         except SchedulerClientError as e:
             g.resp.data["error"] = "Error adding job: {}".format(e)
     else:
@@ -111,7 +113,7 @@ def api_schedule_modify_jobid(id):
     del job_kwargs["secret"]
 
     try:
-        g.sc.modify_scheduled_job(g.resp.process_jobs, id, **job_kwargs)
+        g.resp.data["job"] = sc.modify_scheduled_job(id, **job_kwargs)
     except SchedulerClientError as e:
         g.resp.data["error"] = "Error modifying job ID ({}): {}".format(id, e)
 
@@ -139,7 +141,7 @@ def api_schedule_reschedule_jobid(id):
     del job_kwargs["secret"]
 
     try:
-        g.sc.reschedule_job(g.resp.process_jobs, id, **job_kwargs)
+        g.resp.data["job"] = sc.reschedule_job(id, **job_kwargs)
     except SchedulerClientError as e:
         g.resp.data["error"] = "Error rescheduling job ID ({}): {}".format(id, e)
 
@@ -150,7 +152,7 @@ def api_schedule_reschedule_jobid(id):
 @require_secret
 def api_schedule_pause_jobid(id):
     try:
-        g.sc.pause_scheduled_job(g.resp.process_jobs, id)
+        g.resp.data["job"] = sc.pause_scheduled_job(id)
     except SchedulerClientError as e:
         g.resp.data["error"] = "Error pausing job: {}".format(e)
 
@@ -161,11 +163,13 @@ def api_schedule_pause_jobid(id):
 @require_secret
 def api_schedule_resume_jobid(id):
     try:
-        g.sc.resume_scheduled_job(g.resp.process_jobs, id)
+        job = sc.resume_scheduled_job(id)
     except SchedulerClientError as e:
         g.resp.data["error"] = "Error resuming job: {}".format(e)
     else:
-        if g.resp.data == {}:
+        if job is not None:
+            g.resp.data["job"] = job
+        else:
             g.resp.data["job"] = {"id": "{}".format(id)}
             g.resp.data[
                 "message"
@@ -178,7 +182,7 @@ def api_schedule_resume_jobid(id):
 @require_secret
 def api_schedule_remove_jobid(id):
     try:
-        g.sc.remove_scheduled_job(id)
+        sc.remove_scheduled_job(id)
     except SchedulerClientError as e:
         g.resp.data["error"] = "Error removing job: {}".format(e)
     else:
@@ -16,22 +16,26 @@
 #   along with this program.
 #   If not, see <http://www.gnu.org/licenses/>.
 
-from flask import Blueprint, current_app, g
+import time
+
+from werkzeug.local import LocalProxy
+from flask import Blueprint, current_app, request, g
 
 from nido.lib import Mode, Status, c_to_f
-from nido.web.api import require_secret, JSONResponse
+from nido.web.api import require_secret, get_client, JSONResponse
 from nido.lib.rpc.client import ThermostatClient
 from nido.lib.exceptions import ThermostatClientError
 
 bp = Blueprint("api_local", __name__)
 
 
-@bp.before_app_request
+# Resolved to the app-wide client on first use in each request
+tc = LocalProxy(lambda: get_client(ThermostatClient))
+
+
+@bp.before_request
 def json_response():
     g.resp = JSONResponse()
-    g.tc = ThermostatClient(
-        current_app.config["RPC_HOST"], current_app.config["RPC_PORT"]
-    )
     return None
 
 
@@ -43,7 +47,7 @@ def api_get_mode():
     The value returned is defined by the nido.lib.Mode Enum object.
     """
     try:
-        mode = g.tc.get_mode()
+        mode = tc.get_mode()
     except ThermostatClientError as e:
         g.resp.data["error"] = "Error getting mode: {}".format(e)
         g.resp.status = 400
@@ -61,7 +65,7 @@ def api_set_mode(mode):
     Only setting one of the valid configured modes is possible.
     """
     try:
-        g.tc.set_mode(mode)
+        tc.set_mode(mode)
     except ThermostatClientError as e:
         g.resp.data["error"] = "Error setting mode: {}".format(e)
         g.resp.status = 400
@@ -74,7 +78,7 @@ def api_set_mode(mode):
 @bp.route("/get/temp/display_units", methods=["POST"])
 @require_secret
 def api_get_temp_units():
-    celsius = g.tc.get_temp_units()
+    celsius = tc.get_temp_units()
     if celsius:
         celsius = True
     else:
@@ -92,7 +96,7 @@ def api_set_temp_units(units):
         units = False
 
     try:
-        g.tc.set_temp_units(units)
+        tc.set_temp_units(units)
     except ThermostatClientError as e:
         g.resp.data["error"] = "Error setting temperature display unit: {}".format(e)
         g.resp.status = 400
@@ -107,7 +111,7 @@ def api_set_temp_units(units):
 def api_get_set_temp():
     """Endpoint to get the current temperature. Always returned in Celsius."""
     try:
-        temp_c = g.tc.get_set_temp()
+        temp_c = tc.get_set_temp()
     except ThermostatClientError as e:
         g.resp.data["error"] = "Error getting temperature from sensor: {}".format(e)
         g.resp.status = 400
@@ -130,7 +134,7 @@ def api_set_set_temp(temp, scale):
     """
     temp = float("{:.1f}".format(float(temp)))
     try:
-        g.tc.set_temp(temp, scale)
+        tc.set_temp(temp, scale)
     except ThermostatClientError as e:
         g.resp.data["error"] = "Error setting temperature: {}".format(e)
         g.resp.status = 400
@@ -144,7 +148,7 @@ def api_set_set_temp(temp, scale):
 @require_secret
 def api_get_conditions():
     try:
-        g.resp.data = g.tc.get_conditions()
+        g.resp.data = tc.get_conditions()
     except ThermostatClientError as e:
         g.resp.data["error"] = "Error getting sensor data: {}".format(e)
         g.resp.status = 400
@@ -156,7 +160,7 @@ def api_get_conditions():
 @require_secret
 def api_get_state():
     try:
-        state = g.tc.get_state()
+        state = tc.get_state()
     except ThermostatClientError as e:
         g.resp.data["error"] = "Error getting controller state: {}".format(e)
         g.resp.status = 400
@@ -164,3 +168,118 @@ def api_get_state():
         g.resp.data["state"] = {"value": state, "name": Status(state).name}
 
     return g.resp.get_flask_response(current_app)
+
+
+@bp.route("/get/snapshot", methods=["POST"])
+@require_secret
+def api_get_snapshot():
+    """Endpoint that returns the mode, set temperature, display units,
+    controller state and sensor conditions together, using a single RPC.
+    """
+    try:
+        snapshot = tc.get_snapshot()
+    except ThermostatClientError as e:
+        g.resp.data["error"] = "Error getting thermostat snapshot: {}".format(e)
+        g.resp.status = 400
+    else:
+        mode = snapshot["mode"]
+        temp_c = snapshot["set_temp"]
+        state = snapshot["state"]
+        g.resp.data = {
+            "mode": {"value": mode, "name": Mode(mode).name},
+            "temp": {"celsius": temp_c, "fahrenheit": c_to_f(temp_c)},
+            "celsius": bool(snapshot["celsius"]),
+            "state": {"value": state, "name": Status(state).name},
+            "conditions": snapshot["conditions"],
+            "sensors": snapshot["sensors"],
+        }
+
+    return g.resp.get_flask_response(current_app)
+
+
+@bp.route("/get/history", methods=["POST"])
+@require_secret
+def api_get_history():
+    """Endpoint that returns the recorded sensor and controller history
+    between "start" and "end" in the request body, in Unix seconds. "end"
+    defaults to now and "start" to a day before "end".
+
+    Samples are returned as lists per column, at most "limit" of them. If
+    there are more, "next" is the start time to request the rest from.
+
+    If "points" is given, the range is returned as at most that many
+    buckets of min, mean and max values and heating duty cycle, from the
+    finest rollup that fits. "resolution" is the one used: "raw", "1m",
+    "15m", "1h" or "1d".
+    """
+    req_data = request.get_json(silent=True) or {}
+    try:
+        end = float(req_data.get("end", time.time()))
+        start = float(req_data.get("start", end - 86400))
+        limit = req_data.get("limit")
+        if limit is not None:
+            limit = int(limit)
+        points = req_data.get("points")
+        if points is not None:
+            points = int(points)
+            if points < 1:
+                raise ValueError("points must be at least 1")
+        if start >= end:
+            raise ValueError("start must be before end")
+        history = tc.get_history(start, end, limit, points)
+    except (ThermostatClientError, ValueError, TypeError) as e:
+        g.resp.data["error"] = "Error getting history: {}".format(e)
+        g.resp.status = 400
+    else:
+        g.resp.data["history"] = history
+
+    return g.resp.get_flask_response(current_app)
+
+
+@bp.route("/get/server_stats", methods=["POST"])
+@require_secret
+def api_get_server_stats():
+    """Endpoint that returns the Nido daemon's RPC worker pool metrics:
+    queue length, active calls, completed and rejected calls, and mean
+    wait and service times in seconds.
+    """
+    try:
+        stats = tc.get_server_stats()
+    except ThermostatClientError as e:
+        g.resp.data["error"] = "Error getting server stats: {}".format(e)
+        g.resp.status = 400
+    else:
+        g.resp.data["stats"] = stats
+
+    return g.resp.get_flask_response(current_app)
+
+
+@bp.route("/set/settings", methods=["POST"])
+@require_secret
+def api_set_settings():
+    """Endpoint to accept any of "mode", "temp" with "scale", and
+    "display_units" in the request body, applied together.
+    """
+    req_data = request.get_json()
+    units = req_data.get("display_units")
+    temp = req_data.get("temp")
+    try:
+        if units is not None:
+            if str(units).upper() not in ("C", "F"):
+                raise ThermostatClientError("Invalid temperature display unit.")
+            units = units.upper() == "C"
+        if temp is not None:
+            temp = float("{:.1f}".format(float(temp)))
+        tc.set_settings(
+            mode=req_data.get("mode"),
+            temp=temp,
+            scale=req_data.get("scale"),
+            units=units,
+        )
+    except (ThermostatClientError, ValueError) as e:
+        g.resp.data["error"] = "Error updating settings: {}".format(e)
+        g.resp.status = 400
+    else:
+        g.resp.data["message"] = "Settings updated successfully."
+
+    return g.resp.get_flask_response(current_app)
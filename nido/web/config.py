@@ -27,6 +27,14 @@ class FlaskConfig(object):
     TESTING = False
     RPC_HOST = os.environ["NIDOD_RPC_HOST"]
     RPC_PORT = int(os.environ["NIDOD_RPC_PORT"])
+    # "rpyc" or "framed", matching the daemon
+    RPC_TRANSPORT = os.environ.get("NIDOD_RPC_TRANSPORT", "rpyc")
+    # Path of the daemon's Unix socket, used instead of RPC_HOST and RPC_PORT
+    RPC_SOCKET = os.environ.get("NIDOD_RPC_SOCKET")
+    # Persistent connections to the daemon kept by each worker process, and
+    # how long in seconds an unused connection is kept open
+    RPC_POOL_SIZE = 4
+    RPC_POOL_MAX_IDLE = 60
 
 
 class DevelopmentConfig(FlaskConfig):
@@ -56,4 +56,5 @@ setup(
     include_package_data=True,
     zip_safe=False,
     install_requires=install_requires,
+    extras_require={"numpy": ["numpy"]},
 )
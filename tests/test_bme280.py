@@ -0,0 +1,236 @@
+import struct
+import unittest
+from unittest.mock import patch
+
+from nido.lib.Adafruit_GPIO import I2C
+from nido.lib import Adafruit_BME280
+from nido.lib.Adafruit_BME280 import (
+    BME280,
+    BME280_COMPENSATION_INT,
+    BME280_FILTER_16,
+    BME280_OSAMPLE_8,
+    BME280_STANDBY_1000,
+)
+
+# Bosch reference trimming parameters and ADC values (BMP280 datasheet,
+# section 8.2) with typical humidity trim.
+CALIBRATION = (
+    27504,
+    26435,
+    -1000,
+    36477,
+    -10685,
+    3024,
+    2855,
+    140,
+    -7,
+    15500,
+    -14600,
+    6000,
+)
+H1, H2, H3, H4, H5, H6 = 75, 362, 0, 313, 50, 30
+RAW_TEMP, RAW_PRESSURE, RAW_HUMIDITY = 519888, 415148, 30000
+
+# (adc_T, adc_P, adc_H, T [0.01 C], P [Q24.8 Pa], H [Q22.10 %RH]) from the
+# Bosch C reference implementation with the trimming parameters above.
+COMPENSATION_VECTORS = [
+    (519888, 415148, 30000, 2508, 25767233, 56317),
+    (400000, 300000, 20000, -1264, 29090514, 2118),
+    (600000, 500000, 40000, 5011, 22864454, 102400),
+    (450000, 350000, 25000, 313, 27688513, 28247),
+]
+
+
+def _registers():
+    regs = bytearray(256)
+    regs[0x88:0xA0] = struct.pack("<HhhHhhhhhhhh", *CALIBRATION)
+    regs[0xA1] = H1
+    regs[0xE1:0xE3] = struct.pack("<h", H2)
+    regs[0xE3] = H3
+    regs[0xE4] = H4 >> 4
+    regs[0xE5] = (H4 & 0x0F) | ((H5 & 0x0F) << 4)
+    regs[0xE6] = H5 >> 4
+    regs[0xE7] = H6
+    regs[0xD0] = 0x60
+    regs[0xF7:0xFA] = (RAW_PRESSURE << 4).to_bytes(3, "big")
+    regs[0xFA:0xFD] = (RAW_TEMP << 4).to_bytes(3, "big")
+    regs[0xFD:0xFF] = RAW_HUMIDITY.to_bytes(2, "big")
+    return regs
+
+
+class FakeSMBus(object):
+    def __init__(self, bus):
+        self.registers = _registers()
+        self.reads = []
+        self.writes = []
+
+    def close(self):
+        pass
+
+    def write_byte_data(self, address, register, value):
+        self.writes.append((register, value))
+        self.registers[register] = value
+
+    def read_byte_data(self, address, register):
+        self.reads.append((register, 1))
+        return self.registers[register]
+
+    def read_word_data(self, address, register):
+        self.reads.append((register, 2))
+        return struct.unpack_from("<H", self.registers, register)[0]
+
+    def read_i2c_block_data(self, address, register, length):
+        self.reads.append((register, length))
+        return list(self.registers[register : register + length])
+
+
+class TestBME280(unittest.TestCase):
+    def setUp(self):
+        patches = [
+            patch.object(I2C, "SMBus", FakeSMBus),
+            patch.dict(I2C._buses, clear=True),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+        p = patch("nido.lib.Adafruit_BME280.time.sleep")
+        self.sleep = p.start()
+        self.addCleanup(p.stop)
+        self.sensor = BME280(busnum=1)
+        with I2C.get_bus(1).borrow() as bus:
+            self.bus = bus
+
+    def test_read_raw_all_is_one_burst_read(self):
+        self.bus.reads.clear()
+        raw = self.sensor.read_raw_all()
+        self.assertEqual(raw, (RAW_TEMP, RAW_PRESSURE, RAW_HUMIDITY))
+        # One poll of the status register, then one burst read
+        self.assertEqual(self.bus.reads, [(0xF3, 1), (0xF7, 8)])
+        self.assertIsNotNone(self.sensor.conversion_time)
+
+    def test_read_all(self):
+        temp, pressure, humidity = self.sensor.read_all()
+        self.assertAlmostEqual(temp, 25.08, places=2)
+        self.assertAlmostEqual(pressure, 100653.26, places=2)
+        self.assertAlmostEqual(humidity, 55.0, places=2)
+        self.assertEqual(self.sensor.t_fine, 128422)
+
+    def test_compensation_uses_snapshot(self):
+        # Pressure and humidity no longer depend on read_temperature()
+        # having been called first.
+        pressure = self.sensor.read_pressure()
+        humidity = self.sensor.read_humidity()
+        self.assertEqual((pressure, humidity), self.sensor.read_all()[1:])
+
+    def test_read_pressure_and_humidity_are_fresh(self):
+        self.sensor.read_all()
+        adc_T, adc_P, adc_H = COMPENSATION_VECTORS[1][:3]
+        self.bus.registers[0xF7:0xFA] = (adc_P << 4).to_bytes(3, "big")
+        self.bus.registers[0xFA:0xFD] = (adc_T << 4).to_bytes(3, "big")
+        self.bus.registers[0xFD:0xFF] = adc_H.to_bytes(2, "big")
+        _, t_fine = self.sensor._compensate_temperature(adc_T)
+        pressure = self.sensor.read_pressure()
+        self.assertEqual(self.sensor.t_fine, t_fine)
+        self.assertEqual(pressure, self.sensor._compensate_pressure(adc_P, t_fine))
+        self.sensor.t_fine = 0
+        humidity = self.sensor.read_humidity()
+        self.assertEqual(self.sensor.t_fine, t_fine)
+        self.assertEqual(humidity, self.sensor._compensate_humidity(adc_H, t_fine))
+
+    def test_normal_mode(self):
+        sensor = BME280(
+            BME280_OSAMPLE_8,
+            standby=BME280_STANDBY_1000,
+            filter=BME280_FILTER_16,
+            busnum=1,
+        )
+        self.assertEqual(self.bus.registers[0xF5], 0xB0)
+        self.assertEqual(self.bus.registers[0xF4], 0x93)
+
+        self.bus.reads.clear()
+        self.bus.writes.clear()
+        self.sleep.reset_mock()
+        sensor.read_all()
+        self.assertEqual(self.bus.reads, [(0xF7, 8)])
+        self.assertEqual(self.bus.writes, [])
+        self.sleep.assert_not_called()
+
+    def test_saved_calibration_is_checked(self):
+        calibration = self.sensor.get_calibration()
+        self.bus.reads.clear()
+        sensor = BME280(calibration=calibration, busnum=1)
+        # Chip ID, then the trimming registers in two bursts
+        self.assertEqual(self.bus.reads[:3], [(0xD0, 1), (0x88, 26), (0xE1, 7)])
+        self.assertEqual(sensor.get_calibration(), calibration)
+
+        # Another module, with the same chip ID but its own trim
+        other = dict(calibration, dig_T1=calibration["dig_T1"] + 1)
+        with self.assertLogs("Adafruit_BMP.BMP085", "WARNING"):
+            sensor = BME280(calibration=other, busnum=1)
+        self.assertEqual(sensor.get_calibration(), calibration)
+        self.assertEqual(sensor.read_all(), self.sensor.read_all())
+
+    def test_reload_calibration_after_reset(self):
+        sensor = BME280(
+            BME280_OSAMPLE_8,
+            standby=BME280_STANDBY_1000,
+            filter=BME280_FILTER_16,
+            busnum=1,
+        )
+        # A reset chip is in sleep mode with CONFIG cleared
+        self.bus.registers[0xF4] = 0
+        self.bus.registers[0xF5] = 0
+        self.bus.writes.clear()
+        sensor.reload_calibration()
+        self.assertIn((0xF5, 0xB0), self.bus.writes)
+        self.assertEqual(self.bus.writes[-1], (0xF4, 0x93))
+        self.assertEqual(self.bus.registers[0xF5], 0xB0)
+
+    def test_integer_compensation(self):
+        sensor = BME280(compensation=BME280_COMPENSATION_INT, busnum=1)
+        for adc_T, adc_P, adc_H, T, P, H in COMPENSATION_VECTORS:
+            with self.subTest(adc_T=adc_T, adc_P=adc_P, adc_H=adc_H):
+                temp, t_fine = sensor._compensate_temperature(adc_T)
+                pressure = sensor._compensate_pressure(adc_P, t_fine)
+                humidity = sensor._compensate_humidity(adc_H, t_fine)
+                self.assertEqual(temp, T / 100)
+                self.assertEqual(pressure, P / 256)
+                self.assertEqual(humidity, H / 1024)
+
+                # Agrees with the floating point formulas to within the
+                # resolution of the integer outputs.
+                f_temp, f_t_fine = self.sensor._compensate_temperature(adc_T)
+                self.assertAlmostEqual(temp, f_temp, delta=0.01)
+                self.assertAlmostEqual(
+                    pressure,
+                    self.sensor._compensate_pressure(adc_P, f_t_fine),
+                    delta=0.1,
+                )
+                self.assertAlmostEqual(
+                    humidity,
+                    self.sensor._compensate_humidity(adc_H, f_t_fine),
+                    delta=0.01,
+                )
+
+    def _check_batch(self):
+        adc_T, adc_P, adc_H = [list(v) for v in zip(*COMPENSATION_VECTORS)][:3]
+        batch = Adafruit_BME280.compensate_batch(
+            adc_T, adc_P, adc_H, self.sensor.get_calibration()
+        )
+        for i, (t, p, h) in enumerate(zip(adc_T, adc_P, adc_H)):
+            temp, t_fine = self.sensor._compensate_temperature(t)
+            self.assertEqual(batch[0][i], temp)
+            self.assertEqual(batch[1][i], self.sensor._compensate_pressure(p, t_fine))
+            self.assertEqual(batch[2][i], self.sensor._compensate_humidity(h, t_fine))
+
+    @unittest.skipIf(Adafruit_BME280.numpy is None, "NumPy is not installed")
+    def test_compensate_batch_numpy(self):
+        self._check_batch()
+
+    def test_compensate_batch_python(self):
+        with patch.object(Adafruit_BME280, "numpy", None):
+            self._check_batch()
+
+
+if __name__ == "__main__":
+    unittest.main()
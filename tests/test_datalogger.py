@@ -0,0 +1,92 @@
+import unittest
+from unittest.mock import patch
+
+
+class FakeMQTTClient(object):
+    def __init__(self):
+        self.on_publish = None
+        self.published = []
+
+    def publish(self, topic, payload=None, qos=0):
+        self.published.append((topic, payload, qos))
+
+
+class TestMQTTDataLogger(unittest.TestCase):
+    def setUp(self):
+        with patch.dict(
+            "os.environ",
+            {
+                "NIDO_BASE": "",
+                "NIDOD_MQTT_HOSTNAME": "",
+                "NIDOD_MQTT_PORT": "",
+                "NIDOD_MQTT_CLIENT_NAME": "",
+                "NIDO_TESTING": "",
+                "NIDO_TESTING_GPIO": "/tmp/test_gpio.yml",
+            },
+        ):
+            from nido.supervisor.datalogger import MQTTDataLogger
+
+        self.client = FakeMQTTClient()
+        self.logger = MQTTDataLogger(
+            self.client, topic="nido/telemetry", qos=1, device="living room"
+        )
+
+    def test_publish(self):
+        conditions = {
+            "temp": {"celsius": 20.5, "fahrenheit": 68.9},
+            "pressure_mb": 1013.2,
+            "relative_humidity": 45.0,
+        }
+        data = {"controller": 1, "set_temp": 21, "sensors": {"default": conditions}}
+        data.update(conditions)
+        self.logger.publish(1500000000500000001, data)
+
+        topic, payload, qos = self.client.published[0]
+        self.assertEqual((topic, qos), ("nido/telemetry", 1))
+        self.assertEqual(
+            payload,
+            "thermostat,device=living\\ room controller=1i,set_temp=21,"
+            "temp_celsius=20.5,temp_fahrenheit=68.9,pressure_mb=1013.2,"
+            "relative_humidity=45.0 1500000000500000001",
+        )
+
+        # Each sensor gets a line of its own when there are several
+        data["sensors"]["attic"] = dict(conditions, pressure_mb=None)
+        self.logger.publish(1500000060000000000, data)
+        lines = self.client.published[1][1].split("\n")
+        self.assertEqual(len(lines), 3)
+        self.assertEqual(
+            lines[2],
+            "thermostat,device=living\\ room,sensor=attic temp_celsius=20.5,"
+            "temp_fahrenheit=68.9,relative_humidity=45.0 1500000060000000000",
+        )
+
+    def test_encode_line(self):
+        from nido.lib.influx import encode_line
+
+        self.assertEqual(
+            encode_line(
+                "my measurement",
+                {"b": "x=y", "a": "1,2", "c": ""},
+                {"on": True, "n": 3, "v": float("nan"), "s": 'say "hi"\\'},
+                0,
+            ),
+            'my\\ measurement,a=1\\,2,b=x\\=y on=true,n=3i,s="say \\"hi\\"\\\\" 0',
+        )
+        self.assertIsNone(encode_line("m", {}, {"v": None}, 0))
+
+    def test_schema_skips_non_finite(self):
+        from nido.lib.influx import LineSchema
+
+        schema = LineSchema("m", {}, (("n", int), ("t", float), ("p", float)))
+        self.assertEqual(
+            schema.encode((1, 20.5, 1013.25), 0), "m n=1i,t=20.5,p=1013.25 0"
+        )
+        self.assertEqual(
+            schema.encode((1, float("nan"), 1013.25), 0), "m n=1i,p=1013.25 0"
+        )
+        self.assertEqual(schema.encode((1, 20.5, float("-inf")), 0), "m n=1i,t=20.5 0")
+
+
+if __name__ == "__main__":
+    unittest.main()
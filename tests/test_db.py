@@ -0,0 +1,75 @@
+import unittest
+from unittest.mock import patch
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+
+class TestSettingsCache(unittest.TestCase):
+    def setUp(self):
+        p = patch.dict(
+            "os.environ",
+            {
+                "NIDO_BASE": "",
+                "NIDOD_MQTT_HOSTNAME": "",
+                "NIDOD_MQTT_PORT": "",
+                "NIDOD_MQTT_CLIENT_NAME": "",
+            },
+        )
+
+        p.start()
+
+        from nido.supervisor import db
+
+        p.stop()
+
+        engine = create_engine("sqlite://")
+        for p in [
+            patch.object(db, "Session", sessionmaker(bind=engine)),
+            patch.object(db, "_settings_cache", db._SettingsCache()),
+        ]:
+            p.start()
+            self.addCleanup(p.stop)
+        db.Base.metadata.create_all(engine)
+        with patch("builtins.print"):
+            db._init_db(engine=engine)
+        self.db = db
+
+    def test_write_through(self):
+        db = self.db
+        version = db.get_settings_version()
+        db.set_settings(set_temp=19.5)
+        self.assertEqual(db.get_settings()["set_temp"], 19.5)
+        self.assertGreater(db.get_settings_version(), version)
+        with self.assertRaises(TypeError):
+            db.get_settings()["set_temp"] = 30.0
+
+    def test_invalidate(self):
+        db = self.db
+        self.assertEqual(db.get_settings()["set_temp"], 21.0)
+        with db._db_session() as session:
+            db._get_settings(session).set_temp = 18.0
+        self.assertEqual(db.get_settings()["set_temp"], 21.0)
+        db.invalidate_settings()
+        self.assertEqual(db.get_settings()["set_temp"], 18.0)
+
+    def test_thermostat_update(self):
+        from nido.supervisor.thermostat import Thermostat
+        from nido.lib.exceptions import ThermostatError
+
+        db = self.db
+        version = db.get_settings_version()
+        Thermostat().update(mode="heat", temp=68.0, scale="F", celsius=True)
+        settings = db.get_settings()
+        self.assertEqual(settings["set_mode"], "Heat")
+        self.assertEqual(settings["set_temp"], 20.0)
+        self.assertTrue(settings["celsius"])
+        self.assertEqual(db.get_settings_version(), version + 1)
+
+        with self.assertRaises(ThermostatError):
+            Thermostat().update(mode="off", temp=18.0, scale="K")
+        self.assertEqual(db.get_settings()["set_mode"], "Heat")
+
+
+if __name__ == "__main__":
+    unittest.main()
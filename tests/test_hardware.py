@@ -1,3 +1,5 @@
+import threading
+import time
 import unittest
 from unittest.mock import patch
 
@@ -31,5 +33,144 @@ class TestSensor(unittest.TestCase):
         self.assertEqual(r["conditions"]["relative_humidity"], 50.05)
 
 
+class StubSensor(object):
+    def __init__(self, temp, delay=0, error=False):
+        self._sample = (0.0, temp, 101325.0, 50.0)
+        self._delay = delay
+        self._error = error
+
+    def latest(self):
+        return None
+
+    def read(self):
+        from nido.lib.exceptions import SensorError
+
+        time.sleep(self._delay)
+        if self._error:
+            raise SensorError("Stub sensor failed.")
+        return self._sample
+
+
+class TestSensorRegistry(unittest.TestCase):
+    def setUp(self):
+        p = patch.dict(
+            "os.environ",
+            {
+                "NIDO_BASE": "",
+                "NIDOD_MQTT_HOSTNAME": "",
+                "NIDOD_MQTT_PORT": "",
+                "NIDOD_MQTT_CLIENT_NAME": "",
+                "NIDO_TESTING": "",
+                "NIDO_TESTING_GPIO": "/tmp/test_gpio.yml",
+            },
+        )
+
+        p.start()
+
+        from nido.supervisor.hardware import SensorRegistry
+
+        p.stop()
+
+        self.SensorRegistry = SensorRegistry
+
+    def _registry(self, aggregate, sensors, timeout=1.0):
+        r = self.SensorRegistry(sensors, aggregate=aggregate, timeout=timeout)
+        self.addCleanup(r.shutdown)
+        return r
+
+    def test_aggregates(self):
+        sensors = [
+            ("a", StubSensor(18.0), 0, 1.0),
+            ("b", StubSensor(20.0), 0, 1.0),
+            ("c", StubSensor(25.0), 1, 2.0),
+        ]
+        for aggregate, expected in [
+            ("mean", 21.0),
+            ("median", 20.0),
+            ("weighted", 22.0),
+        ]:
+            with self.subTest(aggregate=aggregate):
+                r = self._registry(aggregate, sensors).get_conditions()
+                self.assertEqual(r["conditions"]["temp"]["celsius"], expected)
+                self.assertEqual(r["sensors"]["c"]["temp"]["celsius"], 25.0)
+
+    def test_failed_and_slow_sensors_are_skipped(self):
+        sensors = [
+            ("ok", StubSensor(20.0), 0, 1.0),
+            ("failed", StubSensor(30.0, error=True), 0, 1.0),
+            ("slow", StubSensor(40.0, delay=0.5), 1, 1.0),
+        ]
+        r = self._registry("mean", sensors, timeout=0.1).get_conditions()
+        self.assertEqual(list(r["sensors"]), ["ok"])
+        self.assertEqual(r["conditions"]["temp"]["celsius"], 20.0)
+
+    def test_inline(self):
+        threads = []
+
+        class ThreadSensor(StubSensor):
+            def read(self):
+                threads.append(threading.current_thread())
+                return super().read()
+
+        sensors = [
+            ("a", ThreadSensor(18.0), 0, 1.0),
+            ("b", ThreadSensor(20.0), 1, 1.0),
+        ]
+        r = self._registry("mean", sensors)
+        r.inline = True
+        self.assertEqual(set(r.read()), {"a", "b"})
+        self.assertEqual(threads, [threading.current_thread()] * 2)
+
+
+class TestController(unittest.TestCase):
+    def test_cached_state_and_verify(self):
+        p = patch.dict(
+            "os.environ",
+            {
+                "NIDO_BASE": "",
+                "NIDOD_MQTT_HOSTNAME": "",
+                "NIDOD_MQTT_PORT": "",
+                "NIDOD_MQTT_CLIENT_NAME": "",
+                "NIDO_TESTING": "",
+                "NIDO_TESTING_GPIO": "/tmp/test_gpio.yml",
+            },
+        )
+
+        p.start()
+
+        from nido.lib import Status
+        from nido.supervisor.config import HardwareConfig
+        from nido.supervisor.hardware import Controller, GPIO
+
+        p.stop()
+
+        c = Controller()
+        self.addCleanup(c.shutdown)
+        c._output(True, False)
+        self.assertEqual(c.get_status(), Status.Heating.value)
+
+        # Pin changed behind the controller's back
+        GPIO.output(HardwareConfig.GPIO_HEAT_PIN, False)
+        self.assertEqual(c.get_status(), Status.Heating.value)
+        self.assertEqual(c.get_status(cached=False), Status.Off.value)
+
+        c.verify()
+        self.assertEqual(c.get_status(cached=False), Status.Heating.value)
+
+
+class TestSampleBuffer(unittest.TestCase):
+    def test_ring_buffer(self):
+        from nido.supervisor.sampler import SampleBuffer
+
+        b = SampleBuffer(3)
+        self.assertIsNone(b.latest())
+        for t in range(5):
+            b.append(t, 20.0 + t, 101325.0, 50.0)
+
+        self.assertEqual(len(b), 3)
+        self.assertEqual(b.latest(), (4.0, 24.0, 101325.0, 50.0))
+        self.assertEqual([s[0] for s in b.samples()], [2.0, 3.0, 4.0])
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,120 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+
+class TestHistoryStore(unittest.TestCase):
+    def setUp(self):
+        with patch.dict(
+            "os.environ",
+            {
+                "NIDO_BASE": "",
+                "NIDOD_MQTT_HOSTNAME": "",
+                "NIDOD_MQTT_PORT": "",
+                "NIDOD_MQTT_CLIENT_NAME": "",
+            },
+        ):
+            from nido.supervisor.history import HistoryStore
+
+        self.HistoryStore = HistoryStore
+        self.path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.path)
+
+    def test_query(self):
+        # Room for 4 samples a day, so the first day has to grow
+        store = self.HistoryStore(self.path, interval=86400 // 4)
+        start = 1500076800  # 2017-07-15 00:00 UTC
+        times = [start + 10 * i for i in range(6)] + [start + 86400 + 5]
+        for i, t in enumerate(times):
+            store.append(t, 20.0 + i / 4, 1013.25, 45.5, 21.0, i % 2)
+        store.append(start, 0.0, 0.0, 0.0, 0.0, 0)  # out of order
+        store.close()
+        self.assertEqual(
+            sorted(n for n in os.listdir(self.path) if n.endswith(".hist")),
+            ["2017-07-15.hist", "2017-07-16.hist"],
+        )
+
+        store = self.HistoryStore(self.path)
+        result = store.query(start + 10, start + 86400 * 2)
+        self.assertEqual(result["time"], times[1:])
+        self.assertEqual(result["temp_c"], [20.25, 20.5, 20.75, 21.0, 21.25, 21.5])
+        self.assertEqual(result["state"], [1, 0, 1, 0, 1, 0])
+        self.assertEqual(result["pressure_mb"][0], 1013.25)
+        self.assertIsNone(result["next"])
+
+        result = store.query(start, start + 86400 * 2, limit=6)
+        self.assertEqual(result["time"], times[:6])
+        self.assertEqual(result["next"], times[6])
+        result = store.query(result["next"], start + 86400 * 2, limit=6)
+        self.assertEqual(result["time"], times[6:])
+        self.assertEqual(store.query(0, start)["time"], [])
+
+    def test_retention(self):
+        store = self.HistoryStore(self.path, retention=2)
+        self.addCleanup(store.close)
+        for day in range(4):
+            store.append(1500076800 + 86400 * day, 20.0, 1013.25, 45.5, 21.0, 0)
+        self.assertEqual(
+            sorted(n for n in os.listdir(self.path) if n.endswith(".hist")),
+            ["2017-07-16.hist", "2017-07-17.hist", "2017-07-18.hist"],
+        )
+
+    def test_rollups(self):
+        store = self.HistoryStore(self.path)
+        start = 1500076800
+        # 2 hours 5 minutes of samples, heating for a third of each minute
+        for i in range(125 * 6):
+            store.append(start + 10 * i, 20.0 + i % 6, 1013.25, 45.5, 21.0, i % 3 == 0)
+        end = start + 86400
+
+        self.assertEqual(store.resolution(start, end, 10000), "raw")
+        self.assertEqual(store.resolution(start, end, 2000), "1m")
+        self.assertEqual(store.resolution(start, end, 100), "15m")
+        self.assertEqual(store.resolution(start, end, 1), "1d")
+
+        minutes = store.query(start, end, resolution="1m")
+        self.assertEqual(minutes["resolution"], "1m")
+        self.assertEqual(len(minutes["time"]), 125)
+        self.assertEqual(minutes["time"][-1], start + 124 * 60)
+        self.assertEqual(set(minutes["count"]), {6})
+        self.assertEqual(set(minutes["temp_c_min"]), {20.0})
+        self.assertEqual(set(minutes["temp_c_mean"]), {22.5})
+        self.assertEqual(set(minutes["temp_c_max"]), {25.0})
+        self.assertEqual(set(minutes["heating_duty"]), {0.333})
+
+        hours = store.query(start, end, resolution="1h")
+        self.assertEqual(hours["time"], [start, start + 3600, start + 7200])
+        self.assertEqual(hours["count"], [360, 360, 30])
+        self.assertEqual(hours["pressure_mb_mean"], [1013.25] * 3)
+
+        # A range inside a bucket returns that bucket, finished or not
+        result = store.query(start + 7500, start + 7501, resolution="1h")
+        self.assertEqual(result["time"], [start + 7200])
+        result = store.query(start + 610, start + 900, resolution="15m")
+        self.assertEqual(result["time"], [start])
+        self.assertEqual(result["count"], [90])
+
+        result = store.query(start, end, limit=2, resolution="1h")
+        self.assertEqual(result["time"], [start, start + 3600])
+        self.assertEqual(result["next"], start + 7200)
+
+        # Buckets being filled are rebuilt from the finer tiers on reopening
+        store.close()
+        store = self.HistoryStore(self.path)
+        self.addCleanup(store.close)
+        for tier in ("1m", "15m", "1h", "1d"):
+            self.assertEqual(
+                store.query(start, end, resolution=tier)["count"][-1],
+                {"1m": 6, "15m": 30, "1h": 30, "1d": 750}[tier],
+            )
+        self.assertEqual(
+            store.query(start, end, resolution="1d")["heating_duty"], [0.333]
+        )
+        self.assertEqual(store.query(start, end, resolution="1m"), minutes)
+        self.assertRaises(ValueError, store.query, start, end, resolution="5m")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,82 @@
+import unittest
+from unittest.mock import patch
+
+from nido.lib.exceptions import NidoDaemonError
+from nido.lib.rpc.client import RPCConnectionPool
+
+
+class FakeConnection(object):
+    def __init__(self):
+        self.closed = False
+        self.pings = 0
+
+    def ping(self, timeout=None):
+        self.pings += 1
+
+    def close(self):
+        self.closed = True
+
+
+class TestRPCConnectionPool(unittest.TestCase):
+    def setUp(self):
+        self.connections = []
+
+    def _connect(self):
+        conn = FakeConnection()
+        self.connections.append(conn)
+        return conn
+
+    def test_reuses_connections(self):
+        pool = RPCConnectionPool(self._connect)
+        for _ in range(3):
+            with pool.connection():
+                pass
+        self.assertEqual(len(self.connections), 1)
+
+    def test_discards_failed_connection(self):
+        pool = RPCConnectionPool(self._connect)
+        with self.assertRaises(EOFError):
+            with pool.connection():
+                raise EOFError()
+        with pool.connection() as conn:
+            self.assertIs(conn, self.connections[1])
+        self.assertTrue(self.connections[0].closed)
+
+    def test_max_size(self):
+        pool = RPCConnectionPool(self._connect, max_size=1, timeout=0.01)
+        with pool.connection():
+            with self.assertRaises(NidoDaemonError):
+                with pool.connection():
+                    pass
+
+    def test_pings_and_expires_idle_connections(self):
+        pool = RPCConnectionPool(self._connect, ping_interval=10, max_idle=60)
+        with patch("nido.lib.rpc.client.time.monotonic", return_value=0):
+            with pool.connection():
+                pass
+        with patch("nido.lib.rpc.client.time.monotonic", return_value=20):
+            with pool.connection() as conn:
+                self.assertEqual(conn.pings, 1)
+        with patch("nido.lib.rpc.client.time.monotonic", return_value=100):
+            with pool.connection() as conn:
+                self.assertIs(conn, self.connections[1])
+        self.assertTrue(self.connections[0].closed)
+
+    @patch("nido.lib.rpc.client.time.sleep")
+    def test_retries_with_backoff(self, sleep):
+        attempts = []
+
+        def connect():
+            attempts.append(1)
+            if len(attempts) < 3:
+                raise ConnectionRefusedError()
+            return FakeConnection()
+
+        pool = RPCConnectionPool(connect, retries=3, backoff=0.1)
+        with pool.connection():
+            pass
+        self.assertEqual([c[0][0] for c in sleep.call_args_list], [0.1, 0.2])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,131 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+
+from apscheduler.jobstores.base import JobLookupError
+import rpyc
+from rpyc.utils.server import ThreadedServer
+
+from nido.lib.exceptions import NidoDaemonError, ThermostatError
+from nido.lib.rpc.framed import FramedRPCServer, FramedRPCConnection
+
+
+def get_mode():
+    return 1
+
+
+def set_mode(mode):
+    raise ThermostatError("Invalid or unconfigured mode.")
+
+
+def remove_job(job_id):
+    raise JobLookupError(job_id)
+
+
+class ErrorService(rpyc.Service):
+    exposed_set_mode = staticmethod(set_mode)
+    exposed_remove_job = staticmethod(remove_job)
+
+
+class TestFramedRPC(unittest.TestCase):
+    def setUp(self):
+        self.server = FramedRPCServer(
+            {
+                "get_mode": get_mode,
+                "set_mode": set_mode,
+                "remove_job": remove_job,
+                "add": lambda a, b=0: a + b,
+            },
+            hostname="127.0.0.1",
+        )
+        thread = threading.Thread(target=self.server.start, daemon=True)
+        thread.start()
+        while not self.server.active:
+            time.sleep(0.01)
+        self.addCleanup(thread.join)
+        self.addCleanup(self.server.close)
+
+    def test_call(self):
+        conn = FramedRPCConnection.connect("127.0.0.1", self.server.port)
+        self.addCleanup(conn.close)
+        self.assertEqual(conn.root.add(2, b=3), 5)
+        conn.ping(timeout=1)
+        self.assertEqual(conn.call("get_mode"), 1)
+
+    def test_errors(self):
+        conn = FramedRPCConnection.connect("127.0.0.1", self.server.port)
+        self.addCleanup(conn.close)
+        with self.assertRaises(ThermostatError) as cm:
+            conn.root.set_mode("cool")
+        self.assertEqual(cm.exception.msg, "Invalid or unconfigured mode.")
+        with self.assertRaises(NidoDaemonError):
+            conn.root.log_data()
+        with self.assertRaises(NidoDaemonError):
+            conn.root.add("a", 1)
+        # The connection stays usable after errors
+        self.assertFalse(conn.closed)
+        self.assertEqual(conn.root.get_mode(), 1)
+
+    def test_thermostat_client(self):
+        from nido.lib.rpc.client import ThermostatClient
+        from nido.lib.exceptions import ThermostatClientError
+
+        tc = ThermostatClient("127.0.0.1", self.server.port, transport="framed")
+        self.addCleanup(tc._pool.close)
+        self.assertEqual(tc.get_mode(), 1)
+        with self.assertRaises(ThermostatClientError):
+            tc.set_mode("cool")
+
+    def test_client_errors_match_rpyc(self):
+        from nido.lib.rpc.client import SchedulerClient, ThermostatClient
+        from nido.lib.exceptions import SchedulerClientError, ThermostatClientError
+
+        server = ThreadedServer(
+            ErrorService,
+            hostname="127.0.0.1",
+            port=0,
+            protocol_config={"instantiate_custom_exceptions": True},
+        )
+        thread = threading.Thread(target=server.start, daemon=True)
+        thread.start()
+        self.addCleanup(thread.join)
+        self.addCleanup(server.close)
+
+        messages = []
+        for transport, port in (("framed", self.server.port), ("rpyc", server.port)):
+            tc = ThermostatClient("127.0.0.1", port, transport=transport)
+            sc = SchedulerClient("127.0.0.1", port, transport=transport)
+            self.addCleanup(tc._pool.close)
+            with self.assertRaises(ThermostatClientError) as tcm:
+                tc.set_mode("cool")
+            with self.assertRaises(SchedulerClientError) as scm:
+                sc.remove_scheduled_job("wake")
+            messages.append((str(tcm.exception), str(scm.exception)))
+        self.assertEqual(messages[0], messages[1])
+        self.assertEqual(
+            messages[0],
+            (
+                "'Invalid or unconfigured mode.'",
+                "'No job by the id of wake was found'",
+            ),
+        )
+
+
+class TestFramedRPCUnixSocket(unittest.TestCase):
+    def test_call(self):
+        path = os.path.join(tempfile.mkdtemp(), "nidod.sock")
+        server = FramedRPCServer({"get_mode": get_mode}, socket_path=path)
+        thread = threading.Thread(target=server.start, daemon=True)
+        thread.start()
+        self.addCleanup(thread.join)
+        self.addCleanup(server.close)
+
+        conn = FramedRPCConnection.connect_unix(path)
+        self.addCleanup(conn.close)
+        self.assertEqual(conn.root.get_mode(), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
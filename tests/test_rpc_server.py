@@ -0,0 +1,58 @@
+import unittest
+from datetime import datetime, timezone
+from unittest.mock import patch
+
+from apscheduler.schedulers.background import BackgroundScheduler
+
+
+def noop():
+    pass
+
+
+class TestSerializeJob(unittest.TestCase):
+    def setUp(self):
+        with patch.dict(
+            "os.environ",
+            {
+                "NIDO_BASE": "",
+                "NIDO_TESTING": "",
+                "NIDO_TESTING_GPIO": "",
+                "NIDOD_MQTT_HOSTNAME": "",
+                "NIDOD_MQTT_PORT": "",
+                "NIDOD_MQTT_CLIENT_NAME": "",
+            },
+        ):
+            from nido.lib.rpc.server import serialize_job
+
+        self.serialize_job = serialize_job
+        self.scheduler = BackgroundScheduler(timezone=timezone.utc)
+        self.scheduler.start(paused=True)
+        self.addCleanup(self.scheduler.shutdown)
+
+    def test_cron_job(self):
+        job = self.scheduler.add_job(
+            noop, "cron", id="wake", name="Mode: HEAT", hour=7, minute=30
+        )
+        data = self.serialize_job(job)
+        self.assertEqual(data["id"], "wake")
+        self.assertEqual(data["name"], "Mode: HEAT")
+        self.assertEqual(data["trigger"]["timezone"], "UTC")
+        self.assertEqual(data["trigger"]["cron"]["hour"], "7")
+        self.assertEqual(data["trigger"]["cron"]["minute"], "30")
+
+    def test_interval_and_date_jobs(self):
+        job = self.scheduler.add_job(noop, "interval", minutes=5)
+        self.assertEqual(self.serialize_job(job)["trigger"]["interval"], "0:05:00")
+        job = self.scheduler.add_job(
+            noop, "date", run_date=datetime(2030, 1, 2, 3, 4, 5, tzinfo=timezone.utc)
+        )
+        trigger = self.serialize_job(job)["trigger"]
+        self.assertEqual(trigger["run_date"], "01/02/2030 03:04:05")
+        self.assertNotIn("start_date", trigger)
+
+    def test_missing_job(self):
+        self.assertIsNone(self.serialize_job(None))
+
+
+if __name__ == "__main__":
+    unittest.main()
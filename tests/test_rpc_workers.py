@@ -0,0 +1,97 @@
+import socket
+import threading
+import time
+import unittest
+
+import rpyc
+
+from nido.lib.exceptions import NidoDaemonError
+from nido.lib.rpc.workers import BoundedThreadedServer, RPCWorkerPool
+
+
+class TestRPCWorkerPool(unittest.TestCase):
+    def setUp(self):
+        self.pool = RPCWorkerPool(max_workers=1, max_queue=2)
+        self.addCleanup(self.pool.shutdown)
+
+    def test_call(self):
+        self.assertEqual(self.pool.call(lambda a, b=0: a + b, 2, b=3), 5)
+        with self.assertRaises(ZeroDivisionError):
+            self.pool.call(lambda: 1 / 0)
+        stats = self.pool.stats()
+        self.assertEqual(stats["completed"], 2)
+        self.assertEqual(stats["queued"], 0)
+        self.assertEqual(stats["active"], 0)
+
+    def test_overflow(self):
+        started = threading.Event()
+        release = threading.Event()
+
+        def block():
+            started.set()
+            release.wait(5)
+
+        running = self.pool.submit(block)
+        started.wait(5)
+        queued = [self.pool.submit(int, "1") for _ in range(2)]
+        self.assertEqual(self.pool.stats()["queued"], 2)
+        with self.assertRaises(NidoDaemonError) as cm:
+            self.pool.submit(int, "1")
+        self.assertIn("busy", cm.exception.msg)
+
+        release.set()
+        running.result(5)
+        self.assertEqual([f.result(5) for f in queued], [1, 1])
+        stats = self.pool.stats()
+        self.assertEqual(stats["rejected"], 1)
+        self.assertEqual(stats["completed"], 3)
+        self.assertGreater(stats["service_time_max"], 0)
+        # The queue drained, so calls are accepted again
+        self.assertEqual(self.pool.call(int, "2"), 2)
+
+
+class TestBoundedThreadedServer(unittest.TestCase):
+    def test_connection_limit(self):
+        workers, queue_depth = 2, 2
+        server = BoundedThreadedServer(
+            rpyc.Service,
+            hostname="127.0.0.1",
+            port=0,
+            max_connections=workers + queue_depth,
+        )
+        thread = threading.Thread(target=server.start, daemon=True)
+        thread.start()
+        self.addCleanup(thread.join)
+        self.addCleanup(server.close)
+        while not server.active:
+            time.sleep(0.01)
+        baseline = threading.active_count()
+
+        socks = []
+        for _ in range(3 * (workers + queue_depth)):
+            sock = socket.create_connection(("127.0.0.1", server.port))
+            sock.settimeout(5)
+            socks.append(sock)
+            self.addCleanup(sock.close)
+        deadline = time.monotonic() + 5
+        while server.rejected < 2 * (workers + queue_depth):
+            self.assertLess(time.monotonic(), deadline)
+            time.sleep(0.01)
+        self.assertLessEqual(threading.active_count(), baseline + workers + queue_depth)
+        # Rejected connections are closed straight away
+        self.assertEqual(socks[-1].recv(1), b"")
+
+        # Connections are accepted again once clients disconnect
+        for sock in socks:
+            sock.close()
+        deadline = time.monotonic() + 5
+        while server.clients:
+            self.assertLess(time.monotonic(), deadline)
+            time.sleep(0.01)
+        conn = rpyc.connect("127.0.0.1", server.port)
+        self.addCleanup(conn.close)
+        conn.ping()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,150 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from paho.mqtt.client import MQTTMessageInfo, MQTT_ERR_NO_CONN, MQTT_ERR_SUCCESS
+
+
+class FakeBroker(object):
+    """Stands in for a paho client connected to mosquitto. Messages are
+    only accepted while connected, and acknowledged by deliver().
+    """
+
+    def __init__(self):
+        self.on_publish = None
+        self.on_disconnect = None
+        self.connected = False
+        self.received = []
+        self._outstanding = []
+        self._mid = 0
+
+    def is_connected(self):
+        return self.connected
+
+    def publish(self, topic, payload=None, qos=0):
+        self._mid += 1
+        info = MQTTMessageInfo(self._mid)
+        if self.connected:
+            info.rc = MQTT_ERR_SUCCESS
+            self._outstanding.append((self._mid, payload, info))
+        else:
+            info.rc = MQTT_ERR_NO_CONN
+        return info
+
+    def deliver(self):
+        for mid, payload, info in self._outstanding:
+            self.received.append(payload)
+            self.on_publish(self, None, mid)
+            info._set_as_published()
+        self._outstanding = []
+
+
+class TestSpool(unittest.TestCase):
+    def setUp(self):
+        with patch.dict(
+            "os.environ",
+            {
+                "NIDO_BASE": "",
+                "NIDOD_MQTT_HOSTNAME": "",
+                "NIDOD_MQTT_PORT": "",
+                "NIDOD_MQTT_CLIENT_NAME": "",
+                "NIDO_TESTING": "",
+                "NIDO_TESTING_GPIO": "/tmp/test_gpio.yml",
+            },
+        ):
+            from nido.supervisor.datalogger import MQTTDataLogger
+            from nido.supervisor.spool import Spool
+
+        self.MQTTDataLogger = MQTTDataLogger
+        self.Spool = Spool
+        self.path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.path)
+
+    def test_recover(self):
+        spool = self.Spool(self.path, record_size=64, segment_records=2)
+        for i in range(3):
+            spool.append(i, "message {}".format(i).encode())
+        spool.ack(0)
+        spool.close()
+        # Interrupted append at the end of the last segment
+        with open(
+            os.path.join(self.path, sorted(os.listdir(self.path))[-1]), "ab"
+        ) as f:
+            f.write(b"\x00" * 10)
+
+        spool = self.Spool(self.path, record_size=64, segment_records=2)
+        self.addCleanup(spool.close)
+        self.assertEqual(len(spool), 2)
+        self.assertEqual(spool.pending(10), [(1, b"message 1"), (2, b"message 2")])
+        self.assertEqual(spool.append(3, b"message 3"), 3)
+
+    def test_replay(self):
+        broker = FakeBroker()
+        data = {
+            "controller": 0,
+            "set_temp": 21.0,
+            "temp": {"celsius": 20.5, "fahrenheit": 68.9},
+            "pressure_mb": 1013.2,
+            "relative_humidity": 45.0,
+        }
+        spool = self.Spool(self.path, record_size=256, segment_records=2)
+        logger = self.MQTTDataLogger(broker, topic="nido/telemetry", qos=1, spool=spool)
+
+        # Broker down: messages are only spooled
+        for t in range(1, 6):
+            logger.publish(t, data)
+        self.assertEqual(broker.received, [])
+        self.assertEqual(len(os.listdir(self.path)), 3)
+
+        # Restart
+        spool.close()
+        spool = self.Spool(self.path, record_size=256, segment_records=2)
+        self.addCleanup(spool.close)
+        logger = self.MQTTDataLogger(broker, topic="nido/telemetry", qos=1, spool=spool)
+        self.assertEqual(len(spool), 5)
+
+        broker.connected = True
+        self.assertEqual(logger.replay(10), 0)
+        logger.publish(6, data)
+        broker.deliver()
+        # Confirmed, so the backlog is replayed at up to 3 per call
+        self.assertEqual(logger.replay(3), 3)
+        broker.deliver()
+        self.assertEqual(logger.replay(3), 2)
+        broker.deliver()
+        self.assertEqual(logger.replay(3), 0)
+
+        timestamps = [int(p.split()[-1]) for p in broker.received]
+        self.assertEqual(timestamps, [6, 1, 2, 3, 4, 5])
+        self.assertEqual(len(spool), 0)
+        # Delivered segments are deleted
+        self.assertEqual(os.listdir(self.path), [])
+
+    def test_deferred_acks(self):
+        broker = FakeBroker()
+        broker.connected = True
+        spool = self.Spool(self.path, record_size=256)
+        self.addCleanup(spool.close)
+        logger = self.MQTTDataLogger(
+            broker, topic="nido/telemetry", qos=1, spool=spool, defer_acks=True
+        )
+        data = {
+            "controller": 0,
+            "set_temp": 21.0,
+            "temp": {"celsius": 20.5, "fahrenheit": 68.9},
+            "pressure_mb": 1013.2,
+            "relative_humidity": 45.0,
+        }
+        logger.publish(1, data)
+        broker.deliver()
+        # Acknowledged by the broker, but only recorded by replay()
+        self.assertEqual(len(spool), 1)
+        self.assertEqual(logger.replay(10), 0)
+        self.assertEqual(len(spool), 0)
+        self.assertEqual(len(broker.received), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()